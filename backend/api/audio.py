@@ -1,11 +1,12 @@
 # backend/api/audio.py
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import os
 
-from services.audio_service import AudioService
+from services.audio_service import AudioService, AUDIO_FORMATS, TRANSCODE_FORMATS
 
 router = APIRouter()
 audio_service = AudioService()
@@ -13,6 +14,55 @@ audio_service = AudioService()
 # Configure output directory
 AUDIO_DIR = Path("recorded_audio")
 AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+TRANSCODE_CACHE_DIR = AUDIO_DIR / ".transcoded"
+
+# Read size for ranged responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _parse_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range "bytes=" header into an inclusive (start, end) pair"""
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        # Multipart ranges are not supported; fall back to the full file
+        return None
+
+    start_str, end_str = spec.split("-", 1)
+    try:
+        if start_str == "":
+            # Suffix range: the last N bytes
+            length = int(end_str)
+            if length <= 0:
+                raise ValueError
+            start = max(file_size - length, 0)
+            end = file_size - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+            end = min(end, file_size - 1)
+    except ValueError:
+        return None
+
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+def _iter_file_range(file_path: Path, start: int, end: int):
+    """Yield the bytes of file_path between start and end (inclusive)"""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
 
 @router.post("/start")
 async def start_recording() -> Dict[str, bool]:
@@ -40,10 +90,13 @@ async def get_status() -> Dict:
     return audio_service.get_recording_status()
 
 @router.get("/recordings")
-async def list_recordings() -> List[Dict[str, str]]:
+async def list_recordings() -> List[Dict]:
     """List all recorded audio files"""
     recordings = []
-    for file in AUDIO_DIR.glob("*.wav"):
+    for file in AUDIO_DIR.iterdir():
+        # Dotfiles are temporaries, e.g. FLACs still being written by compact_recordings
+        if file.suffix not in AUDIO_FORMATS or file.name.startswith("."):
+            continue
         recordings.append({
             "filename": file.name,
             "path": str(file),
@@ -53,13 +106,49 @@ async def list_recordings() -> List[Dict[str, str]]:
     return recordings
 
 @router.get("/download/{filename}")
-async def download_recording(filename: str):
-    """Download a specific recording"""
+async def download_recording(filename: str, request: Request, format: Optional[str] = None):
+    """Download a specific recording, optionally transcoded, with HTTP Range support"""
     file_path = AUDIO_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Recording not found")
-    return FileResponse(
-        path=file_path,
-        media_type="audio/wav",
-        filename=filename
+
+    media_type = AUDIO_FORMATS.get(file_path.suffix, "application/octet-stream")
+    download_name = file_path.name
+    if format and format != file_path.suffix.lstrip("."):
+        if format not in TRANSCODE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+        download_name = f"{file_path.stem}.{format}"
+        # ffmpeg can take seconds on a long recording; keep the event loop free meanwhile
+        file_path = await asyncio.to_thread(audio_service.transcode, file_path, format, TRANSCODE_CACHE_DIR)
+        if file_path is None:
+            raise HTTPException(status_code=500, detail="Failed to transcode recording")
+        media_type = TRANSCODE_FORMATS[format]["media_type"]
+
+    file_size = file_path.stat().st_size
+    byte_range = _parse_range(request.headers.get("range"), file_size)
+    if byte_range is None:
+        return FileResponse(
+            path=file_path,
+            media_type=media_type,
+            filename=download_name,
+            headers={"Accept-Ranges": "bytes"}
+        )
+
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_file_range(file_path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{file_size}",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": f'attachment; filename="{download_name}"'
+        }
     )
+
+@router.post("/compact")
+async def compact_recordings(background_tasks: BackgroundTasks) -> Dict[str, bool]:
+    """Convert stored WAV recordings to FLAC in the background"""
+    background_tasks.add_task(audio_service.compact_recordings, AUDIO_DIR)
+    return {"scheduled": True}
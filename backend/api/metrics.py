@@ -0,0 +1,19 @@
+# backend/api/metrics.py
+import os
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+router = APIRouter()
+
+def _registry():
+    """The process registry, or one merging every worker's metrics in multiprocess mode"""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+@router.get("/metrics")
+async def get_metrics() -> Response:
+    """Expose pipeline metrics in Prometheus text format"""
+    return Response(generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -1,21 +1,38 @@
 # backend/api/transcription.py
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File
 from pathlib import Path
 from typing import Dict, Optional
+import asyncio
 import tempfile
 import shutil
 
-from services.transcription_service import TranscriptionService
+from services.audio_service import AUDIO_FORMATS
+from services.decoding_profiles import DECODING_PROFILES
+from services.remote_service import get_transcription_service
+from services.tracing import span
+from services.transcript_index import get_transcript_index
+from services.upload_service import MAX_PART_SIZE, UploadError, UploadManager
 
 router = APIRouter()
-transcription_service = TranscriptionService(model_name="base")
+transcription_service = get_transcription_service("base")
+# Resumable uploads, transcribed while they arrive
+upload_manager = UploadManager(Path("uploads"), transcription_service)
+
+def _check_profile(decoding_profile: str) -> None:
+    if decoding_profile not in DECODING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown decoding profile. Choose from: {', '.join(DECODING_PROFILES)}"
+        )
 
 @router.post("/transcribe")
 async def transcribe_audio(
     file: UploadFile = File(...),
-    language: Optional[str] = None
+    language: Optional[str] = None,
+    decoding_profile: str = "balanced"
 ) -> Dict:
     """Transcribe uploaded audio file"""
+    _check_profile(decoding_profile)
     if not file.filename.endswith(('.wav', '.mp3', '.m4a')):
         raise HTTPException(
             status_code=400,
@@ -26,15 +43,15 @@ async def transcribe_audio(
     with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp_file:
         try:
             # Save uploaded file to temporary file
-            shutil.copyfileobj(file.file, tmp_file)
+            with span("upload"):
+                shutil.copyfileobj(file.file, tmp_file)
             tmp_path = Path(tmp_file.name)
 
-            # Update language if specified
-            if language:
-                transcription_service.language = language
-
             # Transcribe the audio file
-            result = transcription_service.transcribe_file(tmp_path)
+            # Run off the event loop so other requests are served meanwhile
+            result = await asyncio.to_thread(
+                transcription_service.transcribe_file, tmp_path, decoding_profile, language
+            )
             if result is None:
                 raise HTTPException(
                     status_code=500,
@@ -57,20 +74,26 @@ async def transcribe_audio(
 @router.get("/model-info")
 async def get_model_info() -> Dict:
     """Get information about the current transcription model"""
-    return transcription_service.get_model_info()
+    return await asyncio.to_thread(transcription_service.get_model_info)
 
 @router.post("/transcribe/{recording_id}")
-async def transcribe_recording(recording_id: str) -> Dict:
+async def transcribe_recording(recording_id: str, decoding_profile: str = "archive-accurate") -> Dict:
     """Transcribe an existing recording"""
-    recording_path = Path("recorded_audio") / f"{recording_id}.wav"
+    _check_profile(decoding_profile)
+    recording_path = None
+    for suffix in AUDIO_FORMATS:
+        candidate = Path("recorded_audio") / f"{recording_id}{suffix}"
+        if candidate.exists():
+            recording_path = candidate
+            break
 
-    if not recording_path.exists():
+    if recording_path is None:
         raise HTTPException(
             status_code=404,
             detail=f"Recording {recording_id} not found"
         )
 
-    result = transcription_service.transcribe_file(recording_path)
+    result = await asyncio.to_thread(transcription_service.transcribe_recording, recording_path, decoding_profile)
     if result is None:
         raise HTTPException(
             status_code=500,
@@ -85,4 +108,107 @@ async def transcribe_recording(recording_id: str) -> Dict:
     except Exception as e:
         print(f"Error saving transcription: {e}")
 
+    # Keep the search index in step with the saved transcript
+    try:
+        await asyncio.to_thread(
+            get_transcript_index().index_transcript,
+            recording_id,
+            recording_path,
+            result["text"],
+            result.get("segments"),
+            result.get("language")
+        )
+    except Exception as e:
+        print(f"Error indexing transcription: {e}")
+
     return result
+
+@router.get("/search")
+async def search_transcripts(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    recording_id: Optional[str] = None
+) -> Dict:
+    """Find transcript segments containing every term of q, with their timestamps in milliseconds"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    limit = max(1, min(limit, 100))
+    results = await asyncio.to_thread(get_transcript_index().search, q, limit, max(0, offset), recording_id)
+    return {"query": q, "results": results}
+
+@router.post("/search/reindex")
+async def reindex_transcripts() -> Dict:
+    """Index transcripts in recorded_audio that were written outside the API or changed since"""
+    index = get_transcript_index()
+    indexed = await asyncio.to_thread(index.index_directory, Path("recorded_audio"), tuple(AUDIO_FORMATS))
+    return {"indexed": indexed, **await asyncio.to_thread(index.get_status)}
+
+def _upload_error(e: UploadError) -> HTTPException:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    filename: str,
+    size: int,
+    sha256: Optional[str] = None,
+    language: Optional[str] = None,
+    decoding_profile: str = "balanced"
+) -> Dict:
+    """Start a resumable upload; send the file with PATCH /uploads/{upload_id}
+
+    sha256 (hex) of the whole file is optional and checked when the last part arrives.
+    """
+    _check_profile(decoding_profile)
+    try:
+        status = await asyncio.to_thread(upload_manager.create, filename, size, sha256, language, decoding_profile)
+    except UploadError as e:
+        raise _upload_error(e)
+    return {**status, "max_part_size": MAX_PART_SIZE}
+
+@router.patch("/uploads/{upload_id}")
+async def upload_part(upload_id: str, request: Request) -> Dict:
+    """Append the request body at the Upload-Offset header
+
+    An optional Upload-Checksum header ("sha256 <hex>") is verified before
+    the part is stored. A 409 response carries the offset to resume from.
+    """
+    try:
+        offset = int(request.headers["upload-offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    checksum = None
+    if request.headers.get("upload-checksum"):
+        algorithm, _, checksum = request.headers["upload-checksum"].partition(" ")
+        if algorithm.lower() != "sha256" or not checksum:
+            raise HTTPException(status_code=400, detail='Upload-Checksum must be "sha256 <hex digest>"')
+
+    # Refuse oversized parts before reading them into memory
+    if int(request.headers.get("content-length") or 0) > MAX_PART_SIZE:
+        raise HTTPException(status_code=413, detail=f"Parts may be at most {MAX_PART_SIZE} bytes")
+    with span("upload"):
+        data = bytearray()
+        async for block in request.stream():
+            data += block
+            if len(data) > MAX_PART_SIZE:
+                raise HTTPException(status_code=413, detail=f"Parts may be at most {MAX_PART_SIZE} bytes")
+    try:
+        new_offset = await asyncio.to_thread(upload_manager.write_part, upload_id, offset, bytes(data), checksum)
+    except UploadError as e:
+        raise _upload_error(e)
+    return {"upload_id": upload_id, "offset": new_offset}
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str) -> Dict:
+    """Upload offset and status, with the transcript so far"""
+    status = await asyncio.to_thread(upload_manager.get_status, upload_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return status
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str) -> Dict:
+    if not await asyncio.to_thread(upload_manager.delete, upload_id):
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return {"upload_id": upload_id, "deleted": True}
@@ -1,46 +1,154 @@
 # backend/api/websocket.py
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from typing import Dict, List
+from typing import Dict, List, Optional
 import asyncio
 import json
+import os
+import threading
+from services.cascade_service import CascadeRealtimeService, TranscriptionTier
+from services.decoding_profiles import DECODING_PROFILES
 from services.realtime_service import RealtimeTranscriptionService
-from services.transcription_service import TranscriptionService
+from services.remote_service import get_transcription_service
+from services.metrics import ACTIVE_SESSIONS
+from services.prefork import process_memory
+from services.stream_multiplexer import StreamMultiplexer, parse_frame
 
 router = APIRouter()
 
 # Initialize services
-transcription_service = TranscriptionService(model_name="base")
-realtime_service = RealtimeTranscriptionService(transcription_service)
+transcription_service = get_transcription_service("base")
+
+# Cascade mode (?mode=cascade): small model for partials, larger model for finals
+PARTIAL_MODEL = os.environ.get("WHISPER_PARTIAL_MODEL", "tiny")
+FINAL_MODEL = os.environ.get("WHISPER_FINAL_MODEL", "small")
+# Finished utterances allowed to wait for the final model before partials are confirmed as-is
+FINAL_MAX_PENDING = int(os.environ.get("WHISPER_FINAL_MAX_PENDING", "8"))
+cascade_tiers: Optional[Dict[str, TranscriptionTier]] = None
+cascade_lock = threading.Lock()
+
+# Multiplexed connections (/ws/multiplex): streams per connection, and chunks decoded at once per connection
+MULTIPLEX_MAX_STREAMS = int(os.environ.get("WHISPER_MULTIPLEX_MAX_STREAMS", "512"))
+MULTIPLEX_WORKERS = int(os.environ.get("WHISPER_MULTIPLEX_WORKERS", "0")) or max(len(transcription_service.replicas), 1)
+
+def get_cascade_tiers() -> Dict[str, TranscriptionTier]:
+    """Load the cascade models on first use"""
+    global cascade_tiers
+    with cascade_lock:
+        if cascade_tiers is None:
+            cascade_tiers = {
+                "partial": TranscriptionTier("partial", get_transcription_service(PARTIAL_MODEL)),
+                "final": TranscriptionTier(
+                    "final", get_transcription_service(FINAL_MODEL), max_pending=FINAL_MAX_PENDING
+                ),
+            }
+    return cascade_tiers
+
+# WHISPER_PRELOAD_CASCADE=1: load the cascade models at startup (before forking
+# with WHISPER_PREFORK, so the workers share them) instead of on the first cascade stream
+if os.environ.get("WHISPER_PRELOAD_CASCADE") == "1":
+    get_cascade_tiers()
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # Each connection streams into its own realtime session; streams of a
+        # multiplexed connection are keyed by (websocket, stream_id)
+        self.sessions: Dict[object, RealtimeTranscriptionService] = {}
+        # Counters carried over from sessions that have already closed
+        self.closed_totals = {"total_processed": 0, "dropped_chunks": 0}
+
+    async def create_session(self, options) -> RealtimeTranscriptionService:
+        """Create a session from query parameters or a stream's open message"""
+        # profile=cprofile|torch profiles every chunk (only if profiling is enabled)
+        decoding_profile = options.get("decoding_profile", "realtime-fast")
+        if decoding_profile not in DECODING_PROFILES:
+            decoding_profile = "realtime-fast"
+        if options.get("mode") == "cascade":
+            tiers = await asyncio.to_thread(get_cascade_tiers)
+            return CascadeRealtimeService(
+                tiers["partial"],
+                tiers["final"],
+                profile=options.get("profile"),
+                decoding_profile=decoding_profile
+            )
+        return RealtimeTranscriptionService(
+            transcription_service,
+            profile=options.get("profile"),
+            decoding_profile=decoding_profile
+        )
+
+    def _add_session(self, key, session: RealtimeTranscriptionService) -> None:
+        self.sessions[key] = session
+        ACTIVE_SESSIONS.inc()
+
+    def _close_session(self, key) -> Optional[RealtimeTranscriptionService]:
+        session = self.sessions.pop(key, None)
+        if session is not None:
+            self.closed_totals["total_processed"] += session.total_processed
+            self.closed_totals["dropped_chunks"] += session.dropped_chunks
+            session.stop()
+            ACTIVE_SESSIONS.dec()
+        return session
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, multiplexed: bool = False) -> Optional[RealtimeTranscriptionService]:
+        """Accept a connection; single-stream connections get their session from the query"""
         await websocket.accept()
         self.active_connections.append(websocket)
+        if multiplexed:
+            return None
+        session = await self.create_session(websocket.query_params)
+        self._add_session(websocket, session)
+        return session
+
+    async def open_stream(self, websocket: WebSocket, stream_id: int, options: Dict) -> RealtimeTranscriptionService:
+        session = await self.create_session(options)
+        self._add_session((websocket, stream_id), session)
+        return session
+
+    def close_stream(self, websocket: WebSocket, stream_id: int) -> Optional[RealtimeTranscriptionService]:
+        return self._close_session((websocket, stream_id))
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self._close_session(websocket)
+        for key in [key for key in self.sessions if isinstance(key, tuple) and key[0] is websocket]:
+            self._close_session(key)
 
     async def send_transcription(self, transcription: Dict, websocket: WebSocket):
         try:
             await websocket.send_json(transcription)
         except Exception as e:
             print(f"Error sending transcription: {e}")
-            await self.disconnect(websocket)
+            self.disconnect(websocket)
+
+    def get_status(self) -> Dict:
+        sessions = [session.get_status() for session in self.sessions.values()]
+        return {
+            "active_connections": len(self.active_connections),
+            "active_sessions": len(sessions),
+            "total_processed": self.closed_totals["total_processed"]
+                + sum(status["total_processed"] for status in sessions),
+            "dropped_chunks": self.closed_totals["dropped_chunks"]
+                + sum(status["dropped_chunks"] for status in sessions),
+            "queue_size": sum(status["queue_size"] for status in sessions),
+            "sessions": sessions,
+            "cascade": {name: tier.get_status() for name, tier in cascade_tiers.items()} if cascade_tiers else None,
+            # Sessions live in one process; with WHISPER_PREFORK each worker reports its own
+            "worker": {"pid": os.getpid(), **process_memory(os.getpid())}
+        }
 
 manager = ConnectionManager()
 
 @router.websocket("/ws/audio")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    realtime_service = await manager.connect(websocket)
 
     # Create a callback for this connection
     async def transcription_callback(result: Dict):
         await manager.send_transcription(result, websocket)
 
+    process_task = None
     try:
         # Add callback for transcription results
         realtime_service.add_transcription_callback(transcription_callback)
@@ -61,9 +169,131 @@ async def websocket_endpoint(websocket: WebSocket):
         # Clean up
         realtime_service.remove_transcription_callback(transcription_callback)
         manager.disconnect(websocket)
-        realtime_service.stop()
+        if process_task is not None:
+            process_task.cancel()
+
+@router.websocket("/ws/multiplex")
+async def multiplex_endpoint(websocket: WebSocket):
+    """Many audio streams over one connection
+
+    Text frames are JSON control messages:
+        {"type": "open", "stream_id": 7, "mode": "cascade", "decoding_profile": "realtime-fast"}
+        {"type": "close", "stream_id": 7}
+    Binary frames are a big-endian uint32 stream id followed by 16 kHz mono
+    int16 PCM. Every result carries the stream_id it belongs to.
+    """
+    await manager.connect(websocket, multiplexed=True)
+    multiplexer = StreamMultiplexer(workers=MULTIPLEX_WORKERS)
+    # Unknown stream ids are reported once, not for every frame
+    reported = set()
+    # Streams whose session is still being created (cascade models may be loading),
+    # with the audio received for them meanwhile
+    opening: Dict[int, List[bytes]] = {}
+    open_tasks: Dict[int, asyncio.Task] = {}
+
+    async def send_error(stream_id, error: str):
+        await manager.send_transcription({"type": "error", "stream_id": stream_id, "error": error}, websocket)
+
+    def stream_callback(stream_id: int, session: RealtimeTranscriptionService):
+        async def callback(result: Dict):
+            # A chunk still decoding when its stream was closed finishes after "closed"; drop it
+            if multiplexer.sessions.get(stream_id) is not session:
+                return
+            await manager.send_transcription({**result, "stream_id": stream_id}, websocket)
+        return callback
+
+    async def open_stream(stream_id: int, message: Dict):
+        """Create a stream's session off the receive loop, then feed it the audio that arrived meanwhile
+
+        Closing the stream first cancels this task; the session is only
+        registered once creation has finished, so nothing is left behind.
+        """
+        try:
+            session = await manager.open_stream(websocket, stream_id, message)
+        except Exception as e:
+            del opening[stream_id], open_tasks[stream_id]
+            await send_error(stream_id, f"could not open stream: {e}")
+            return
+        pending = opening.pop(stream_id)
+        del open_tasks[stream_id]
+        session.add_transcription_callback(stream_callback(stream_id, session))
+        multiplexer.add(stream_id, session)
+        reported.discard(stream_id)
+        # Feeding does not suspend, so the buffered audio stays ahead of frames received later
+        for audio_data in pending:
+            await multiplexer.feed(stream_id, audio_data)
+        await manager.send_transcription(
+            {"type": "opened", "stream_id": stream_id, "session_id": session.session_id}, websocket
+        )
+
+    async def handle_control(message: Dict):
+        stream_id = message.get("stream_id")
+        if not isinstance(stream_id, int) or not 0 <= stream_id < 2 ** 32:
+            await send_error(stream_id, "stream_id must be an unsigned 32-bit integer")
+        elif message.get("type") == "open":
+            if stream_id in multiplexer.sessions or stream_id in opening:
+                await send_error(stream_id, "stream is already open")
+            elif len(multiplexer.sessions) + len(opening) >= MULTIPLEX_MAX_STREAMS:
+                await send_error(stream_id, f"too many streams (max {MULTIPLEX_MAX_STREAMS})")
+            else:
+                opening[stream_id] = []
+                open_tasks[stream_id] = asyncio.create_task(open_stream(stream_id, message))
+        elif message.get("type") == "close":
+            if stream_id in opening:
+                del opening[stream_id]
+                open_tasks.pop(stream_id).cancel()
+                await manager.send_transcription(
+                    {"type": "closed", "stream_id": stream_id, "total_processed": 0, "dropped_chunks": 0}, websocket
+                )
+                return
+            multiplexer.remove(stream_id)
+            session = manager.close_stream(websocket, stream_id)
+            if session is None:
+                await send_error(stream_id, "stream is not open")
+            else:
+                await manager.send_transcription({
+                    "type": "closed",
+                    "stream_id": stream_id,
+                    "total_processed": session.total_processed,
+                    "dropped_chunks": session.dropped_chunks
+                }, websocket)
+        else:
+            await send_error(stream_id, f"unknown message type: {message.get('type')}")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                frame = parse_frame(message["bytes"])
+                if frame is None:
+                    continue
+                stream_id, audio_data = frame
+                if stream_id in opening:
+                    opening[stream_id].append(audio_data)
+                elif not await multiplexer.feed(stream_id, audio_data) and stream_id not in reported:
+                    reported.add(stream_id)
+                    await send_error(stream_id, "stream is not open")
+            elif message.get("text") is not None:
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    await send_error(None, "control messages must be JSON")
+                    continue
+                await handle_control(control if isinstance(control, dict) else {})
+
+    except WebSocketDisconnect:
+        print("Client disconnected")
+    except Exception as e:
+        print(f"Error in multiplexed websocket connection: {e}")
+    finally:
+        for task in open_tasks.values():
+            task.cancel()
+        multiplexer.close()
+        manager.disconnect(websocket)
 
 @router.get("/status")
 async def get_status() -> Dict:
-    """Get current processing status"""
-    return realtime_service.get_status()
+    """Get current processing status across all connections"""
+    return manager.get_status()
@@ -0,0 +1,392 @@
+# services/audio_loader.py
+import whisper
+import torch
+import soundfile as sf
+import numpy as np
+import math
+import struct
+import subprocess
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from services.metrics import observe_stage
+
+# Whisper expects mono float32 audio at 16 kHz
+TARGET_SAMPLE_RATE = 16000
+
+# Input samples converted and resampled per block; bounds temporary memory for long files
+BLOCK_SAMPLES = 16000 * 60
+
+# Supported (format tag, bits per sample) pairs and the numpy dtype / scale for each
+WAV_FORMATS = {
+    (1, 16): (np.int16, 1.0 / 32768.0),
+    (1, 32): (np.int32, 1.0 / 2147483648.0),
+    (3, 32): (np.float32, 1.0),
+}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def _read_wav_layout(path: Path) -> Optional[dict]:
+    """Locate the PCM data chunk of a RIFF/WAVE file without reading the samples"""
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+            if chunk_id == b"fmt ":
+                data = f.read(chunk_size)
+                if len(data) < 16:
+                    return None
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", data[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(data) >= 26:
+                    format_tag = struct.unpack("<H", data[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, block_align, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                format_tag, channels, sample_rate, block_align, bits = fmt
+                if (format_tag, bits) not in WAV_FORMATS or channels == 0 or sample_rate == 0:
+                    return None
+                offset = f.tell()
+                # Streamed WAVs may carry a placeholder size; trust the file length instead
+                size = min(chunk_size, path.stat().st_size - offset)
+                return {
+                    "offset": offset,
+                    "frames": size // block_align,
+                    "channels": channels,
+                    "sample_rate": sample_rate,
+                    "format": (format_tag, bits),
+                }
+            else:
+                f.seek(chunk_size, 1)
+
+            # Chunks are word aligned
+            if chunk_size % 2:
+                f.seek(1, 1)
+
+def _sinc_resample_kernel(orig: int, new: int, lowpass_filter_width: int = 6, rolloff: float = 0.99):
+    """Build a Hann-windowed sinc polyphase kernel of shape (new, 1, 2 * width + orig)"""
+    base_freq = min(orig, new) * rolloff
+    width = math.ceil(lowpass_filter_width * orig / base_freq)
+    idx = torch.arange(-width, width + orig, dtype=torch.float64)[None, None] / orig
+    t = torch.arange(0, -new, -1, dtype=torch.float64)[:, None, None] / new + idx
+    t *= base_freq
+    t = t.clamp_(-lowpass_filter_width, lowpass_filter_width)
+    window = torch.cos(t * math.pi / lowpass_filter_width / 2) ** 2
+    t *= math.pi
+    kernel = torch.where(t == 0, torch.ones_like(t), torch.sin(t) / t)
+    kernel *= window * (base_freq / orig)
+    return kernel.to(torch.float32), width
+
+def resample(
+    frames: np.ndarray,
+    orig_sr: int,
+    target_sr: int = TARGET_SAMPLE_RATE,
+    convert: Optional[Callable[[np.ndarray], np.ndarray]] = None
+) -> np.ndarray:
+    """Resample audio to target_sr in fixed-size blocks
+
+    `frames` may be a memory-mapped array; `convert` turns each raw block into
+    mono float32, so the full-rate signal is never materialised at once.
+    """
+    convert = convert or (lambda block: np.asarray(block, dtype=np.float32))
+    length = len(frames)
+    if orig_sr == target_sr:
+        out = np.empty(length, dtype=np.float32)
+        for start in range(0, length, BLOCK_SAMPLES):
+            out[start:start + BLOCK_SAMPLES] = convert(frames[start:start + BLOCK_SAMPLES])
+        return out
+
+    g = math.gcd(orig_sr, target_sr)
+    orig, new = orig_sr // g, target_sr // g
+    kernel, width = _sinc_resample_kernel(orig, new)
+
+    # Each kernel position consumes `orig` input samples and produces `new` output samples
+    positions = length // orig + 1
+    block_positions = max(BLOCK_SAMPLES // orig, 1)
+    target_length = -(-new * length // orig)
+    out = np.empty(positions * new, dtype=np.float32)
+
+    with torch.inference_mode():
+        for p0 in range(0, positions, block_positions):
+            p1 = min(p0 + block_positions, positions)
+            start = p0 * orig - width
+            end = (p1 - 1) * orig + width + orig
+            block = convert(frames[max(start, 0):min(end, length)])
+            block = np.pad(block, (max(-start, 0), max(end - length, 0)))
+            resampled = torch.nn.functional.conv1d(
+                torch.from_numpy(block)[None, None], kernel, stride=orig
+            )
+            out[p0 * new:p1 * new] = resampled[0].transpose(0, 1).reshape(-1).numpy()
+
+    return out[:target_length]
+
+def load_wav(path: Path, sample_rate: int = TARGET_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """Memory-map a PCM WAV file and return mono float32 audio, or None if unsupported"""
+    layout = _read_wav_layout(path)
+    if layout is None:
+        return None
+    if layout["frames"] == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    dtype, scale = WAV_FORMATS[layout["format"]]
+    channels = layout["channels"]
+    frames = np.memmap(
+        path, dtype=dtype, mode="r",
+        offset=layout["offset"], shape=(layout["frames"], channels)
+    )
+
+    def convert(block: np.ndarray) -> np.ndarray:
+        if channels == 1:
+            mono = block[:, 0].astype(np.float32)
+        else:
+            mono = block.astype(np.float32).mean(axis=1)
+        if scale != 1.0:
+            mono *= scale
+        return mono
+
+    with observe_stage("resample"):
+        return resample(frames, layout["sample_rate"], sample_rate, convert)
+
+def load_audio(path: Path, sample_rate: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Load audio as mono float32, using ffmpeg only for formats that need it"""
+    path = Path(path)
+    audio = None
+    if path.suffix.lower() == ".wav":
+        audio = load_wav(path, sample_rate)
+    elif path.suffix.lower() == ".flac":
+        data, orig_sr = sf.read(str(path), dtype="float32", always_2d=True)
+        with observe_stage("resample"):
+            audio = resample(data, orig_sr, sample_rate, lambda block: block.mean(axis=1, dtype=np.float32))
+
+    if audio is None:
+        audio = whisper.load_audio(str(path), sr=sample_rate)
+    return audio
+
+class StreamingResampler:
+    def __init__(self, orig_sr: int, target_sr: int = TARGET_SAMPLE_RATE):
+        """Block-by-block version of resample() for audio that arrives in pieces
+
+        Output is identical to resample() over the concatenated input; only the
+        kernel's look-ahead (a few samples) is held back until more input or flush().
+        """
+        g = math.gcd(orig_sr, target_sr)
+        self.orig, self.new = orig_sr // g, target_sr // g
+        self.passthrough = orig_sr == target_sr
+        if not self.passthrough:
+            self.kernel, self.width = _sinc_resample_kernel(self.orig, self.new)
+            # Input from absolute sample buffer_start on; the start is zero-padded like resample()
+            self.buffer = np.zeros(self.width, dtype=np.float32)
+            self.buffer_start = -self.width
+        self.position = 0
+        self.received = 0
+        self.emitted = 0
+
+    def _run(self, end_position: int) -> np.ndarray:
+        """Output for kernel positions up to end_position, whose input is all buffered"""
+        if end_position <= self.position:
+            return np.zeros(0, dtype=np.float32)
+        start = self.position * self.orig - self.width - self.buffer_start
+        end = (end_position - 1) * self.orig + self.orig + self.width - self.buffer_start
+        with torch.inference_mode():
+            resampled = torch.nn.functional.conv1d(
+                torch.from_numpy(np.ascontiguousarray(self.buffer[start:end]))[None, None], self.kernel, stride=self.orig
+            )
+        self.position = end_position
+        keep_from = self.position * self.orig - self.width
+        self.buffer = self.buffer[keep_from - self.buffer_start:]
+        self.buffer_start = keep_from
+        return resampled[0].transpose(0, 1).reshape(-1).numpy()
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float32)
+        self.received += len(block)
+        if self.passthrough:
+            self.emitted += len(block)
+            return block
+        self.buffer = np.concatenate([self.buffer, block])
+        available = self.buffer_start + len(self.buffer)
+        out = self._run((available - self.width) // self.orig)
+        self.emitted += len(out)
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Remaining output, with the end zero-padded like resample()"""
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        positions = self.received // self.orig + 1
+        end = (positions - 1) * self.orig + self.orig + self.width
+        self.buffer = np.pad(self.buffer, (0, max(end - self.buffer_start - len(self.buffer), 0)))
+        out = self._run(positions)
+        target_length = -(-self.new * self.received // self.orig)
+        out = out[:max(target_length - self.emitted, 0)]
+        self.emitted += len(out)
+        return out
+
+class WavStreamDecoder:
+    def __init__(self, on_audio: Callable[[np.ndarray], None], on_end: Callable[[bool], None]):
+        """Decode a PCM WAV file to 16 kHz mono float32 as its bytes arrive
+
+        on_audio receives each decoded block; on_end(ok) is called once after
+        close(), or as soon as the header turns out to be unsupported.
+        """
+        self.on_audio = on_audio
+        self.on_end = on_end
+        self.header = b""
+        self.layout = None
+        self.remainder = b""
+        self.resampler = None
+        self.failed = False
+        self.decoded = 0
+
+    def _parse_header(self) -> Optional[bool]:
+        """True once the data chunk is found, False if unsupported, None if more bytes are needed"""
+        data = self.header
+        if len(data) < 12:
+            return None
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            return False
+        pos, fmt = 12, None
+        while len(data) >= pos + 8:
+            chunk_id, chunk_size = struct.unpack("<4sI", data[pos:pos + 8])
+            if chunk_id == b"data":
+                if fmt is None:
+                    return False
+                format_tag, channels, sample_rate, block_align, bits = fmt
+                if (format_tag, bits) not in WAV_FORMATS or channels == 0 or sample_rate == 0:
+                    return False
+                self.layout = {"channels": channels, "sample_rate": sample_rate, "format": (format_tag, bits),
+                               "block_align": block_align}
+                self.remainder = data[pos + 8:]
+                return True
+            if len(data) < pos + 8 + chunk_size:
+                return None
+            if chunk_id == b"fmt ":
+                body = data[pos + 8:pos + 8 + chunk_size]
+                if len(body) < 16:
+                    return False
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (format_tag, channels, sample_rate, block_align, bits)
+            # Chunks are word aligned
+            pos += 8 + chunk_size + chunk_size % 2
+        return None
+
+    def feed(self, data: bytes) -> None:
+        if self.failed:
+            return
+        if self.layout is None:
+            self.header += data
+            parsed = self._parse_header()
+            if parsed is None:
+                return
+            if not parsed:
+                self.failed = True
+                self.on_end(False)
+                return
+            self.resampler = StreamingResampler(self.layout["sample_rate"])
+            data, self.remainder = self.remainder, b""
+
+        data = self.remainder + data
+        usable = len(data) - len(data) % self.layout["block_align"]
+        self.remainder = data[usable:]
+        if usable:
+            dtype, scale = WAV_FORMATS[self.layout["format"]]
+            frames = np.frombuffer(data[:usable], dtype=dtype).reshape(-1, self.layout["channels"])
+            mono = frames.astype(np.float32).mean(axis=1) * scale
+            self._emit(self.resampler.process(mono))
+
+    def _emit(self, audio: np.ndarray) -> None:
+        if len(audio):
+            self.decoded += len(audio)
+            self.on_audio(audio)
+
+    def close(self) -> None:
+        if self.failed:
+            return
+        if self.resampler is not None:
+            self._emit(self.resampler.flush())
+        self.on_end(self.layout is not None)
+
+    def abort(self) -> None:
+        """Stop decoding without flushing, e.g. for a cancelled upload"""
+        if not self.failed:
+            self.failed = True
+            self.on_end(False)
+
+class FfmpegStreamDecoder:
+    def __init__(self, on_audio: Callable[[np.ndarray], None], on_end: Callable[[bool], None]):
+        """Decode any ffmpeg-readable stream through a pipe as its bytes arrive
+
+        Containers that need seeking (e.g. M4A with the index at the end) fail
+        here; on_end(False) then tells the caller to decode the finished file.
+        """
+        self.on_audio = on_audio
+        self.on_end = on_end
+        self.failed = False
+        self.decoded = 0
+        self.process = subprocess.Popen(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self) -> None:
+        remainder = b""
+        while True:
+            block = self.process.stdout.read(256 * 1024)
+            if not block:
+                break
+            block = remainder + block
+            usable = len(block) - len(block) % 4
+            remainder = block[usable:]
+            if usable:
+                audio = np.frombuffer(block[:usable], dtype=np.float32).copy()
+                self.decoded += len(audio)
+                self.on_audio(audio)
+        ok = self.process.wait() == 0 and not self.failed
+        if not ok:
+            print(f"ffmpeg could not decode the stream (exit code {self.process.returncode})")
+        self.on_end(ok)
+
+    def feed(self, data: bytes) -> None:
+        if self.failed:
+            return
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            # ffmpeg gave up; the reader reports the failure
+            self.failed = True
+
+    def close(self) -> None:
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            self.failed = True
+
+    def abort(self) -> None:
+        """Kill ffmpeg; the reader then reports on_end(False)"""
+        self.failed = True
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+def stream_decoder(suffix: str, on_audio: Callable[[np.ndarray], None], on_end: Callable[[bool], None]):
+    """Incremental decoder for a file type: in-process for WAV, ffmpeg otherwise"""
+    if suffix.lower() == ".wav":
+        return WavStreamDecoder(on_audio, on_end)
+    return FfmpegStreamDecoder(on_audio, on_end)
@@ -1,17 +1,42 @@
 # services/audio_service.py
 import sounddevice as sd
+import soundfile as sf
 import numpy as np
 import wave
+import glob
+import os
+import time
+import uuid
+import ffmpeg
 from pathlib import Path
 from datetime import datetime
 import queue
 from typing import Optional
 
+from services.metrics import record_cache
+
+# Storage formats for recordings and the media type they are served with
+AUDIO_FORMATS = {
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+}
+
+# Playback formats that recordings can be transcoded to on download
+TRANSCODE_FORMATS = {
+    "mp3": {"media_type": "audio/mpeg", "acodec": "libmp3lame", "audio_bitrate": "64k"},
+    "ogg": {"media_type": "audio/ogg", "acodec": "libopus", "audio_bitrate": "32k"},
+}
+# Transcoded copies kept before the least recently used ones are removed
+TRANSCODE_CACHE_MAX_BYTES = int(os.environ.get("WHISPER_TRANSCODE_CACHE_MB", "1024")) * 1024 * 1024
+
 class AudioService:
-    def __init__(self, sample_rate: int = 44100, channels: int = 1):
+    def __init__(self, sample_rate: int = 44100, channels: int = 1, audio_format: str = "wav"):
         """Initialize audio service with recording parameters"""
+        if f".{audio_format}" not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
         self.sample_rate = sample_rate
         self.channels = channels
+        self.audio_format = audio_format
         self.is_recording = False
         self.audio_queue = queue.Queue()
         self.audio_data = []
@@ -68,26 +93,134 @@ class AudioService:
             self._stream = None
 
     def save_audio(self, audio_data: np.ndarray, output_dir: Path) -> Optional[Path]:
-        """Save audio data to WAV file"""
+        """Save audio data to a WAV or FLAC file"""
         if audio_data is None:
             return None
 
         try:
             output_dir.mkdir(parents=True, exist_ok=True)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = output_dir / f"audio_{timestamp}.wav"
+            filename = output_dir / f"audio_{timestamp}.{self.audio_format}"
 
-            with wave.open(str(filename), 'wb') as wf:
-                wf.setnchannels(self.channels)
-                wf.setsampwidth(2)  # 16-bit
-                wf.setframerate(self.sample_rate)
-                wf.writeframes(audio_data.tobytes())
+            if self.audio_format == "flac":
+                sf.write(str(filename), audio_data, self.sample_rate, format="FLAC", subtype="PCM_16")
+            else:
+                with wave.open(str(filename), 'wb') as wf:
+                    wf.setnchannels(self.channels)
+                    wf.setsampwidth(2)  # 16-bit
+                    wf.setframerate(self.sample_rate)
+                    wf.writeframes(audio_data.tobytes())
 
             return filename
         except Exception as e:
             print(f"Error saving audio: {e}")
             return None
 
+    def compact_recordings(self, directory: Path, min_age: float = 60.0) -> int:
+        """Losslessly convert WAV recordings older than min_age seconds to FLAC
+
+        A WAV whose .flac name is already taken is left alone and reported.
+        """
+        converted = 0
+        now = time.time()
+        for wav_path in sorted(directory.glob("*.wav")):
+            try:
+                stat = wav_path.stat()
+                if now - stat.st_mtime < min_age:
+                    # Recently written; it may still be in use
+                    continue
+
+                flac_path = wav_path.with_suffix(".flac")
+                if flac_path.exists():
+                    print(f"Warning: {flac_path.name} already exists, keeping {wav_path.name}")
+                    continue
+                tmp_path = directory / f".{wav_path.stem}.{uuid.uuid4().hex}.flac"
+                data, sample_rate = sf.read(str(wav_path), dtype="int16", always_2d=True)
+                sf.write(str(tmp_path), data, sample_rate, format="FLAC", subtype="PCM_16")
+
+                # Verify the round trip before removing the original
+                restored, _ = sf.read(str(tmp_path), dtype="int16", always_2d=True)
+                if not np.array_equal(data, restored):
+                    tmp_path.unlink()
+                    print(f"Warning: FLAC verification failed for {wav_path.name}, keeping WAV")
+                    continue
+
+                os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+                # link() refuses to replace a FLAC written meanwhile, unlike rename()
+                try:
+                    os.link(tmp_path, flac_path)
+                except FileExistsError:
+                    print(f"Warning: {flac_path.name} already exists, keeping {wav_path.name}")
+                    continue
+                finally:
+                    tmp_path.unlink()
+                wav_path.unlink()
+                converted += 1
+            except Exception as e:
+                print(f"Error compacting {wav_path.name}: {e}")
+        return converted
+
+    def transcode(self, file_path: Path, fmt: str, cache_dir: Path) -> Optional[Path]:
+        """Transcode a recording to a compressed format, reusing a cached copy if it is up to date"""
+        options = TRANSCODE_FORMATS.get(fmt)
+        if options is None:
+            return None
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Keyed by the full source name, size and mtime, so a.wav and a.flac (or a
+        # re-recorded file with an older mtime) never share a cached copy
+        stat = file_path.stat()
+        cached_path = cache_dir / f"{file_path.name}.{stat.st_size}.{stat.st_mtime_ns}.{fmt}"
+        if cached_path.exists():
+            record_cache("transcode", True)
+            # The mtime marks recent use for _trim_transcode_cache
+            os.utime(cached_path)
+            return cached_path
+        record_cache("transcode", False)
+
+        # Write to a temporary name first so concurrent requests never see a partial file
+        tmp_path = cache_dir / f".{file_path.stem}.{uuid.uuid4().hex}.{fmt}"
+        try:
+            (
+                ffmpeg
+                .input(str(file_path))
+                .output(str(tmp_path), acodec=options["acodec"], audio_bitrate=options["audio_bitrate"])
+                .overwrite_output()
+                .run(quiet=True)
+            )
+            tmp_path.replace(cached_path)
+            # Copies of earlier versions of this recording are never served again
+            for stale in cache_dir.glob(f"{glob.escape(file_path.name)}.*.{fmt}"):
+                if stale != cached_path:
+                    stale.unlink(missing_ok=True)
+            self._trim_transcode_cache(cache_dir, keep=cached_path)
+            return cached_path
+        except Exception as e:
+            print(f"Error transcoding audio: {e}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            return None
+
+    @staticmethod
+    def _trim_transcode_cache(cache_dir: Path, keep: Path) -> None:
+        """Remove the least recently used copies until the cache fits TRANSCODE_CACHE_MAX_BYTES"""
+        entries = []
+        for path in cache_dir.iterdir():
+            # Dotfiles are transcodes still being written
+            if path.name.startswith(".") or path == keep:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries) + keep.stat().st_size
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= TRANSCODE_CACHE_MAX_BYTES:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
     def get_recording_status(self) -> dict:
         """Get current recording status"""
         return {
@@ -0,0 +1,276 @@
+# services/cascade_service.py
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from whisper.audio import N_FRAMES
+
+from services.realtime_service import RealtimeTranscriptionService
+from services.streaming_features import StreamingLogMel
+from services.tracing import start_trace
+
+class TranscriptionTier:
+    def __init__(
+        self,
+        name: str,
+        transcription_service,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ):
+        """A model with its own worker threads, so one tier cannot starve the other
+
+        Defaults to one worker per model replica of the tier's service.
+        """
+        self.name = name
+        self.transcription_service = transcription_service
+        workers = workers or len(transcription_service.replicas)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-tier")
+        self.max_pending = max_pending
+        self.pending = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.max_pending is not None and self.pending >= self.max_pending
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Carry the current trace into the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self.executor, call)
+        finally:
+            self.pending -= 1
+
+    async def transcribe(self, audio: np.ndarray, sample_rate: int, decoding_profile: str) -> Optional[Dict]:
+        return await self._run(
+            self.transcription_service.transcribe_audio_data,
+            audio,
+            sample_rate=sample_rate,
+            decoding_profile=decoding_profile
+        )
+
+    async def transcribe_window(self, window, content_frames: int, decoding_profile: str) -> Optional[Dict]:
+        return await self._run(
+            self.transcription_service.transcribe_window, window, content_frames, decoding_profile=decoding_profile
+        )
+
+    def get_status(self) -> Dict:
+        return {
+            "model_name": self.transcription_service.model_name,
+            "pending": self.pending,
+            "service": self.transcription_service.get_status(),
+        }
+
+class UtteranceSegmenter:
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        energy_threshold: float = 0.01,
+        min_silence: float = 0.6,
+        max_utterance: float = 25.0,
+        pre_roll: float = 0.2,
+        frame_duration: float = 0.02
+    ):
+        """Split a stream into utterances at pauses, using frame RMS energy"""
+        self.sample_rate = sample_rate
+        self.energy_threshold = energy_threshold
+        self.min_silence = int(min_silence * sample_rate)
+        self.max_utterance = int(max_utterance * sample_rate)
+        self.pre_roll = int(pre_roll * sample_rate)
+        self.frame = int(frame_duration * sample_rate)
+        self.reset(0)
+
+    def reset(self, start: int) -> None:
+        self.parts = []
+        self.length = 0
+        self.start = start
+        self.has_speech = False
+        self.trailing_silence = 0
+
+    @property
+    def audio(self) -> np.ndarray:
+        return np.concatenate(self.parts) if self.parts else np.zeros(0, dtype=np.float32)
+
+    def _last_speech_frame_end(self, chunk: np.ndarray) -> int:
+        """Sample index just after the last frame above the energy threshold, or 0"""
+        frames = len(chunk) // self.frame
+        if frames == 0:
+            return 0
+        rms = np.sqrt(np.mean(chunk[:frames * self.frame].reshape(frames, self.frame) ** 2, axis=1))
+        speech = np.flatnonzero(rms >= self.energy_threshold)
+        return int(speech[-1] + 1) * self.frame if len(speech) else 0
+
+    def feed(self, chunk: np.ndarray, chunk_end: int) -> Optional[Tuple[np.ndarray, int, int]]:
+        """Add float32 audio ending chunk_end samples into the stream
+
+        Returns (audio, start, end) when an utterance has finished.
+        """
+        speech_end = self._last_speech_frame_end(chunk)
+        if not self.has_speech and speech_end == 0:
+            # Still silence: keep only a short pre-roll ahead of the next utterance
+            audio = np.concatenate([self.audio, chunk])[-self.pre_roll:] if self.pre_roll else chunk[:0]
+            self.parts = [audio]
+            self.length = len(audio)
+            self.start = chunk_end - self.length
+            return None
+
+        self.parts.append(chunk)
+        self.length += len(chunk)
+        if speech_end:
+            self.has_speech = True
+            self.trailing_silence = len(chunk) - speech_end
+        else:
+            self.trailing_silence += len(chunk)
+
+        if self.trailing_silence >= self.min_silence or self.length >= self.max_utterance:
+            utterance = (self.audio, self.start, chunk_end)
+            self.reset(chunk_end)
+            return utterance
+        return None
+
+class CascadeRealtimeService(RealtimeTranscriptionService):
+    def __init__(
+        self,
+        partial_tier: TranscriptionTier,
+        final_tier: TranscriptionTier,
+        sample_rate: int = 16000,
+        chunk_duration: float = 1.0,
+        max_queue_size: int = 10,
+        profile: Optional[str] = None,
+        decoding_profile: str = "realtime-fast",
+        final_decoding_profile: str = "archive-accurate"
+    ):
+        """Live partials from a small model, corrected finals from a larger one
+
+        Every chunk updates the current utterance and, when the session is
+        keeping up, re-decodes it with the partial tier. When a pause ends the
+        utterance it is queued on the final tier and a "final" result with the
+        same utterance_id replaces the partials (with empty text if the final
+        model heard nothing, so clients can drop them).
+        """
+        super().__init__(
+            partial_tier.transcription_service,
+            sample_rate=sample_rate,
+            chunk_duration=chunk_duration,
+            max_queue_size=max_queue_size,
+            profile=profile,
+            decoding_profile=decoding_profile
+        )
+        self.partial_tier = partial_tier
+        self.final_tier = final_tier
+        self.final_decoding_profile = final_decoding_profile
+        self.segmenter = UtteranceSegmenter(sample_rate)
+        self.utterance_count = 0
+        self.last_partial = ""
+        self.final_tasks = set()
+
+    @property
+    def utterance_id(self) -> str:
+        return f"{self.session_id}-{self.utterance_count}"
+
+    def _feature_capacity(self) -> int:
+        # Partials re-read the whole current utterance (at most 25 s plus pre-roll)
+        return N_FRAMES
+
+    async def _handle_chunk(self, chunk: np.ndarray, chunk_end: int) -> None:
+        if chunk.dtype == np.int16:
+            chunk = chunk.astype(np.float32) / 32768.0
+
+        if self.features is not None:
+            # Frames are computed once per chunk; partials re-read them from the utterance start
+            self._append_features(chunk, chunk_end)
+        utterance = self.segmenter.feed(chunk, chunk_end)
+        if self.features is not None:
+            self.features.discard(StreamingLogMel.frame_of(self.segmenter.start))
+        if utterance is not None:
+            audio, start, end = utterance
+            self._finish_utterance(audio, start, end)
+        elif (self.segmenter.has_speech and self.segmenter.trailing_silence < len(chunk)
+              and self.audio_buffer.empty()):
+            # Partials are only worth decoding for new speech at the head of the stream
+            await self._send_partial(chunk_end)
+
+    async def _send_partial(self, chunk_end: int) -> None:
+        try:
+            if self.features is not None:
+                window, content = self.features.window(StreamingLogMel.frame_of(self.segmenter.start))
+                result = await self.partial_tier.transcribe_window(window, content, self.decoding_profile)
+            else:
+                result = await self.partial_tier.transcribe(
+                    self.segmenter.audio, self.sample_rate, self.decoding_profile
+                )
+        except Exception as e:
+            print(f"Error in partial transcription: {e}")
+            return
+        text = result.get("text", "").strip() if result else ""
+        if not text:
+            return
+        self.last_partial = text
+        await self._notify({
+            "type": "partial",
+            "utterance_id": self.utterance_id,
+            "text": text,
+            "timestamp": datetime.now().isoformat(),
+            "start": self.segmenter.start / self.sample_rate,
+            "audio_offset": chunk_end / self.sample_rate,
+            "model": self.partial_tier.transcription_service.model_name,
+            "decoding_profile": result.get("decoding_profile", self.decoding_profile)
+        })
+
+    def _finish_utterance(self, audio: np.ndarray, start: int, end: int) -> None:
+        utterance_id, partial = self.utterance_id, self.last_partial
+        self.utterance_count += 1
+        self.last_partial = ""
+        task = asyncio.create_task(self._send_final(utterance_id, partial, audio, start, end))
+        self.final_tasks.add(task)
+        task.add_done_callback(self.final_tasks.discard)
+
+    async def _send_final(self, utterance_id: str, partial: str, audio: np.ndarray, start: int, end: int) -> None:
+        """Re-decode a finished utterance with the final tier and send the corrected text"""
+        with start_trace("realtime_final", profile=self.profile) as trace:
+            trace.attributes.update(session_id=self.session_id, utterance_id=utterance_id)
+            result = None
+            if self.final_tier.saturated:
+                # Final tier is backlogged: confirm the last partial instead of queueing more work
+                trace.attributes["skipped"] = True
+            else:
+                try:
+                    result = await self.final_tier.transcribe(audio, self.sample_rate, self.final_decoding_profile)
+                except Exception as e:
+                    print(f"Error in final transcription: {e}")
+
+            text = result.get("text", "").strip() if result else partial
+            if not text and not partial:
+                return
+            tier = self.final_tier if result else self.partial_tier
+            await self._notify({
+                "type": "final",
+                "utterance_id": utterance_id,
+                "text": text,
+                "timestamp": datetime.now().isoformat(),
+                "start": start / self.sample_rate,
+                "end": end / self.sample_rate,
+                "audio_offset": end / self.sample_rate,
+                "model": tier.transcription_service.model_name,
+                "decoding_profile": result.get("decoding_profile") if result else self.decoding_profile
+            })
+
+    def get_status(self) -> Dict:
+        status = super().get_status()
+        status.update({
+            "mode": "cascade",
+            "utterances": self.utterance_count,
+            "pending_finals": len(self.final_tasks),
+        })
+        return status
+
+    def stop(self) -> None:
+        for task in list(self.final_tasks):
+            task.cancel()
+        super().stop()
@@ -0,0 +1,84 @@
+# services/compiled.py
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Set, Tuple
+
+import torch
+from whisper.audio import N_FRAMES
+
+from services.decoding_profiles import DECODING_PROFILES
+
+BACKENDS = ("eager", "compile")
+
+class CompiledForward:
+    def __init__(self, module: torch.nn.Module, shapes: Iterable[Tuple[int, ...]], name: str):
+        """Replace module.forward with a torch.compile'd version for fixed input shapes
+
+        Calls whose first argument has one of `shapes` use the compiled graph;
+        any other shape, or a compile failure, runs the original eager forward,
+        so no call ever triggers a recompile.
+        """
+        self.name = name
+        self.shapes: Set[Tuple[int, ...]] = set(shapes)
+        self.eager = module.forward
+        self.compiled = torch.compile(self.eager, dynamic=False)
+        self.failed = False
+        self.compiled_calls = 0
+        self.eager_calls = 0
+        module.forward = self
+
+    def __call__(self, x, *args, **kwargs):
+        if not self.failed and tuple(x.shape) in self.shapes:
+            try:
+                result = self.compiled(x, *args, **kwargs)
+                self.compiled_calls += 1
+                return result
+            except Exception as e:
+                print(f"Compiled {self.name} failed, falling back to eager: {e}")
+                self.failed = True
+        self.eager_calls += 1
+        return self.eager(x, *args, **kwargs)
+
+    def get_status(self) -> Dict:
+        return {
+            "shapes": sorted(self.shapes),
+            "failed": self.failed,
+            "compiled_calls": self.compiled_calls,
+            "eager_calls": self.eager_calls,
+        }
+
+def decoding_batch_sizes() -> Set[int]:
+    """Decoder batch sizes the decoding profiles can produce (beam size or sample count)"""
+    sizes = {1}
+    for profile in DECODING_PROFILES.values():
+        sizes.update(size for size in (profile["beam_size"], profile["best_of"]) if size)
+    return sizes
+
+def configure_compile_cache(cache_dir: Path) -> None:
+    """Keep inductor's compiled kernels and FX graphs on disk across restarts"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir.resolve()))
+    torch._inductor.config.fx_graph_cache = True
+
+def compile_model(model, device: str, warmup: bool = True) -> Dict[str, CompiledForward]:
+    """Compile the encoder for one 30-second window and each decoder block's MLP for single-token steps
+
+    The encoder always sees (1, n_mels, 3000); after the prompt, every decoder
+    step feeds (batch, 1, n_state) through the blocks. Warm-up compiles each
+    bucket up front so the first request does not pay for it.
+    """
+    dims = model.dims
+    compiled = {
+        "encoder": CompiledForward(model.encoder, [(1, dims.n_mels, N_FRAMES)], "encoder")
+    }
+    step_shapes = [(batch, 1, dims.n_text_state) for batch in sorted(decoding_batch_sizes())]
+    for i, block in enumerate(model.decoder.blocks):
+        compiled[f"decoder.mlp.{i}"] = CompiledForward(block.mlp, step_shapes, f"decoder block {i} MLP")
+
+    if warmup:
+        with torch.inference_mode():
+            model.encoder(torch.zeros(1, dims.n_mels, N_FRAMES, device=device))
+            for block in model.decoder.blocks:
+                for shape in step_shapes:
+                    block.mlp(torch.zeros(shape, device=device))
+    return compiled
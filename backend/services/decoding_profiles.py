@@ -0,0 +1,79 @@
+# services/decoding_profiles.py
+from typing import Dict
+
+import whisper
+
+# Named latency/accuracy trade-offs for whisper.transcribe.
+#   temperature: fallback schedule; a single value disables the retry loop
+#   beam_size / best_of: beam search at T=0 and sample count at T>0 (None = greedy)
+#   queue_slo: queue wait in seconds above which the scheduler steps the profile down
+DECODING_PROFILES: Dict[str, Dict] = {
+    "realtime-fast": {
+        "temperature": (0.0,),
+        "beam_size": None,
+        "best_of": None,
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+        "without_timestamps": True,
+        "queue_slo": 0.5,
+    },
+    "balanced": {
+        "temperature": (0.0, 0.4, 0.8),
+        "beam_size": None,
+        "best_of": 3,
+        "condition_on_previous_text": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+        "without_timestamps": False,
+        "queue_slo": 5.0,
+    },
+    "archive-accurate": {
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "beam_size": 5,
+        "best_of": 5,
+        "condition_on_previous_text": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+        "without_timestamps": False,
+        "queue_slo": 30.0,
+    },
+}
+
+# Most to least expensive; stepping down moves right
+DEGRADE_ORDER = ["archive-accurate", "balanced", "realtime-fast"]
+
+def get_profile(name: str) -> Dict:
+    if name not in DECODING_PROFILES:
+        raise ValueError(f"Unknown decoding profile: {name}. Choose from {', '.join(DECODING_PROFILES)}")
+    return DECODING_PROFILES[name]
+
+def step_down(name: str, steps: int = 1) -> str:
+    """Return the profile `steps` cheaper than name, stopping at the fastest"""
+    index = DEGRADE_ORDER.index(name) + max(steps, 0)
+    return DEGRADE_ORDER[min(index, len(DEGRADE_ORDER) - 1)]
+
+def select_profile(name: str, queue_wait: float, max_steps: int = 2) -> str:
+    """Step name down one level for every multiple of its queue SLO that queue_wait exceeds"""
+    slo = get_profile(name)["queue_slo"]
+    if queue_wait <= slo:
+        return name
+    return step_down(name, min(int(queue_wait // slo), max_steps))
+
+def transcribe_options(name: str) -> Dict:
+    """Keyword arguments for whisper.transcribe"""
+    return {k: v for k, v in get_profile(name).items() if k != "queue_slo"}
+
+def decoding_options(name: str, **kwargs) -> whisper.DecodingOptions:
+    """DecodingOptions for a single 30-second window, using the first temperature only"""
+    profile = get_profile(name)
+    options = {
+        "temperature": profile["temperature"][0],
+        "beam_size": profile["beam_size"],
+        "without_timestamps": profile["without_timestamps"],
+    }
+    options.update(kwargs)
+    return whisper.DecodingOptions(**options)
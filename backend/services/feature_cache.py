@@ -0,0 +1,145 @@
+# services/feature_cache.py
+import whisper
+from whisper.audio import N_FFT, N_SAMPLES, HOP_LENGTH, SAMPLE_RATE
+import numpy as np
+import hashlib
+import importlib
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+import torch
+
+from services.audio_loader import load_audio
+from services.metrics import observe_stage, record_cache
+
+# whisper.transcribe computes the padded log-mel of its input in one call to
+# log_mel_spectrogram; this thread's precomputed features are returned there
+# instead, so cached features go through whisper's own seek loop unchanged
+_transcribe_module = importlib.import_module("whisper.transcribe")
+_log_mel_spectrogram = _transcribe_module.log_mel_spectrogram
+_precomputed = threading.local()
+
+def _cached_log_mel_spectrogram(audio, *args, **kwargs):
+    mel = getattr(_precomputed, "mel", None)
+    return mel if mel is not None else _log_mel_spectrogram(audio, *args, **kwargs)
+
+_transcribe_module.log_mel_spectrogram = _cached_log_mel_spectrogram
+
+@contextmanager
+def precomputed_mel(mel: torch.Tensor):
+    """Have whisper.transcribe on this thread use mel (padded like N_SAMPLES) instead of its input audio"""
+    _precomputed.mel = mel
+    try:
+        yield
+    finally:
+        _precomputed.mel = None
+
+class FeatureCache:
+    def __init__(self, n_mels: int = 80):
+        """Sidecar cache of padded log-mel spectrograms stored next to each recording"""
+        self.n_mels = n_mels
+
+    @property
+    def feature_params(self) -> dict:
+        """Parameters that invalidate cached features when they change"""
+        return {
+            "n_mels": self.n_mels,
+            "n_fft": N_FFT,
+            "hop_length": HOP_LENGTH,
+            "sample_rate": SAMPLE_RATE,
+            "padding": N_SAMPLES,
+            "whisper_version": getattr(whisper, "__version__", "unknown"),
+        }
+
+    @staticmethod
+    def _sidecar_paths(audio_path: Path):
+        return audio_path.with_suffix(".mel.npy"), audio_path.with_suffix(".mel.json")
+
+    @staticmethod
+    def _hash_file(audio_path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(audio_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _file_stat(audio_path: Path) -> dict:
+        stat = audio_path.stat()
+        return {"audio_size": stat.st_size, "audio_mtime_ns": stat.st_mtime_ns}
+
+    def _read_meta(self, meta_path: Path) -> Optional[dict]:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta if meta.get("params") == self.feature_params else None
+
+    def _write_meta(self, meta_path: Path, meta: dict) -> None:
+        tmp_meta = meta_path.with_name(f".{uuid.uuid4().hex}.json")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        tmp_meta.replace(meta_path)
+
+    def load(self, audio_path: Path, audio_hash: Optional[str] = None) -> Optional[np.ndarray]:
+        """Memory-map cached features if they match the audio and feature parameters
+
+        The audio is only hashed when its size or mtime differ from the ones
+        recorded with the features. The map is copy-on-write, so it can back a
+        writable tensor without reading the file into memory.
+        """
+        features_path, meta_path = self._sidecar_paths(audio_path)
+        if not features_path.exists() or not meta_path.exists():
+            return None
+
+        try:
+            meta = self._read_meta(meta_path)
+            if meta is None:
+                return None
+            stat = self._file_stat(audio_path)
+            if any(meta.get(key) != value for key, value in stat.items()):
+                if meta.get("audio_sha256") != (audio_hash or self._hash_file(audio_path)):
+                    return None
+                # Same content with a new mtime (e.g. copied); skip the hash next time
+                self._write_meta(meta_path, {**meta, **stat})
+            return np.load(features_path, mmap_mode="c")
+        except Exception as e:
+            print(f"Error loading cached features: {e}")
+            return None
+
+    def store(self, audio_path: Path, mel: np.ndarray, audio_hash: Optional[str] = None) -> None:
+        """Write features and their metadata next to the recording"""
+        features_path, meta_path = self._sidecar_paths(audio_path)
+        meta = {
+            "audio_sha256": audio_hash or self._hash_file(audio_path),
+            **self._file_stat(audio_path),
+            "params": self.feature_params,
+            "shape": list(mel.shape),
+        }
+
+        # Write to a temporary file first so readers never map a partial array
+        tmp_features = features_path.with_name(f".{uuid.uuid4().hex}.npy")
+        try:
+            np.save(tmp_features, np.ascontiguousarray(mel, dtype=np.float32))
+            tmp_features.replace(features_path)
+            self._write_meta(meta_path, meta)
+        except Exception as e:
+            print(f"Error storing cached features: {e}")
+            if tmp_features.exists():
+                tmp_features.unlink()
+
+    def get_or_compute(self, audio_path: Path) -> np.ndarray:
+        """Return cached features, computing and storing them on a miss"""
+        mel = self.load(audio_path)
+        record_cache("features", mel is not None)
+        if mel is not None:
+            return mel
+
+        with observe_stage("decode"):
+            audio = load_audio(audio_path)
+        with observe_stage("mel"):
+            mel = whisper.log_mel_spectrogram(audio, self.n_mels, padding=N_SAMPLES).numpy()
+        self.store(audio_path, mel)
+        return mel
@@ -0,0 +1,159 @@
+# services/inference_worker.py
+"""Inference worker process: serves TranscriptionService calls over local IPC
+
+Run one or more workers next to the API (from the backend directory):
+    WHISPER_WORKER_AUTHKEY=secret python -m services.inference_worker --listen 127.0.0.1:7001 --model base
+and point the API at them:
+    WHISPER_WORKER_AUTHKEY=secret WHISPER_INFERENCE_WORKERS=127.0.0.1:7001,127.0.0.1:7002 python main.py
+
+Requests and results are small dicts over multiprocessing.connection. Clients
+on the same machine pass audio in a shared-memory buffer they own, which is
+read in place; remote clients send the samples (or file contents) in the
+request. Stage timings are traced under the client's trace id and returned
+with each result.
+"""
+import argparse
+import os
+import tempfile
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Listener
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from services.remote_service import parse_address
+from services.tracing import start_trace
+from services.transcription_service import TranscriptionService
+
+# Service methods a client may call; audio methods take the shared-memory array as first argument
+METHODS = {"transcribe_audio_data", "transcribe_file", "transcribe_recording", "get_model_info", "get_status"}
+AUDIO_METHODS = {"transcribe_audio_data"}
+PATH_METHODS = {"transcribe_file", "transcribe_recording"}
+
+class ModelRegistry:
+    def __init__(self, service_kwargs: Optional[Dict] = None):
+        """TranscriptionService instances by model name, loaded on first use"""
+        self.service_kwargs = service_kwargs or {}
+        self.services: Dict[str, TranscriptionService] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str) -> TranscriptionService:
+        with self._lock:
+            if model_name not in self.services:
+                self.services[model_name] = TranscriptionService(model_name=model_name, **self.service_kwargs)
+            return self.services[model_name]
+
+class SharedAudio:
+    def __init__(self):
+        """The client's current shared-memory buffer for one connection"""
+        self.shm: Optional[SharedMemory] = None
+
+    def view(self, spec: Dict) -> np.ndarray:
+        if "data" in spec:
+            # Sent inline by a client on another machine
+            return np.frombuffer(spec["data"], dtype=np.dtype(spec["dtype"])).reshape(tuple(spec["shape"]))
+        if self.shm is None or self.shm.name != spec["name"]:
+            self.close()
+            self.shm = SharedMemory(name=spec["name"])
+            # The client owns (and unlinks) the segment; stop this process's tracker from removing it
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        return np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=self.shm.buf)
+
+    def close(self) -> None:
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                pass
+            self.shm = None
+
+def _dispatch(request: Dict, registry: ModelRegistry, audio: SharedAudio):
+    method = request["method"]
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    # Per-request options such as language arrive in kwargs; the service itself is shared
+    service = registry.get(request["model"])
+    kwargs = request.get("kwargs", {})
+
+    if method in AUDIO_METHODS:
+        return getattr(service, method)(audio.view(request["audio"]), **kwargs)
+    if method in PATH_METHODS and "file" in request:
+        # A remote client's file, written to a temporary copy; the feature
+        # cache belongs next to the original recording, so it is not used here
+        upload = request["file"]
+        with tempfile.NamedTemporaryFile(suffix=upload["suffix"]) as tmp_file:
+            tmp_file.write(upload["data"])
+            tmp_file.flush()
+            return service.transcribe_file(Path(tmp_file.name), **kwargs)
+    if method in PATH_METHODS:
+        return getattr(service, method)(Path(request["path"]), **kwargs)
+    return getattr(service, method)(**kwargs)
+
+def handle_connection(conn, registry: ModelRegistry) -> None:
+    """Serve one client connection until it closes"""
+    audio = SharedAudio()
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break
+            with start_trace(
+                f"worker_{request.get('method')}", request.get("trace_id"), request.get("profile")
+            ) as trace:
+                try:
+                    response = {"result": _dispatch(request, registry, audio)}
+                except Exception as e:
+                    print(f"Error handling {request.get('method')}: {e}")
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                response["spans"] = trace.spans
+            conn.send(response)
+    finally:
+        audio.close()
+        conn.close()
+
+def serve(address, authkey: bytes, preload=(), service_kwargs: Optional[Dict] = None) -> None:
+    """Accept clients on address, one thread per connection"""
+    registry = ModelRegistry(service_kwargs)
+    listener = Listener(address, authkey=authkey)
+    print(f"Inference worker {os.getpid()} listening on {listener.address}")
+
+    # Listen first so clients can connect while models load
+    for model_name in preload:
+        threading.Thread(target=registry.get, args=(model_name,), daemon=True).start()
+
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"Error accepting connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(conn, registry), daemon=True).start()
+    finally:
+        listener.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listen", required=True, help="host:port or Unix socket path")
+    parser.add_argument("--model", action="append", default=[], help="Model to load at startup (repeatable)")
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--backend", default="eager")
+    parser.add_argument("--replicas", help="Replica layout inside this worker, e.g. 2x4")
+    args = parser.parse_args()
+
+    authkey = os.environ.get("WHISPER_WORKER_AUTHKEY")
+    if not authkey:
+        raise SystemExit("WHISPER_WORKER_AUTHKEY must be set; clients authenticate with the same key")
+    serve(
+        parse_address(args.listen),
+        authkey.encode(),
+        preload=args.model,
+        service_kwargs={"precision": args.precision, "backend": args.backend, "replicas": args.replicas}
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# services/metrics.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+
+from services.tracing import current_trace
+
+# Latency buckets from 1 ms (decoder steps) up to several minutes (long files)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+STAGE_SECONDS = Histogram(
+    "whisper_stage_seconds",
+    "Time spent in each pipeline stage (decode, resample, mel, encoder, decoder, inference)",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+# Gauges are summed over live processes in multiprocess mode (pre-forked workers)
+IN_FLIGHT = Gauge("whisper_inferences_in_flight", "Transcriptions currently running", multiprocess_mode="livesum")
+QUEUE_DEPTH = Gauge(
+    "whisper_session_queue_depth", "Audio chunks waiting for inference", ["session"], multiprocess_mode="livesum"
+)
+AUDIO_PROCESSED_SECONDS = Counter("whisper_audio_processed_seconds_total", "Audio accepted for transcription")
+AUDIO_DROPPED_SECONDS = Counter("whisper_audio_dropped_seconds_total", "Audio dropped because a queue was full")
+SESSION_AUDIO_PROCESSED_SECONDS = Counter(
+    "whisper_session_audio_processed_seconds_total", "Audio accepted for transcription per session", ["session"]
+)
+SESSION_AUDIO_DROPPED_SECONDS = Counter(
+    "whisper_session_audio_dropped_seconds_total", "Audio dropped per session", ["session"]
+)
+ACTIVE_SESSIONS = Gauge("whisper_active_sessions", "Open realtime sessions", multiprocess_mode="livesum")
+MODEL_LOAD_SECONDS = Gauge(
+    "whisper_model_load_seconds", "Time taken to load each model", ["model"], multiprocess_mode="max"
+)
+CACHE_REQUESTS = Counter("whisper_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+PROFILE_REQUESTS = Counter(
+    "whisper_decoding_profile_total", "Model calls by requested and used decoding profile", ["requested", "used"]
+)
+
+def record_stage(stage: str, duration: float, start: float, **attributes) -> None:
+    """Add a measured stage to the stage histogram and the current trace"""
+    STAGE_SECONDS.labels(stage).observe(duration)
+    trace = current_trace()
+    if trace is not None:
+        trace.record(stage, duration, start, **attributes)
+
+@contextmanager
+def observe_stage(stage: str):
+    """Record the duration of a block in the stage histogram and the current trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, start)
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_audio(session: str, seconds: float, dropped: bool = False) -> None:
+    """Count audio accepted or dropped, overall and for one session"""
+    if dropped:
+        AUDIO_DROPPED_SECONDS.inc(seconds)
+        SESSION_AUDIO_DROPPED_SECONDS.labels(session).inc(seconds)
+    else:
+        AUDIO_PROCESSED_SECONDS.inc(seconds)
+        SESSION_AUDIO_PROCESSED_SECONDS.labels(session).inc(seconds)
+
+def remove_session(session: str) -> None:
+    """Drop per-session series so closed sessions do not accumulate"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Removed series stay in the process's metrics file; zero the depth first
+        QUEUE_DEPTH.labels(session).set(0)
+    for metric in (QUEUE_DEPTH, SESSION_AUDIO_PROCESSED_SECONDS, SESSION_AUDIO_DROPPED_SECONDS):
+        try:
+            metric.remove(session)
+        except KeyError:
+            pass
+
+def instrument_model(model) -> None:
+    """Time every encoder and decoder forward pass with module hooks"""
+    starts = threading.local()
+
+    def add_hooks(module, stage):
+        def before(_module, _inputs):
+            setattr(starts, stage, time.perf_counter())
+
+        def after(_module, _inputs, _output):
+            start = getattr(starts, stage, None)
+            if start is not None:
+                STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+        module.register_forward_pre_hook(before)
+        module.register_forward_hook(after)
+
+    add_hooks(model.encoder, "encoder")
+    add_hooks(model.decoder, "decoder")
@@ -0,0 +1,168 @@
+# services/prefork.py
+"""Pre-fork serving: load the models once, then fork uvicorn workers that share them
+
+    WHISPER_PREFORK=4 python main.py
+
+The master imports the app (which loads the Whisper models), freezes the
+heap and forks the workers. Model weights are never written after loading,
+so their pages stay shared copy-on-write between all workers; each worker
+only adds its own interpreter state, kv-caches and activations.
+
+Metrics are collected across workers with prometheus_client's multiprocess
+mode, in PROMETHEUS_MULTIPROC_DIR (a temporary directory if unset).
+"""
+import gc
+import os
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+
+from services.replicas import cpu_allocator, process_cpus
+
+def prefork_workers() -> int:
+    """Worker processes requested by WHISPER_PREFORK (0 = single process)"""
+    setting = os.environ.get("WHISPER_PREFORK", "").strip()
+    return int(setting) if setting.isdigit() else 0
+
+def prepare_master() -> None:
+    """Call before the models load when pre-forking
+
+    torch's OpenMP pool does not survive fork: a child that starts a parallel
+    region after the parent's pool is running hangs. The master therefore
+    loads with a single intra-op thread and each worker sets its own count.
+
+    It also has to run before prometheus_client is imported, which picks
+    multiprocess mode from PROMETHEUS_MULTIPROC_DIR at import time.
+    """
+    if prefork_workers():
+        torch.set_num_threads(1)
+        _prepare_metrics_dir()
+
+def _prepare_metrics_dir() -> None:
+    """Point PROMETHEUS_MULTIPROC_DIR at an empty directory shared by all workers"""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        # Files left by a previous run would be added to this run's totals
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        for stale in Path(directory).glob("*.db"):
+            stale.unlink()
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="whisper-metrics-")
+
+def process_memory(pid: int) -> Dict[str, float]:
+    """RSS, PSS and private memory of a process in MB (Linux only)"""
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    memory = {"rss_mb": 0.0, "pss_mb": 0.0, "private_mb": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] += int(value.split()[0]) / 1024
+    except OSError as e:
+        print(f"Error reading memory of process {pid}: {e}")
+    return memory
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def worker_cpus(slot: int, workers: int) -> List[int]:
+    """The slot's share of the master's CPUs"""
+    cpus = process_cpus()
+    if workers >= len(cpus):
+        return [cpus[slot % len(cpus)]]
+    return cpus[slot * len(cpus) // workers:(slot + 1) * len(cpus) // workers]
+
+def _run_worker(app, sock: socket.socket, threads: Optional[int], cpus: List[int], uvicorn_kwargs: Dict) -> None:
+    import uvicorn
+
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    if hasattr(os, "sched_setaffinity"):
+        # Threads started from here on (uvicorn, replicas) inherit the share
+        os.sched_setaffinity(0, cpus)
+    # Replicas were pinned across all of the master's CPUs; move them into this worker's share
+    cpu_allocator.restrict(cpus)
+    if threads:
+        torch.set_num_threads(threads)
+    uvicorn.Server(uvicorn.Config(app, **uvicorn_kwargs)).run(sockets=[sock])
+
+def serve(app, host: str = "0.0.0.0", port: int = 8000, workers: Optional[int] = None,
+          threads: Optional[int] = None, **uvicorn_kwargs) -> None:
+    """Fork `workers` uvicorn servers on one listening socket and supervise them
+
+    Workers that exit unexpectedly are replaced by a fresh fork of the master,
+    which still holds the loaded models. SIGINT/SIGTERM stop all workers.
+    """
+    workers = workers or prefork_workers() or 1
+    if threads is None:
+        threads = max(1, len(process_cpus()) // workers)
+
+    # Parameters are already frozen; move everything allocated so far out of the
+    # collector's reach so gc passes in the workers do not dirty shared pages
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(host, port)
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                _run_worker(app, sock, threads, worker_cpus(slot, workers), uvicorn_kwargs)
+            except BaseException as e:
+                print(f"Error in worker {os.getpid()}: {e}")
+                status = 1
+            finally:
+                os._exit(status)
+        children[pid] = slot
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"Pre-fork master {os.getpid()}: {workers} workers x {threads} threads on {host}:{port}")
+    for slot in range(workers):
+        spawn(slot)
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = children.pop(pid, None)
+            if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+                # Drop the dead worker's live gauges (in-flight inferences, sessions)
+                from prometheus_client import multiprocess
+                multiprocess.mark_process_dead(pid)
+            if slot is None or stopping:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            time.sleep(1)
+            spawn(slot)
+    finally:
+        sock.close()
@@ -0,0 +1,63 @@
+# services/quantization.py
+from dataclasses import asdict
+from pathlib import Path
+
+import torch
+import whisper
+from whisper.model import AudioEncoder, ModelDimensions, TextDecoder, Whisper
+
+PRECISIONS = ("fp32", "int8")
+
+def quantize_model(model: Whisper) -> Whisper:
+    """Apply dynamic int8 quantization to every linear layer (CPU only)
+
+    Whisper's Linear subclass only adds dtype casting, which int8 kernels do
+    not need; switching to nn.Linear lets quantize_dynamic pick the layers up.
+    """
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    model = torch.ao.quantization.quantize_dynamic(model.cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def save_quantized(model: Whisper, path: Path) -> None:
+    """Save a quantized model with the dimensions needed to rebuild it"""
+    torch.save({
+        "dims": asdict(model.dims),
+        "alignment_heads": model.alignment_heads.to_dense(),
+        "model_state_dict": model.state_dict(),
+    }, str(path))
+
+def load_quantized(path: Path) -> Whisper:
+    """Rebuild a quantized model from save_quantized without materialising fp32 linear weights"""
+    checkpoint = torch.load(str(path), map_location="cpu", mmap=True)
+    dims = ModelDimensions(**checkpoint["dims"])
+
+    # Build the modules on the meta device; Whisper.__init__ itself cannot run there
+    # (it makes a sparse buffer), so assemble the model around them
+    model = Whisper.__new__(Whisper)
+    torch.nn.Module.__init__(model)
+    model.dims = dims
+    with torch.device("meta"):
+        model.encoder = AudioEncoder(
+            dims.n_mels, dims.n_audio_ctx, dims.n_audio_state, dims.n_audio_head, dims.n_audio_layer
+        )
+        model.decoder = TextDecoder(
+            dims.n_vocab, dims.n_text_ctx, dims.n_text_state, dims.n_text_head, dims.n_text_layer
+        )
+
+    # Swap in empty int8 layers, then allocate the remaining (non-linear) tensors for loading
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, torch.nn.Linear):
+                setattr(module, name, torch.ao.nn.quantized.dynamic.Linear(
+                    child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8
+                ))
+    model = model.to_empty(device="cpu")
+    model.load_state_dict(checkpoint["model_state_dict"])
+
+    # Non-persistent buffers are not in the checkpoint
+    n_ctx = dims.n_text_ctx
+    model.decoder.register_buffer("mask", torch.empty(n_ctx, n_ctx).fill_(-float("inf")).triu_(1), persistent=False)
+    model.register_buffer("alignment_heads", checkpoint["alignment_heads"].to_sparse(), persistent=False)
+    return model.eval()
@@ -7,6 +7,14 @@ from datetime import datetime
 from pathlib import Path
 import wave
 import json
+import time
+import uuid
+
+from whisper.audio import N_FRAMES
+
+from services.metrics import QUEUE_DEPTH, observe_stage, record_audio, remove_session
+from services.streaming_features import StreamingLogMel
+from services.tracing import current_trace, start_trace
 
 class RealtimeTranscriptionService:
     def __init__(
@@ -14,9 +22,18 @@ class RealtimeTranscriptionService:
         transcription_service,
         sample_rate: int = 16000,
         chunk_duration: float = 2.0,
-        max_queue_size: int = 10
+        max_queue_size: int = 10,
+        profile: Optional[str] = None,
+        decoding_profile: str = "realtime-fast",
+        streaming_features: bool = True
     ):
-        """Initialize realtime transcription service"""
+        """Initialize realtime transcription service
+
+        With streaming_features (and an in-process model) log-mel frames are
+        computed once as chunks arrive and the encoder reads them directly,
+        instead of each chunk being re-analysed by model.transcribe().
+        """
+        self.session_id = uuid.uuid4().hex[:12]
         self.transcription_service = transcription_service
         self.sample_rate = sample_rate
         self.chunk_duration = chunk_duration
@@ -24,32 +41,76 @@ class RealtimeTranscriptionService:
 
         # Buffers and queues
         self.audio_buffer = queue.Queue(maxsize=max_queue_size)
-        self.current_chunk = []
+        # int16 samples not yet making up a full chunk
+        self.current_chunk = np.zeros(0, dtype=np.int16)
         self.transcription_callbacks: List[Callable] = []
 
         # State management
         self.is_processing = False
         self.total_processed = 0
         self.dropped_chunks = 0
-
-    async def process_audio_chunk(self, chunk_data: np.ndarray) -> Optional[Dict]:
-        """Process a single chunk of audio data"""
+        # Samples received on the stream so far; used to tag results with their position
+        self.samples_received = 0
+        # Optional profiler ("cprofile" or "torch") applied to every chunk of this session
+        self.profile = profile
+        # Starting decoding profile; the scheduler may step it down under load
+        self.decoding_profile = decoding_profile
+        self.features = self._create_features() if streaming_features else None
+
+    def _feature_capacity(self) -> int:
+        """Frames kept per stream: one chunk plus a little left context"""
+        return min(StreamingLogMel.frame_of(self.chunk_size) + 50, N_FRAMES)
+
+    def _create_features(self) -> Optional[StreamingLogMel]:
+        model = getattr(self.transcription_service, "model", None)
+        if model is None or not hasattr(self.transcription_service, "transcribe_window"):
+            # Remote workers take audio, not features
+            return None
+        return StreamingLogMel(
+            model.dims.n_mels, capacity=self._feature_capacity(), device=self.transcription_service.device
+        )
+
+    def _append_features(self, chunk: np.ndarray, chunk_end: int) -> int:
+        """Add a float32 chunk ending chunk_end samples in; returns the frame where it starts"""
+        chunk_start = max(chunk_end - len(chunk), 0)
+        if self.features.position != chunk_start:
+            # Dropped chunks leave a gap in the stream: start the frames over here
+            self.features.reset(chunk_start)
+        with observe_stage("mel"):
+            self.features.append(chunk)
+        return StreamingLogMel.frame_of(chunk_start)
+
+    async def process_audio_chunk(self, chunk_data: np.ndarray, chunk_end: int = 0) -> Optional[Dict]:
+        """Process a single chunk of audio data ending chunk_end samples into the stream"""
         try:
             # Normalize audio data
             if chunk_data.dtype == np.int16:
                 chunk_data = chunk_data.astype(np.float32) / 32768.0
 
-            # Transcribe the chunk
-            result = self.transcription_service.transcribe_audio_data(
-                chunk_data,
-                sample_rate=self.sample_rate
-            )
+            # Transcribe the chunk in a worker thread so other streams keep flowing
+            if self.features is not None:
+                window, content = self.features.window(self._append_features(chunk_data, chunk_end))
+                result = await asyncio.to_thread(
+                    self.transcription_service.transcribe_window,
+                    window,
+                    content,
+                    decoding_profile=self.decoding_profile
+                )
+            else:
+                result = await asyncio.to_thread(
+                    self.transcription_service.transcribe_audio_data,
+                    chunk_data,
+                    sample_rate=self.sample_rate,
+                    decoding_profile=self.decoding_profile
+                )
 
             if result and result.get("text", "").strip():
                 return {
                     "text": result["text"],
                     "timestamp": datetime.now().isoformat(),
-                    "confidence": result.get("confidence", 1.0)
+                    "confidence": result.get("confidence", 1.0),
+                    "audio_offset": chunk_end / self.sample_rate,
+                    "decoding_profile": result.get("decoding_profile", self.decoding_profile)
                 }
             return None
 
@@ -64,21 +125,26 @@ class RealtimeTranscriptionService:
             chunk = np.frombuffer(audio_data, dtype=np.int16)
 
             # Add to current chunk buffer
-            self.current_chunk.extend(chunk)
+            self.current_chunk = np.concatenate([self.current_chunk, chunk])
+            self.samples_received += len(chunk)
 
-            # Process if we have enough data
-            if len(self.current_chunk) >= self.chunk_size:
+            # Process while we have enough data
+            while len(self.current_chunk) >= self.chunk_size:
                 # Extract chunk for processing
-                process_chunk = np.array(self.current_chunk[:self.chunk_size])
+                process_chunk = self.current_chunk[:self.chunk_size]
                 self.current_chunk = self.current_chunk[self.chunk_size:]
 
                 try:
                     # Try to add to processing queue
-                    self.audio_buffer.put_nowait(process_chunk)
+                    chunk_end = self.samples_received - len(self.current_chunk)
+                    self.audio_buffer.put_nowait((process_chunk, chunk_end, time.perf_counter()))
                     self.total_processed += len(process_chunk)
+                    record_audio(self.session_id, len(process_chunk) / self.sample_rate)
                 except queue.Full:
                     self.dropped_chunks += 1
+                    record_audio(self.session_id, len(process_chunk) / self.sample_rate, dropped=True)
                     print(f"Warning: Buffer full, dropping chunk. Total dropped: {self.dropped_chunks}")
+                QUEUE_DEPTH.labels(self.session_id).set(self.audio_buffer.qsize())
 
         except Exception as e:
             print(f"Error handling audio stream: {e}")
@@ -89,28 +155,52 @@ class RealtimeTranscriptionService:
 
         try:
             while self.is_processing:
-                try:
-                    # Get chunk from queue with timeout
-                    chunk = self.audio_buffer.get(timeout=0.1)
-                except queue.Empty:
-                    await asyncio.sleep(0.1)
-                    continue
-
-                # Process the chunk
-                result = await self.process_audio_chunk(chunk)
-                if result:
-                    # Notify all callbacks with the result
-                    for callback in self.transcription_callbacks:
-                        try:
-                            await callback(result)
-                        except Exception as e:
-                            print(f"Error in transcription callback: {e}")
+                # Poll without blocking the event loop shared with other connections
+                if not await self.process_next_chunk():
+                    await asyncio.sleep(0.05)
 
         except Exception as e:
             print(f"Error in queue processing: {e}")
         finally:
             self.is_processing = False
 
+    async def process_next_chunk(self) -> bool:
+        """Handle one queued chunk, if any; returns False when the queue was empty"""
+        try:
+            chunk, chunk_end, queued_at = self.audio_buffer.get_nowait()
+        except queue.Empty:
+            return False
+        QUEUE_DEPTH.labels(self.session_id).set(self.audio_buffer.qsize())
+
+        with start_trace("realtime_chunk", profile=self.profile) as trace:
+            trace.attributes.update(session_id=self.session_id, audio_offset=chunk_end / self.sample_rate)
+            trace.record("session_queue", time.perf_counter() - queued_at, queued_at)
+            await self._handle_chunk(chunk, chunk_end)
+        return True
+
+    async def _handle_chunk(self, chunk: np.ndarray, chunk_end: int) -> None:
+        """Transcribe one queued chunk and send the result"""
+        result = await self.process_audio_chunk(chunk, chunk_end)
+        if result:
+            await self._notify(result)
+
+    async def _notify(self, result: Dict) -> None:
+        """Pass a result to every callback, tagged with the current trace id"""
+        trace = current_trace()
+        if trace is None:
+            await self._send(result)
+            return
+        result["trace_id"] = trace.trace_id
+        with trace.span("response"):
+            await self._send(result)
+
+    async def _send(self, result: Dict) -> None:
+        for callback in self.transcription_callbacks:
+            try:
+                await callback(result)
+            except Exception as e:
+                print(f"Error in transcription callback: {e}")
+
     def add_transcription_callback(self, callback: Callable) -> None:
         """Add a callback for transcription results"""
         self.transcription_callbacks.append(callback)
@@ -123,20 +213,27 @@ class RealtimeTranscriptionService:
     def get_status(self) -> Dict:
         """Get current processing status"""
         return {
+            "session_id": self.session_id,
+            "decoding_profile": self.decoding_profile,
             "is_processing": self.is_processing,
             "total_processed": self.total_processed,
             "dropped_chunks": self.dropped_chunks,
             "queue_size": self.audio_buffer.qsize(),
-            "current_chunk_size": len(self.current_chunk)
+            "current_chunk_size": len(self.current_chunk),
+            "streaming_features": self.features is not None
         }
 
     def stop(self) -> None:
         """Stop processing"""
         self.is_processing = False
         # Clear buffers
-        self.current_chunk = []
+        self.current_chunk = np.zeros(0, dtype=np.int16)
+        self.samples_received = 0
+        if self.features is not None:
+            self.features.reset()
         while not self.audio_buffer.empty():
             try:
                 self.audio_buffer.get_nowait()
             except queue.Empty:
                 break
+        remove_session(self.session_id)
@@ -0,0 +1,317 @@
+# services/remote_service.py
+import atexit
+import ipaddress
+import os
+import queue
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.metrics import record_stage
+from services.tracing import current_trace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def parse_address(address: str):
+    """"host:port" for TCP, anything else is a Unix socket path"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+def is_local_address(address) -> bool:
+    """Whether a worker address is on this machine (Unix socket or loopback TCP)"""
+    if isinstance(address, str):
+        return True
+    host = address[0].strip("[]")
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+class WorkerConnection:
+    def __init__(self, address, authkey: bytes, local: bool = True):
+        """One IPC connection to a worker
+
+        Local workers read audio from this connection's shared-memory buffer;
+        workers on other machines get the samples in the request itself.
+        """
+        self.conn = Client(address, authkey=authkey)
+        self.local = local
+        self.shm: Optional[SharedMemory] = None
+
+    def write_audio(self, audio: np.ndarray) -> Dict:
+        """Copy audio into the shared buffer, growing it if needed, and describe it for the worker"""
+        audio = np.ascontiguousarray(audio)
+        if not self.local:
+            return {"data": audio.tobytes(), "shape": audio.shape, "dtype": audio.dtype.str}
+        if self.shm is None or self.shm.size < audio.nbytes:
+            self.release()
+            self.shm = SharedMemory(create=True, size=max(audio.nbytes, 1 << 20))
+        np.ndarray(audio.shape, dtype=audio.dtype, buffer=self.shm.buf)[...] = audio
+        return {"name": self.shm.name, "shape": audio.shape, "dtype": audio.dtype.str}
+
+    def call(self, request: Dict) -> Dict:
+        self.conn.send(request)
+        return self.conn.recv()
+
+    def release(self) -> None:
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def close(self) -> None:
+        self.release()
+        self.conn.close()
+
+class WorkerClient:
+    def __init__(self, address, authkey: bytes, connect_timeout: float = 60.0):
+        """Pool of connections to one worker process"""
+        self.address = address
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self.idle: "queue.Queue[WorkerConnection]" = queue.Queue()
+        self.local = is_local_address(address)
+        self.in_flight = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> WorkerConnection:
+        # Workers may still be starting; retry until the socket accepts
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return WorkerConnection(self.address, self.authkey, self.local)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def call(self, request: Dict, audio: Optional[np.ndarray] = None):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        trace = current_trace()
+        if trace is not None:
+            # The worker times its stages under the same trace id and reports them back
+            request.update(trace_id=trace.trace_id, profile=trace.profile)
+        try:
+            if audio is not None:
+                request["audio"] = connection.write_audio(audio)
+            sent = time.perf_counter()
+            response = connection.call(request)
+        except (EOFError, OSError):
+            # Worker went away: drop the connection rather than reuse it
+            self.failures += 1
+            connection.close()
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        # The worker answered (possibly with an error); the connection is still usable
+        self.idle.put(connection)
+        for stage in response.get("spans", []):
+            record_stage(
+                stage["name"], stage["duration_ms"] / 1000, sent + stage["start_ms"] / 1000, worker=str(self.address)
+            )
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def get_status(self) -> Dict:
+        return {
+            "address": str(self.address),
+            "local": self.local,
+            "in_flight": self.in_flight,
+            "failures": self.failures
+        }
+
+class RemoteTranscriptionService:
+    def __init__(self, workers: List[WorkerClient], model_name: str = "base", language: str = "ja"):
+        """TranscriptionService facade that runs every call in an inference worker process
+
+        Calls go to the worker with the fewest requests in flight. Failures are
+        reported like local ones: the transcribe methods return None.
+        """
+        self.workers = workers
+        self.model_name = model_name
+        self.language = language
+        # One slot per worker; cascade tiers size their thread pools from this
+        self.replicas = workers
+
+    def _call(self, method: str, audio: Optional[np.ndarray] = None, path: Optional[Path] = None, **kwargs):
+        worker = min(self.workers, key=lambda w: w.in_flight)
+        request = {"method": method, "model": self.model_name, "kwargs": kwargs}
+        if path is not None:
+            if worker.local:
+                request["path"] = str(Path(path).resolve())
+            else:
+                # The path only exists on this machine: send the file itself
+                request["file"] = {"suffix": Path(path).suffix, "data": Path(path).read_bytes()}
+        return worker.call(request, audio)
+
+    def transcribe_file(
+        self,
+        audio_path: Path,
+        decoding_profile: str = "balanced",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        try:
+            return self._call(
+                "transcribe_file", path=audio_path, decoding_profile=decoding_profile, language=language or self.language
+            )
+        except Exception as e:
+            print(f"Error transcribing file in worker: {e}")
+            return None
+
+    def transcribe_recording(
+        self,
+        audio_path: Path,
+        decoding_profile: str = "archive-accurate",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        try:
+            return self._call(
+                "transcribe_recording",
+                path=audio_path,
+                decoding_profile=decoding_profile,
+                language=language or self.language
+            )
+        except Exception as e:
+            print(f"Error transcribing recording in worker: {e}")
+            return None
+
+    def transcribe_audio_data(
+        self,
+        audio_data: np.ndarray,
+        sample_rate: int = 16000,
+        decoding_profile: str = "realtime-fast",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        try:
+            return self._call(
+                "transcribe_audio_data",
+                audio=audio_data,
+                sample_rate=sample_rate,
+                decoding_profile=decoding_profile,
+                language=language or self.language
+            )
+        except Exception as e:
+            print(f"Error transcribing audio data in worker: {e}")
+            return None
+
+    def get_model_info(self) -> Dict:
+        info = self._call("get_model_info")
+        info["workers"] = [worker.get_status() for worker in self.workers]
+        return info
+
+    def get_status(self) -> Dict:
+        return {"workers": [worker.get_status() for worker in self.workers]}
+
+def start_local_workers(count: int, preload=()) -> List[WorkerClient]:
+    """Launch `count` worker processes on Unix sockets and return clients for them"""
+    authkey = os.urandom(16).hex()
+    socket_dir = Path(tempfile.mkdtemp(prefix="whisper-workers-"))
+    env = dict(os.environ, WHISPER_WORKER_AUTHKEY=authkey)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    # Stage timings come back with each result and are counted by the API process;
+    # workers writing to the shared metrics directory would count them twice
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    # Workers run their own replica layout, if any, via WHISPER_REPLICAS
+    processes, clients = [], []
+    for i in range(count):
+        address = str(socket_dir / f"worker-{i}.sock")
+        command = [sys.executable, "-m", "services.inference_worker", "--listen", address]
+        for model_name in preload:
+            command += ["--model", model_name]
+        processes.append(subprocess.Popen(command, env=env))
+        clients.append(WorkerClient(address, authkey.encode()))
+
+    def stop():
+        for client in clients:
+            client.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    atexit.register(stop)
+    return clients
+
+_workers: Optional[List[WorkerClient]] = None
+_workers_lock = threading.Lock()
+
+def get_workers() -> Optional[List[WorkerClient]]:
+    """Workers configured by WHISPER_INFERENCE_WORKERS, or None to run in-process
+
+    A number starts that many local worker processes; a comma-separated list
+    of host:port (or socket path) addresses connects to running workers,
+    authenticated with WHISPER_WORKER_AUTHKEY.
+    """
+    global _workers
+    setting = os.environ.get("WHISPER_INFERENCE_WORKERS", "").strip()
+    if not setting:
+        return None
+    with _workers_lock:
+        if _workers is None:
+            if setting.isdigit():
+                preload = os.environ.get("WHISPER_PRELOAD_MODELS", "base").split(",")
+                _workers = start_local_workers(int(setting), [name.strip() for name in preload if name.strip()])
+            else:
+                authkey = os.environ.get("WHISPER_WORKER_AUTHKEY")
+                if not authkey:
+                    raise ValueError("WHISPER_WORKER_AUTHKEY must be set to connect to inference workers")
+                _workers = [
+                    WorkerClient(parse_address(address.strip()), authkey.encode())
+                    for address in setting.split(",") if address.strip()
+                ]
+        return _workers
+
+def create_transcription_service(model_name: str = "base", **kwargs):
+    """In-process TranscriptionService, or a remote facade when inference workers are configured"""
+    workers = get_workers()
+    if workers is None:
+        from services.transcription_service import TranscriptionService
+        return TranscriptionService(model_name=model_name, **kwargs)
+    return RemoteTranscriptionService(workers, model_name=model_name, language=kwargs.get("language", "ja"))
+
+_services: Dict[str, object] = {}
+_services_lock = threading.Lock()
+
+def get_transcription_service(model_name: str = "base"):
+    """The process's shared service for model_name, created on first use
+
+    The routers and the cascade tiers all get their models here, so each
+    model is loaded once per process (and once in the pre-fork master).
+    """
+    with _services_lock:
+        if model_name not in _services:
+            _services[model_name] = create_transcription_service(model_name=model_name)
+        return _services[model_name]
@@ -0,0 +1,146 @@
+# services/replicas.py
+import contextvars
+import copy
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import torch
+
+def parse_layout(layout: str) -> Tuple[int, int]:
+    """Parse "<replicas>x<threads>", e.g. "4x4" for four replicas of four threads each"""
+    match = re.fullmatch(r"\s*(\d+)\s*[xX*]\s*(\d+)\s*", layout)
+    if not match or int(match.group(1)) < 1 or int(match.group(2)) < 1:
+        raise ValueError(f"Invalid replica layout: {layout!r}. Expected e.g. \"4x4\" (replicas x threads)")
+    return int(match.group(1)), int(match.group(2))
+
+def layout_variable(model_name: str) -> str:
+    """Environment variable with one model's layout, e.g. WHISPER_REPLICAS_LARGE_V3 for large-v3"""
+    return "WHISPER_REPLICAS_" + re.sub(r"[^0-9A-Za-z]", "_", model_name).upper()
+
+def process_cpus() -> List[int]:
+    return sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+
+def share_model(model):
+    """Return a copy of the model that shares its weights
+
+    Decoding installs kv-cache hooks on the model's modules, so concurrent
+    calls need separate module objects; tensors (and int8 packed weights)
+    are reused rather than copied.
+    """
+    memo = {id(t): t for t in list(model.parameters()) + list(model.buffers())}
+    for module in model.modules():
+        if isinstance(module, torch.ao.nn.quantized.modules.linear.LinearPackedParams):
+            memo[id(module)] = module
+    return copy.deepcopy(model, memo)
+
+class Replica:
+    def __init__(self, index: int, model, cpus: Optional[Sequence[int]] = None, threads: Optional[int] = None):
+        """A model copy served by one worker thread pinned to its own CPUs
+
+        The worker sets its CPU affinity and intra-op thread count once; torch's
+        OpenMP pool is per calling thread, so replicas do not oversubscribe each
+        other. Without cpus/threads calls run inline in the caller's thread.
+        """
+        self.index = index
+        self.model = model
+        self.cpus = list(cpus) if cpus else None
+        self.threads = threads
+        # Threads asked for by the layout; a pre-forked worker may run the replica on fewer
+        self.layout_threads = threads
+        self.executor = None
+        if self.cpus or self.threads:
+            self.executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"replica-{index}", initializer=self._pin
+            )
+
+    def repin(self, cpus: Sequence[int], threads: int) -> None:
+        """Move the replica to other CPUs; its worker thread is replaced on the next call"""
+        self.cpus, self.threads = list(cpus), threads
+        if self.executor is not None:
+            # A forked worker inherits the executor but not its thread
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"replica-{self.index}", initializer=self._pin
+        )
+
+    def _pin(self) -> None:
+        if self.cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                # pid 0 applies to the calling thread only
+                os.sched_setaffinity(0, self.cpus)
+            except OSError as e:
+                print(f"Error pinning replica {self.index} to CPUs {self.cpus}: {e}")
+        if self.threads:
+            torch.set_num_threads(self.threads)
+
+    def run(self, func, *args, **kwargs):
+        """Call func on this replica's worker thread, carrying over the current trace"""
+        if self.executor is None:
+            return func(*args, **kwargs)
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, func, *args, **kwargs).result()
+
+    def get_status(self) -> dict:
+        return {"index": self.index, "cpus": self.cpus, "threads": self.threads}
+
+class CpuAllocator:
+    def __init__(self):
+        """Hands out disjoint CPU blocks to the replicas of every service in this process
+
+        Each service used to split the whole affinity mask on its own, so two
+        services with a 4x4 layout pinned 32 threads to the same 16 cores.
+        """
+        self.cpus = process_cpus()
+        self.replicas: List[Replica] = []
+        self.lock = threading.Lock()
+        # Set in pre-forked workers, whose share is divided among whatever models they hold
+        self.restricted = False
+
+    def pin(self, replicas: Sequence[Replica]) -> None:
+        """Give each replica `threads` CPUs not used by any replica pinned before
+
+        Raises ValueError when the CPUs left over cannot hold the replicas.
+        """
+        with self.lock:
+            used = sum(len(replica.cpus) for replica in self.replicas)
+            needed = sum(replica.threads for replica in replicas)
+            if used + needed > len(self.cpus) and self.restricted:
+                # A model loaded lazily in a pre-forked worker: shrink every block to make room
+                self.replicas.extend(replicas)
+                self._divide()
+                return
+            if used + needed > len(self.cpus):
+                raise ValueError(
+                    f"Replica layout needs {needed} CPUs but only {len(self.cpus) - used} of this process's "
+                    f"{len(self.cpus)} are not pinned by other models; use a smaller layout (WHISPER_REPLICAS_<MODEL> sets one per model)"
+                )
+            for replica in replicas:
+                replica.repin(self.cpus[used:used + replica.threads], replica.threads)
+                used += replica.threads
+            self.replicas.extend(replicas)
+
+    def restrict(self, cpus: Sequence[int]) -> None:
+        """Re-divide a smaller CPU set (a pre-forked worker's share) among all pinned replicas
+
+        Blocks shrink in proportion to their layout; when there are more
+        replicas than CPUs, replicas share cores.
+        """
+        with self.lock:
+            self.cpus = list(cpus)
+            self.restricted = True
+            self._divide()
+
+    def _divide(self) -> None:
+        total = sum(replica.layout_threads for replica in self.replicas)
+        start = 0
+        for replica in self.replicas:
+            threads = max(1, len(self.cpus) * replica.layout_threads // total)
+            replica.repin([self.cpus[(start + j) % len(self.cpus)] for j in range(threads)], threads)
+            start += threads
+        if start > len(self.cpus):
+            print(f"Warning: {len(self.replicas)} replicas on {len(self.cpus)} CPUs; replicas will share cores")
+
+cpu_allocator = CpuAllocator()
@@ -0,0 +1,69 @@
+# services/scheduler.py
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from services.decoding_profiles import get_profile, select_profile
+from services.metrics import PROFILE_REQUESTS, observe_stage
+from services.tracing import current_trace
+
+class InferenceScheduler:
+    def __init__(self, replicas: int = 1, auto_degrade: bool = True, max_steps: int = 2, smoothing: float = 0.3):
+        """Hand out model replicas one call at a time and step decoding profiles down under load
+
+        While other calls are queued behind, step-down follows an exponentially
+        smoothed average of recent waits, so a backlog keeps degrading until it
+        drains; once the queue is empty a call is judged by its own wait.
+        """
+        # Decoding installs kv-cache hooks on the model, so each replica runs one call at a time
+        self.replicas = replicas
+        self._free = queue.Queue()
+        for index in range(replicas):
+            self._free.put(index)
+        self._state_lock = threading.Lock()
+        self.auto_degrade = auto_degrade and os.environ.get("WHISPER_AUTO_DEGRADE", "1") != "0"
+        self.max_steps = max_steps
+        self.smoothing = smoothing
+        self.queue_wait = 0.0
+        self.waiting = 0
+
+    def _observe_wait(self, wait: float) -> float:
+        with self._state_lock:
+            self.queue_wait += self.smoothing * (wait - self.queue_wait)
+            return self.queue_wait if self.waiting else wait
+
+    @contextmanager
+    def slot(self, profile: str):
+        """Wait for a free replica and yield (replica index, decoding profile to use)"""
+        get_profile(profile)
+        start = time.perf_counter()
+        with self._state_lock:
+            self.waiting += 1
+        try:
+            with observe_stage("queue"):
+                index = self._free.get()
+        finally:
+            with self._state_lock:
+                self.waiting -= 1
+
+        try:
+            queue_wait = self._observe_wait(time.perf_counter() - start)
+            used = select_profile(profile, queue_wait, self.max_steps) if self.auto_degrade else profile
+            PROFILE_REQUESTS.labels(profile, used).inc()
+            trace = current_trace()
+            if trace is not None:
+                trace.attributes.update(decoding_profile=used, requested_profile=profile)
+            yield index, used
+        finally:
+            self._free.put(index)
+
+    def get_status(self) -> dict:
+        return {
+            "replicas": self.replicas,
+            "busy": self.replicas - self._free.qsize(),
+            "auto_degrade": self.auto_degrade,
+            "queue_wait": self.queue_wait,
+            "waiting": self.waiting,
+        }
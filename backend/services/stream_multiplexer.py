@@ -0,0 +1,73 @@
+# services/stream_multiplexer.py
+import asyncio
+import struct
+from typing import Dict, Optional, Set, Tuple
+
+from services.realtime_service import RealtimeTranscriptionService
+
+# Binary frames on a multiplexed connection: big-endian uint32 stream id, then int16 PCM
+FRAME_HEADER = struct.Struct("!I")
+
+def parse_frame(data: bytes) -> Optional[Tuple[int, bytes]]:
+    """Split a binary frame into (stream_id, audio bytes), or None if it is too short"""
+    if len(data) < FRAME_HEADER.size:
+        return None
+    return FRAME_HEADER.unpack_from(data)[0], data[FRAME_HEADER.size:]
+
+class StreamMultiplexer:
+    def __init__(self, workers: int = 1):
+        """Drive many realtime sessions from one connection with a fixed set of worker tasks
+
+        Instead of a polling task per session, a stream id is put on the ready
+        queue when its session has queued chunks. Each stream is handled by at
+        most one worker at a time, so its chunks stay in order, and a stream
+        with a backlog goes to the back of the queue after every chunk.
+        """
+        self.sessions: Dict[int, RealtimeTranscriptionService] = {}
+        self.ready: asyncio.Queue = asyncio.Queue()
+        # Streams on the ready queue or being processed
+        self.scheduled: Set[int] = set()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(max(workers, 1))]
+
+    def add(self, stream_id: int, session: RealtimeTranscriptionService) -> None:
+        session.is_processing = True
+        self.sessions[stream_id] = session
+
+    def remove(self, stream_id: int) -> Optional[RealtimeTranscriptionService]:
+        session = self.sessions.pop(stream_id, None)
+        if session is not None:
+            session.is_processing = False
+        return session
+
+    async def feed(self, stream_id: int, audio_data: bytes) -> bool:
+        """Add audio to a stream; returns False if the stream is not open"""
+        session = self.sessions.get(stream_id)
+        if session is None:
+            return False
+        await session.handle_audio_stream(audio_data)
+        if not session.audio_buffer.empty() and stream_id not in self.scheduled:
+            self.scheduled.add(stream_id)
+            self.ready.put_nowait(stream_id)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            stream_id = await self.ready.get()
+            session = self.sessions.get(stream_id)
+            try:
+                if session is not None:
+                    await session.process_next_chunk()
+            except Exception as e:
+                print(f"Error in stream {stream_id}: {e}")
+            # The stream may have been closed (or reopened) meanwhile
+            session = self.sessions.get(stream_id)
+            if session is not None and not session.audio_buffer.empty():
+                self.ready.put_nowait(stream_id)
+            else:
+                self.scheduled.discard(stream_id)
+
+    def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        for stream_id in list(self.sessions):
+            self.remove(stream_id)
@@ -0,0 +1,117 @@
+# services/streaming_features.py
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+from whisper.audio import HOP_LENGTH, N_FFT, N_FRAMES, mel_filters
+
+# log10 of the clamped power of digital silence, as whisper computes it for padding
+SILENCE = -10.0
+
+class StreamingLogMel:
+    def __init__(self, n_mels: int = 80, capacity: int = N_FRAMES, device: str = "cpu"):
+        """Log-mel frames of one audio stream, computed once per sample as audio arrives
+
+        Matches whisper.log_mel_spectrogram frame for frame: the stream start is
+        reflect-padded like torch.stft(center=True), and each frame is computed
+        as soon as its 400-sample window is complete. Unnormalized log10 frames
+        are appended to a preallocated (n_mels, capacity) buffer; window() applies
+        whisper's per-window dynamic range clamp into a second preallocated
+        buffer that is passed straight to the encoder.
+        """
+        self.n_mels = n_mels
+        self.capacity = capacity
+        self.device = device
+        self.hann = torch.hann_window(N_FFT, device=device)
+        self.filters = mel_filters(device, n_mels)
+        self.frames = torch.empty((n_mels, capacity), dtype=torch.float32, device=device)
+        self.output = torch.empty((n_mels, N_FRAMES), dtype=torch.float32, device=device)
+        self.reset()
+
+    def reset(self, position: int = 0) -> None:
+        """Start over at sample `position` of the stream, e.g. after a gap"""
+        # Samples not yet covered by a complete frame, starting at the next frame's window
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.started = False
+        # Stream position of the next sample to append
+        self.position = position
+        # Absolute index of the first buffered frame, and the number of buffered frames
+        self.offset = position // HOP_LENGTH
+        self.length = 0
+
+    @property
+    def end(self) -> int:
+        """Absolute index one past the last computed frame"""
+        return self.offset + self.length
+
+    def append(self, audio: np.ndarray) -> int:
+        """Add float32 samples and compute the frames they complete; returns the number of new frames"""
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        self.position += len(audio)
+        if not self.started:
+            # center=True reflect padding; wait for enough samples to mirror
+            audio = np.concatenate([self.pending, audio])
+            if len(audio) <= N_FFT // 2:
+                self.pending = audio
+                return 0
+            self.pending = np.concatenate([audio[1:N_FFT // 2 + 1][::-1], audio])
+            self.started = True
+        else:
+            self.pending = np.concatenate([self.pending, audio])
+
+        count = (len(self.pending) - N_FFT) // HOP_LENGTH + 1 if len(self.pending) >= N_FFT else 0
+        if count <= 0:
+            return 0
+        used = (count - 1) * HOP_LENGTH + N_FFT
+        samples = torch.from_numpy(self.pending[:used]).to(self.device)
+        stft = torch.stft(samples, N_FFT, HOP_LENGTH, window=self.hann, center=False, return_complex=True)
+        log_spec = torch.clamp(self.filters @ (stft.abs() ** 2), min=1e-10).log10()
+        self.pending = self.pending[count * HOP_LENGTH:]
+
+        self._make_room(count)
+        self.frames[:, self.length:self.length + count] = log_spec[:, -self.capacity:]
+        self.length += min(count, self.capacity)
+        return count
+
+    def _make_room(self, count: int) -> None:
+        """Drop the oldest frames so count more fit in the buffer"""
+        overflow = self.length + count - self.capacity
+        if overflow <= 0:
+            return
+        # Beyond the buffered frames, the oldest of the new frames are skipped too
+        self.offset += overflow
+        keep = max(self.length - overflow, 0)
+        if keep:
+            self.frames[:, :keep] = self.frames[:, self.length - keep:self.length].clone()
+        self.length = keep
+
+    def discard(self, before: int) -> None:
+        """Forget frames before absolute frame index `before` (e.g. a finished utterance)"""
+        drop = min(max(before - self.offset, 0), self.length)
+        if drop:
+            keep = self.length - drop
+            self.frames[:, :keep] = self.frames[:, drop:self.length].clone()
+            self.offset += drop
+            self.length = keep
+
+    def window(self, start: Optional[int] = None) -> Tuple[torch.Tensor, int]:
+        """Normalized features from absolute frame `start` (default: oldest buffered)
+
+        Returns the (n_mels, N_FRAMES) output buffer, padded with silence like
+        whisper's 30-second padding, and the number of content frames. The
+        buffer is overwritten by the next call.
+        """
+        first = max(self.offset if start is None else start, self.offset) - self.offset
+        content = min(self.length - first, N_FRAMES) if first < self.length else 0
+        raw = self.frames[:, first:first + content]
+        floor = max(raw.max().item() if content else SILENCE, SILENCE) - 8.0
+
+        torch.clamp(raw, min=floor, out=self.output[:, :content])
+        self.output[:, content:] = max(SILENCE, floor)
+        self.output.add_(4.0).div_(4.0)
+        return self.output, content
+
+    @staticmethod
+    def frame_of(sample: int) -> int:
+        """Index of the frame centred on (or just after) a sample position"""
+        return -(-sample // HOP_LENGTH)
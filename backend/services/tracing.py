@@ -0,0 +1,132 @@
+# services/tracing.py
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+import torch
+
+logger = logging.getLogger("whisper.trace")
+
+# Profiling is opt-in per deployment; requests can only ask for it when this is set
+PROFILING_ENABLED = os.environ.get("WHISPER_ENABLE_PROFILING") == "1"
+PROFILE_MODES = ("cprofile", "torch")
+PROFILE_DIR = Path(os.environ.get("WHISPER_PROFILE_DIR", "profiles"))
+
+# Trace ids may come from clients (X-Trace-Id) and end up in file names and logs
+TRACE_ID = re.compile(r"[0-9a-f]{16,32}")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    def __init__(self, name: str, trace_id: Optional[str] = None, profile: Optional[str] = None):
+        """Timing record for one request or job, identified by trace_id
+
+        A trace_id that is not 16-32 lowercase hex digits is replaced by a new one.
+        """
+        self.name = name
+        self.trace_id = trace_id if trace_id and TRACE_ID.fullmatch(trace_id) else uuid.uuid4().hex
+        self.profile = profile if PROFILING_ENABLED and profile in PROFILE_MODES else None
+        self.start = time.perf_counter()
+        self.spans = []
+        self.attributes: Dict = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration: float, start: Optional[float] = None, **attributes) -> None:
+        """Add a span that has already been measured"""
+        start = start if start is not None else time.perf_counter() - duration
+        span = {
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+        }
+        span.update(attributes)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start, **attributes)
+
+    def finish(self, **attributes) -> None:
+        """Write the trace as one structured log line"""
+        self.attributes.update(attributes)
+        logger.info(json.dumps({
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "spans": self.spans,
+            **self.attributes,
+        }, ensure_ascii=False, default=str))
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def start_trace(name: str, trace_id: Optional[str] = None, profile: Optional[str] = None):
+    """Make a new trace current for this context and log it when the block exits"""
+    trace = Trace(name, trace_id, profile)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a span on the current trace, if there is one"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **attributes):
+        yield
+
+@contextmanager
+def maybe_profile():
+    """Profile the enclosed block when the current trace asked for it"""
+    trace = current_trace()
+    if trace is None or trace.profile is None:
+        yield
+        return
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = uuid.uuid4().hex[:6]
+    if trace.profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = PROFILE_DIR / f"{trace.trace_id}-{suffix}.prof"
+            profiler.dump_stats(str(path))
+            trace.attributes.setdefault("profiles", []).append(str(path))
+    else:
+        with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True) as profiler:
+            yield
+        path = PROFILE_DIR / f"{trace.trace_id}-{suffix}.json"
+        profiler.export_chrome_trace(str(path))
+        trace.attributes.setdefault("profiles", []).append(str(path))
+
+def configure_trace_log(path: Path) -> None:
+    """Write traces as JSON lines to path"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
@@ -0,0 +1,224 @@
+# services/transcript_index.py
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# FTS5's trigram tokenizer indexes every 3-character substring, so Japanese
+# (no spaces between words) is searchable without a morphological analyzer
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    recording_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    language TEXT,
+    text_mtime REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    recording_id TEXT NOT NULL REFERENCES recordings(recording_id) ON DELETE CASCADE,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_recording ON segments(recording_id, start_ms);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    DELETE FROM segments_grams WHERE rowid = old.id;
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_grams USING fts5(grams);
+"""
+
+# Terms shorter than a trigram are looked up in segments_grams, which holds
+# every character and character pair of a segment as separate tokens
+MIN_INDEXED_CHARS = 3
+
+def _grams(text: str) -> str:
+    """Unigrams and bigrams of each whitespace-separated word, space-separated"""
+    grams: List[str] = []
+    for word in text.split():
+        grams += list(word)
+        grams += [word[i:i + 2] for i in range(len(word) - 1)]
+    return " ".join(grams)
+
+def _index_grams(conn: sqlite3.Connection, rows: Iterable[sqlite3.Row]) -> None:
+    conn.executemany(
+        "INSERT INTO segments_grams(rowid, grams) VALUES (?, ?)",
+        ((row["id"], _grams(row["text"])) for row in rows)
+    )
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+class TranscriptIndex:
+    def __init__(self, db_path: Path):
+        """Full-text index of transcript segments with their timestamps
+
+        Each write replaces one recording's segments, so the index stays
+        current without rebuilding. Connections are opened per call, which
+        keeps the index safe to use from threads and pre-forked workers.
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # The delete trigger refers to segments_grams, so replace triggers from older schemas
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'segments_grams'").fetchone() is None:
+                conn.execute("DROP TRIGGER IF EXISTS segments_ad")
+            conn.executescript(SCHEMA)
+            # Segments indexed before segments_grams existed
+            _index_grams(conn, conn.execute(
+                "SELECT id, text FROM segments WHERE id NOT IN (SELECT rowid FROM segments_grams)"
+            ).fetchall())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def index_transcript(
+        self,
+        recording_id: str,
+        path: Path,
+        text: str,
+        segments: Optional[Iterable[Dict]] = None,
+        language: Optional[str] = None
+    ) -> int:
+        """Replace a recording's indexed segments; returns the number indexed
+
+        segments are Whisper segments ({"start", "end", "text"} in seconds).
+        Without them the whole text is indexed as one segment from 0 ms.
+        """
+        rows = [
+            (recording_id, int(round(s["start"] * 1000)), int(round(s["end"] * 1000)), s["text"].strip())
+            for s in segments or [] if s.get("text", "").strip()
+        ]
+        if not rows and text.strip():
+            rows = [(recording_id, 0, None, text.strip())]
+
+        text_path = Path(path).with_suffix(".txt")
+        text_mtime = text_path.stat().st_mtime if text_path.exists() else None
+        with self._connect() as conn:
+            conn.execute("DELETE FROM recordings WHERE recording_id = ?", (recording_id,))
+            conn.execute(
+                "INSERT INTO recordings (recording_id, path, language, text_mtime, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (recording_id, str(path), language, text_mtime, time.time())
+            )
+            conn.executemany("INSERT INTO segments (recording_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)", rows)
+            _index_grams(conn, conn.execute(
+                "SELECT id, text FROM segments WHERE recording_id = ?", (recording_id,)
+            ).fetchall())
+        return len(rows)
+
+    def remove(self, recording_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM recordings WHERE recording_id = ?", (recording_id,))
+
+    def index_directory(self, audio_dir: Path, audio_suffixes: Iterable[str] = (".wav", ".flac")) -> int:
+        """Index loose .txt transcripts that are new or changed since they were last indexed
+
+        These files carry no timestamps, so each is indexed as a single segment.
+        Recordings in audio_dir whose transcript is gone are dropped from the index.
+        Returns the number of recordings (re)indexed.
+        """
+        audio_dir = Path(audio_dir)
+        with self._connect() as conn:
+            rows = conn.execute("SELECT recording_id, path, text_mtime FROM recordings").fetchall()
+            stale = [
+                (row["recording_id"],) for row in rows
+                if Path(row["path"]).resolve().parent == audio_dir.resolve()
+                and not Path(row["path"]).with_suffix(".txt").exists()
+            ]
+            conn.executemany("DELETE FROM recordings WHERE recording_id = ?", stale)
+        known = {row["recording_id"]: row["text_mtime"] for row in rows}
+
+        indexed = 0
+        for text_path in Path(audio_dir).glob("*.txt"):
+            recording_id = text_path.stem
+            if known.get(recording_id) == text_path.stat().st_mtime:
+                continue
+            audio_path = next(
+                (p for p in (text_path.with_suffix(s) for s in audio_suffixes) if p.exists()),
+                text_path
+            )
+            try:
+                self.index_transcript(recording_id, audio_path, text_path.read_text(encoding="utf-8"))
+                indexed += 1
+            except Exception as e:
+                print(f"Error indexing {text_path}: {e}")
+        return indexed
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, recording_id: Optional[str] = None) -> List[Dict]:
+        """Segments containing every whitespace-separated term, best matches first"""
+        terms = query.split()
+        if not terms:
+            return []
+        indexed = [term for term in terms if len(term) >= MIN_INDEXED_CHARS]
+        short = [term for term in terms if len(term) < MIN_INDEXED_CHARS]
+
+        params: List = []
+        if indexed:
+            sql = (
+                "SELECT s.id, s.recording_id, r.path, s.start_ms, s.end_ms, s.text, "
+                "snippet(segments_fts, 0, '[', ']', '…', 32) AS snippet "
+                "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+                "JOIN recordings r ON r.recording_id = s.recording_id "
+                "WHERE segments_fts MATCH ?"
+            )
+            params.append(" ".join(_quote(term) for term in indexed))
+            if short:
+                sql += " AND s.id IN (SELECT rowid FROM segments_grams WHERE segments_grams MATCH ?)"
+                params.append(" ".join(_quote(term) for term in short))
+        else:
+            sql = (
+                "SELECT s.id, s.recording_id, r.path, s.start_ms, s.end_ms, s.text, s.text AS snippet "
+                "FROM segments_grams JOIN segments s ON s.id = segments_grams.rowid "
+                "JOIN recordings r ON r.recording_id = s.recording_id "
+                "WHERE segments_grams MATCH ?"
+            )
+            params.append(" ".join(_quote(term) for term in short))
+        if recording_id:
+            sql += " AND s.recording_id = ?"
+            params.append(recording_id)
+        sql += " ORDER BY bm25(segments_fts)" if indexed else " ORDER BY bm25(segments_grams)"
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [
+            {
+                "recording_id": row["recording_id"],
+                "path": row["path"],
+                "segment_id": row["id"],
+                "start_ms": row["start_ms"],
+                "end_ms": row["end_ms"],
+                "text": row["text"],
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ]
+
+    def get_status(self) -> Dict:
+        with self._connect() as conn:
+            recordings = conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+            segments = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        size = self.db_path.stat().st_size if self.db_path.exists() else 0
+        return {"recordings": recordings, "segments": segments, "db_size_mb": size / (1024 * 1024)}
+
+_index: Optional[TranscriptIndex] = None
+
+def get_transcript_index(db_path: Optional[Path] = None) -> TranscriptIndex:
+    """Shared index at db_path, by default WHISPER_TRANSCRIPT_DB (recorded_audio/transcripts.db)"""
+    global _index
+    if _index is None:
+        _index = TranscriptIndex(db_path or Path(os.environ.get("WHISPER_TRANSCRIPT_DB", "recorded_audio/transcripts.db")))
+    return _index
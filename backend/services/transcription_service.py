@@ -1,70 +1,204 @@
 # services/transcription_service.py
 import whisper
+from whisper.audio import HOP_LENGTH, SAMPLE_RATE
 import torch
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict, Tuple
+import os
+import time
 import numpy as np
 
+from services.audio_loader import load_audio
+from services.compiled import BACKENDS, compile_model, configure_compile_cache
+from services.decoding_profiles import decoding_options, transcribe_options
+from services.feature_cache import FeatureCache, precomputed_mel
+from services.quantization import PRECISIONS, load_quantized, quantize_model, save_quantized
+from services.metrics import IN_FLIGHT, MODEL_LOAD_SECONDS, instrument_model, observe_stage
+from services.replicas import Replica, cpu_allocator, layout_variable, parse_layout, share_model
+from services.scheduler import InferenceScheduler
+from services.tracing import maybe_profile
+
 class TranscriptionService:
     def __init__(
         self,
         model_name: str = "base",
         model_dir: Optional[Path] = None,
         language: str = "ja",
-        device: str = "cuda" if torch.cuda.is_available() else "cpu"
+        device: str = "cuda" if torch.cuda.is_available() else "cpu",
+        feature_cache: Optional[bool] = None,
+        precision: str = "fp32",
+        backend: str = "eager",
+        replicas: Optional[str] = None
     ):
-        """Initialize transcription service with Whisper model"""
+        """Initialize transcription service with Whisper model
+
+        precision="int8" applies dynamic int8 quantization to the linear layers
+        (CPU only) and caches the result as whisper-<name>-int8.pt.
+        backend="compile" runs the encoder and decoder steps through torch.compile
+        for fixed shapes (see services/compiled.py), caching kernels under
+        <model_dir>/compile_cache.
+        replicas="4x4" (or WHISPER_REPLICAS_<MODEL>, then WHISPER_REPLICAS) serves
+        4 weight-sharing model replicas, each on its own thread pinned to 4 CPUs
+        with 4 intra-op threads. Services in one process never share CPUs.
+        feature_cache=True (or WHISPER_FEATURE_CACHE=1) keeps log-mel sidecars
+        next to stored recordings for transcribe_recording.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}. Choose from {', '.join(PRECISIONS)}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}. Choose from {', '.join(BACKENDS)}")
+        if precision == "int8" and device != "cpu":
+            raise ValueError("int8 precision is only supported on CPU")
         self.model_name = model_name
         self.model_dir = model_dir or Path("models")
         self.language = language
         self.device = device
+        self.precision = precision
+        self.backend = backend
+        self.compiled = {}
         self.model = None
+        # fp16 only helps (and only works reliably) on GPU
+        self.fp16 = self.device == "cuda"
+        self.layout = replicas or os.environ.get(layout_variable(model_name)) or os.environ.get("WHISPER_REPLICAS")
+        self.replicas = []
         self._initialize_model()
+        self.scheduler = InferenceScheduler(replicas=len(self.replicas))
+        # Opt-in log-mel sidecar cache for stored recordings
+        if feature_cache is None:
+            feature_cache = os.environ.get("WHISPER_FEATURE_CACHE") == "1"
+        self.feature_cache = FeatureCache(self.model.dims.n_mels) if feature_cache else None
 
     def _initialize_model(self) -> None:
         """Initialize and load Whisper model"""
         try:
+            start = time.perf_counter()
             self.model_dir.mkdir(parents=True, exist_ok=True)
-            model_path = self.model_dir / f"whisper-{self.model_name}.pt"
+            fp32_path = self.model_dir / f"whisper-{self.model_name}.pt"
 
             # Load or download model
-            if model_path.exists():
-                print(f"Loading existing model from {model_path}")
+            if self.precision == "int8" and self.model_path.exists():
+                print(f"Loading quantized model from {self.model_path}")
+                self.model = load_quantized(self.model_path)
+            elif fp32_path.exists():
+                print(f"Loading existing model from {fp32_path}")
                 self.model = whisper.load_model(self.model_name, device=self.device)
-                state_dict = torch.load(str(model_path), map_location=self.device)
+                state_dict = torch.load(str(fp32_path), map_location=self.device)
                 self.model.load_state_dict(state_dict)
             else:
                 print(f"Downloading Whisper {self.model_name} model...")
                 self.model = whisper.load_model(self.model_name, device=self.device)
                 # Save model for future use
-                torch.save(self.model.state_dict(), str(model_path))
+                torch.save(self.model.state_dict(), str(fp32_path))
+
+            if self.precision == "int8" and not self.model_path.exists():
+                print(f"Quantizing Whisper {self.model_name} model to int8...")
+                self.model = quantize_model(self.model)
+                save_quantized(self.model, self.model_path)
+
+            # Weights are read-only from here on (replicas and pre-forked workers share them)
+            self.model.eval().requires_grad_(False)
+            self._create_replicas()
+            if self.backend == "compile":
+                print(f"Compiling Whisper {self.model_name} model...")
+                configure_compile_cache(self.model_dir / "compile_cache")
+                for replica in self.replicas:
+                    compiled = compile_model(replica.model, self.device)
+                    self.compiled.update({f"replica{replica.index}.{name}": forward for name, forward in compiled.items()})
+
+            MODEL_LOAD_SECONDS.labels(self.model_path.stem).set(time.perf_counter() - start)
+            for replica in self.replicas:
+                instrument_model(replica.model)
 
         except Exception as e:
             print(f"Error initializing Whisper model: {e}")
             raise
 
-    def transcribe_file(self, audio_path: Path) -> Optional[Dict]:
-        """Transcribe audio file"""
+    @property
+    def model_path(self) -> Path:
+        suffix = "" if self.precision == "fp32" else f"-{self.precision}"
+        return self.model_dir / f"whisper-{self.model_name}{suffix}.pt"
+
+    def _create_replicas(self) -> None:
+        """Split the loaded model into the configured replica layout"""
+        if not self.layout:
+            self.replicas = [Replica(0, self.model)]
+            return
+        if self.device != "cpu":
+            raise ValueError("Replica layouts pin CPU cores and are only supported on CPU")
+        count, threads = parse_layout(self.layout)
+        self.replicas = [
+            Replica(i, self.model if i == 0 else share_model(self.model), threads=threads)
+            for i in range(count)
+        ]
+        # CPUs are assigned across all services of the process, not per service
+        cpu_allocator.pin(self.replicas)
+
+    def _infer(self, decoding_profile: str, call: Callable) -> Tuple[object, str]:
+        """Run call(model, profile) on a free replica; returns its result and the profile used"""
+        with self.scheduler.slot(decoding_profile) as (index, used):
+            IN_FLIGHT.inc()
+            try:
+                return self.replicas[index].run(self._timed_call, call, self.replicas[index].model, used), used
+            finally:
+                IN_FLIGHT.dec()
+
+    def _timed_call(self, call: Callable, model, used: str):
+        # Runs on the replica's own thread, so the profiler sees the actual inference
+        with observe_stage("inference"), maybe_profile():
+            return call(model, used)
+
+    def _transcribe(
+        self,
+        audio: Optional[np.ndarray],
+        decoding_profile: str,
+        language: Optional[str] = None,
+        mel: Optional[torch.Tensor] = None
+    ) -> Dict:
+        """Run model.transcribe on audio, or on precomputed padded log-mel features"""
+        # The language is per call: the service is shared by concurrent requests
+        language = language or self.language
+
+        def call(model, used):
+            options = dict(language=language, fp16=self.fp16, task="transcribe", **transcribe_options(used))
+            if mel is None:
+                return model.transcribe(audio, **options)
+            with precomputed_mel(mel):
+                return model.transcribe(np.zeros(0, dtype=np.float32), **options)
+
+        result, used = self._infer(decoding_profile, call)
+        return {
+            "text": result["text"],
+            "language": result.get("language", language),
+            "segments": result.get("segments", []),
+            "decoding_profile": used
+        }
+
+    def transcribe_file(
+        self,
+        audio_path: Path,
+        decoding_profile: str = "balanced",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Transcribe audio file (in the service's language unless one is given)"""
         if not self.model:
             raise RuntimeError("Model not initialized")
 
         try:
-            result = self.model.transcribe(
-                str(audio_path),
-                language=self.language,
-                fp16=False,
-                task="transcribe"
-            )
-            return {
-                "text": result["text"],
-                "language": result.get("language", self.language),
-                "segments": result.get("segments", [])
-            }
+            # Decode PCM WAVs in-process; ffmpeg is only started for other formats
+            with observe_stage("decode"):
+                audio = load_audio(audio_path)
+            return self._transcribe(audio, decoding_profile, language)
         except Exception as e:
             print(f"Error transcribing file: {e}")
             return None
 
-    def transcribe_audio_data(self, audio_data: np.ndarray, sample_rate: int = 16000) -> Optional[Dict]:
+    def transcribe_audio_data(
+        self,
+        audio_data: np.ndarray,
+        sample_rate: int = 16000,
+        decoding_profile: str = "realtime-fast",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
         """Transcribe audio data directly from numpy array"""
         if not self.model:
             raise RuntimeError("Model not initialized")
@@ -74,26 +208,119 @@ class TranscriptionService:
             if audio_data.dtype == np.int16:
                 audio_data = audio_data.astype(np.float32) / 32768.0
 
-            result = self.model.transcribe(
-                audio_data,
-                language=self.language,
-                fp16=False,
-                task="transcribe"
-            )
-            return {
-                "text": result["text"],
-                "language": result.get("language", self.language),
-                "segments": result.get("segments", [])
-            }
+            return self._transcribe(audio_data, decoding_profile, language)
         except Exception as e:
             print(f"Error transcribing audio data: {e}")
             return None
 
+    def _decode_window(
+        self,
+        window: torch.Tensor,
+        decoding_profile: str,
+        language: str
+    ) -> Tuple[Optional[object], str]:
+        """Decode one (n_mels, N_FRAMES) window; the result is None when it holds no speech"""
+        result, used = self._infer(decoding_profile, lambda model, used: whisper.decode(
+            model,
+            window,
+            decoding_options(
+                used,
+                language=language,
+                task="transcribe",
+                fp16=self.fp16,
+                without_timestamps=True
+            )
+        ))
+        # Same silence check as whisper.transcribe
+        options = transcribe_options(used)
+        if (result.no_speech_prob > options["no_speech_threshold"]
+                and result.avg_logprob <= options["logprob_threshold"]):
+            return None, used
+        return result, used
+
+    def transcribe_mel(
+        self,
+        mel: np.ndarray,
+        decoding_profile: str = "archive-accurate",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Transcribe a log-mel spectrogram padded with 30 seconds of silence
+
+        The features replace whisper's own feature extraction, so the result
+        (segments, timestamps, temperature fallback, conditioning on previous
+        text) is the same as transcribe_file on the audio they came from.
+        """
+        if not self.model:
+            raise RuntimeError("Model not initialized")
+
+        try:
+            # Cached features are a float32 memory map; wrap it without copying
+            features = torch.from_numpy(np.asarray(mel, dtype=np.float32))
+            return self._transcribe(None, decoding_profile, language, mel=features)
+        except Exception as e:
+            print(f"Error transcribing features: {e}")
+            return None
+
+    def transcribe_window(
+        self,
+        window: torch.Tensor,
+        content_frames: int,
+        decoding_profile: str = "realtime-fast",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Transcribe one normalized (n_mels, N_FRAMES) log-mel window, e.g. from StreamingLogMel
+
+        The window is passed to the encoder as is (no copy on CPU).
+        """
+        if not self.model:
+            raise RuntimeError("Model not initialized")
+
+        try:
+            language = language or self.language
+            result, used = self._decode_window(window.to(self.device), decoding_profile, language)
+            text = result.text if result is not None else ""
+            segments = [{
+                "id": 0,
+                "start": 0.0,
+                "end": content_frames * HOP_LENGTH / SAMPLE_RATE,
+                "text": text
+            }] if text.strip() else []
+            return {"text": text, "language": language, "segments": segments, "decoding_profile": used}
+        except Exception as e:
+            print(f"Error transcribing features: {e}")
+            return None
+
+    def transcribe_recording(
+        self,
+        audio_path: Path,
+        decoding_profile: str = "archive-accurate",
+        language: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Transcribe a stored recording, using cached features when enabled"""
+        if self.feature_cache is None:
+            return self.transcribe_file(audio_path, decoding_profile, language)
+
+        try:
+            mel = self.feature_cache.get_or_compute(audio_path)
+        except Exception as e:
+            print(f"Error preparing cached features: {e}")
+            return self.transcribe_file(audio_path, decoding_profile, language)
+        return self.transcribe_mel(mel, decoding_profile, language)
+
+    def get_status(self) -> Dict:
+        return self.scheduler.get_status()
+
     def get_model_info(self) -> Dict:
         """Get information about the current model"""
         return {
             "model_name": self.model_name,
             "language": self.language,
             "device": self.device,
-            "model_path": str(self.model_dir / f"whisper-{self.model_name}.pt")
+            "precision": self.precision,
+            "backend": self.backend,
+            "compiled": {name: forward.get_status() for name, forward in self.compiled.items()},
+            "replicas": [replica.get_status() for replica in self.replicas],
+            "model_path": str(self.model_path),
+            "feature_cache": self.feature_cache is not None,
+            "scheduler": self.scheduler.get_status()
         }
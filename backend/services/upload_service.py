@@ -0,0 +1,536 @@
+# services/upload_service.py
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.audio_loader import TARGET_SAMPLE_RATE, stream_decoder
+from services.decoding_profiles import DEGRADE_ORDER
+
+UPLOAD_FORMATS = (".wav", ".mp3", ".m4a", ".flac")
+MAX_PART_SIZE = 16 * 1024 * 1024
+# Uploads in progress at once, and how long one may go without a part before it expires
+MAX_ACTIVE_UPLOADS = int(os.environ.get("WHISPER_MAX_UPLOADS", "32"))
+UPLOAD_IDLE_TIMEOUT = float(os.environ.get("WHISPER_UPLOAD_IDLE_TIMEOUT", "1800"))
+# How long a finished upload's result is kept; its audio is removed as soon as it finishes
+UPLOAD_RESULT_TTL = float(os.environ.get("WHISPER_UPLOAD_RESULT_TTL", "86400"))
+
+# Decoded audio is cut into windows of at most 30 s (Whisper's context), at the
+# quietest 20 ms frame of the last 5 s so words are not split between windows
+WINDOW_SAMPLES = 30 * TARGET_SAMPLE_RATE
+CUT_SEARCH_SAMPLES = 5 * TARGET_SAMPLE_RATE
+CUT_FRAME_SAMPLES = TARGET_SAMPLE_RATE // 50
+
+UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        """A rejected upload request; offset is the server's current offset when relevant"""
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+def find_cut(audio: np.ndarray) -> int:
+    """Sample index at the quietest frame in the last CUT_SEARCH_SAMPLES of audio"""
+    search_start = max(len(audio) - CUT_SEARCH_SAMPLES, 0)
+    region = audio[search_start:]
+    frames = len(region) // CUT_FRAME_SAMPLES
+    if frames == 0:
+        return len(audio)
+    energy = np.square(region[:frames * CUT_FRAME_SAMPLES]).reshape(frames, CUT_FRAME_SAMPLES).mean(axis=1)
+    return search_start + int(np.argmin(energy)) * CUT_FRAME_SAMPLES + CUT_FRAME_SAMPLES // 2
+
+def _try_lock(path: Path) -> Optional[int]:
+    """Open and exclusively flock path; None if another process holds it"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+def _write_json(path: Path, data: Dict) -> None:
+    """Replace path atomically so other processes never read a partial file"""
+    tmp_path = path.with_name(f".{uuid.uuid4().hex}.json")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    tmp_path.replace(path)
+
+def _read_json(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _audio_path(directory: Path, meta: Dict) -> Path:
+    return directory / f"audio{Path(meta['filename']).suffix.lower()}"
+
+def initial_status(upload_id: str, meta: Dict, offset: int = 0) -> Dict:
+    """Status of an upload whose transcription has not started"""
+    return {
+        "upload_id": upload_id,
+        "filename": meta["filename"],
+        "size": meta["size"],
+        "offset": offset,
+        "status": "uploading",
+        "error": None,
+        "windows_queued": 0,
+        "windows_done": 0,
+        "transcribed_seconds": 0.0,
+        "decoding_profile": meta["decoding_profile"],
+    }
+
+class UploadSession:
+    def __init__(self, upload_id: str, directory: Path, meta: Dict, transcription_service, owner_fd: int):
+        """Transcription of one upload, run by the process holding its owner lock
+
+        Parts may be appended by any process; the owner follows the file as it
+        grows, feeds new bytes to an incremental decoder and queues every 30 s
+        of decoded audio for transcription on a worker thread, so the
+        transcript is mostly done when the last part lands. Progress is
+        written to status.json for the other processes.
+        """
+        self.upload_id = upload_id
+        self.directory = directory
+        self.meta = meta
+        self.transcription_service = transcription_service
+        self.owner_fd: Optional[int] = owner_fd
+        self.path = _audio_path(directory, meta)
+        self.lock = threading.Lock()
+        # Set when this process appended a part, so the reader need not wait for its next poll
+        self.arrived = threading.Event()
+
+        self.status = "uploading"
+        self.error: Optional[str] = None
+        self.segments: List[Dict] = []
+        self.decoding_profile = meta["decoding_profile"]
+        self.windows_queued = 0
+        self.windows_done = 0
+        self.transcribed_samples = 0
+        self.completed = threading.Event()
+        self.finished_at: Optional[float] = None
+
+        self.digest = hashlib.sha256()
+        # Bytes of the file read and decoded so far
+        self.offset = 0
+        # Decoded audio not yet cut into a window, starting at window_start samples
+        self.pcm = np.zeros(0, dtype=np.float32)
+        self.window_start = 0
+        self.decoder = None
+        self.decoder_ok: Optional[bool] = None
+        self.windows: "queue.Queue" = queue.Queue()
+        self.worker: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Follow the upload file on a thread; after a restart this re-reads what was already received"""
+        threading.Thread(target=self._follow_upload, name=f"upload-{self.upload_id[:8]}", daemon=True).start()
+
+    def _start_decoder(self) -> None:
+        # Only once data arrives, so idle uploads hold no ffmpeg process or transcription thread
+        self.decoder = stream_decoder(self.path.suffix, self._on_audio, self._on_decoded)
+        self.worker = threading.Thread(
+            target=self._transcribe_windows, name=f"upload-{self.upload_id[:8]}-asr", daemon=True
+        )
+        self.worker.start()
+
+    def _follow_upload(self) -> None:
+        last_activity = time.time()
+        saved = None
+        f = None
+        try:
+            while self.status == "uploading":
+                if f is None and self.path.exists():
+                    f = open(self.path, "rb")
+                block = f.read(1024 * 1024) if f is not None else b""
+                if block:
+                    with self.lock:
+                        if self.status != "uploading":
+                            break
+                        if self.decoder is None:
+                            self._start_decoder()
+                        self.digest.update(block)
+                        self.offset += len(block)
+                        self.decoder.feed(block)
+                        if self.offset >= self.meta["size"]:
+                            self._complete()
+                    last_activity = time.time()
+                    continue
+
+                if saved != self.offset:
+                    saved = self.offset
+                    self._save_status()
+                if not (self.directory / "meta.json").exists():
+                    # Deleted through another process
+                    self.cancel()
+                elif time.time() - last_activity > UPLOAD_IDLE_TIMEOUT:
+                    self._fail(f"Upload expired after {UPLOAD_IDLE_TIMEOUT:.0f}s without new parts")
+                else:
+                    self.arrived.wait(0.5)
+                    self.arrived.clear()
+        except Exception as e:
+            self._fail(f"Error reading upload: {e}")
+        finally:
+            if f is not None:
+                f.close()
+
+    def _complete(self) -> None:
+        """All bytes are read: check the whole-file checksum and let the decoder finish"""
+        expected = self.meta.get("sha256")
+        if expected and self.digest.hexdigest() != expected.lower():
+            self._fail("File checksum mismatch")
+            return
+        self.status = "transcribing"
+        self.completed.set()
+        self.decoder.close()
+        self._save_status()
+
+    def _on_audio(self, audio: np.ndarray) -> None:
+        self.pcm = np.concatenate([self.pcm, audio])
+        while len(self.pcm) >= WINDOW_SAMPLES:
+            cut = find_cut(self.pcm[:WINDOW_SAMPLES])
+            self._queue_window(self.pcm[:cut])
+            self.pcm = self.pcm[cut:]
+
+    def _queue_window(self, audio: np.ndarray) -> None:
+        self.windows.put((self.window_start, audio))
+        self.window_start += len(audio)
+        self.windows_queued += 1
+
+    def _on_decoded(self, ok: bool) -> None:
+        self.decoder_ok = ok
+        if ok and len(self.pcm):
+            self._queue_window(self.pcm)
+            self.pcm = np.zeros(0, dtype=np.float32)
+        self.windows.put(None)
+
+    def _transcribe_windows(self) -> None:
+        language = self.meta.get("language")
+        while True:
+            item = self.windows.get()
+            if item is None:
+                break
+            if self.status == "failed":
+                return
+            if not (self.directory / "meta.json").exists():
+                # Deleted through another process
+                self.cancel()
+                return
+            start, audio = item
+            result = self.transcription_service.transcribe_audio_data(
+                audio, TARGET_SAMPLE_RATE, decoding_profile=self.meta["decoding_profile"], language=language
+            )
+            if result is None:
+                self._fail(f"Transcription failed for audio at {start / TARGET_SAMPLE_RATE:.1f}s")
+                return
+            self._add_segments(result, start / TARGET_SAMPLE_RATE, len(audio) / TARGET_SAMPLE_RATE)
+            # Report the cheapest profile any window fell back to
+            used = result.get("decoding_profile", self.decoding_profile)
+            self.decoding_profile = max(self.decoding_profile, used, key=DEGRADE_ORDER.index)
+            self.windows_done += 1
+            self.transcribed_samples = start + len(audio)
+            self._save_status()
+
+        # Wait for the last part, e.g. when the decoder gave up early
+        self.completed.wait()
+        if self.status == "failed":
+            return
+        if not self.decoder_ok:
+            # The format could not be decoded as a stream: transcribe the finished file
+            self.segments = []
+            result = self.transcription_service.transcribe_file(
+                self.path, self.meta["decoding_profile"], language=language
+            )
+            if result is None:
+                self._fail("Transcription failed")
+                return
+            self._add_segments(result, 0.0, self.window_start / TARGET_SAMPLE_RATE)
+            self.decoding_profile = result.get("decoding_profile", self.decoding_profile)
+        self._finish()
+
+    def cancel(self) -> None:
+        """Stop following the upload and let the worker exit; nothing is saved"""
+        with self.lock:
+            if self.status in ("uploading", "transcribing"):
+                self.error = "Cancelled"
+                self._stop("failed")
+
+    def _stop(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+        self.completed.set()
+        if self.decoder is not None and status == "failed":
+            self.decoder.abort()
+        if self.owner_fd is not None:
+            os.close(self.owner_fd)
+            self.owner_fd = None
+
+    def _add_segments(self, result: Dict, offset: float, duration: float) -> None:
+        segments = result.get("segments") or []
+        if not segments and result.get("text", "").strip():
+            segments = [{"start": 0.0, "end": duration, "text": result["text"]}]
+        for segment in segments:
+            self.segments.append({
+                "id": len(self.segments),
+                "start": segment["start"] + offset,
+                "end": segment["end"] + offset,
+                "text": segment["text"]
+            })
+
+    def _finish(self) -> None:
+        self.status = "completed"
+        # The result is on disk before the owner lock is released
+        self._save_result()
+        self._stop("completed")
+        self._remove_data()
+
+    def _fail(self, error: str) -> None:
+        if self.status == "failed":
+            return
+        print(f"Upload {self.upload_id} failed: {error}")
+        self.error = error
+        self.status = "failed"
+        self._save_result()
+        self._stop("failed")
+        self._remove_data()
+
+    def _remove_data(self) -> None:
+        """Drop the audio and progress files once result.json is final"""
+        for path in (self.path, self.directory / "status.json"):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                print(f"Error removing {path}: {e}")
+
+    def _save_status(self) -> None:
+        if not self.directory.exists():
+            return
+        try:
+            _write_json(self.directory / "status.json", self.get_status(include_segments=True))
+        except Exception as e:
+            print(f"Error saving upload status: {e}")
+
+    def _save_result(self) -> None:
+        try:
+            _write_json(self.directory / "result.json", self.get_status(include_segments=True))
+        except Exception as e:
+            print(f"Error saving upload result: {e}")
+
+    @property
+    def text(self) -> str:
+        return "".join(segment["text"] for segment in self.segments)
+
+    def get_status(self, include_segments: bool = False) -> Dict:
+        status = initial_status(self.upload_id, self.meta, self.offset)
+        status.update({
+            "status": self.status,
+            "error": self.error,
+            "windows_queued": self.windows_queued,
+            "windows_done": self.windows_done,
+            "transcribed_seconds": self.transcribed_samples / TARGET_SAMPLE_RATE,
+            "decoding_profile": self.decoding_profile,
+        })
+        if include_segments:
+            status.update({
+                "text": self.text,
+                "language": self.meta.get("language") or self.transcription_service.language,
+                "segments": list(self.segments),
+            })
+        return status
+
+class UploadManager:
+    def __init__(self, upload_dir: Path, transcription_service):
+        """Resumable uploads persisted under upload_dir
+
+        State lives on disk so uploads survive restarts and work across
+        pre-forked workers: any process may append a part (under a file lock
+        on the audio file), while the process holding an upload's owner lock
+        transcribes it.
+        """
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.transcription_service = transcription_service
+        # Sessions owned by this process
+        self.sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, upload_id: str) -> Optional[Path]:
+        if not UPLOAD_ID.fullmatch(upload_id):
+            return None
+        directory = self.upload_dir / upload_id
+        return directory if (directory / "meta.json").exists() else None
+
+    def create(
+        self,
+        filename: str,
+        size: int,
+        sha256: Optional[str] = None,
+        language: Optional[str] = None,
+        decoding_profile: str = "balanced"
+    ) -> Dict:
+        if Path(filename).suffix.lower() not in UPLOAD_FORMATS:
+            raise UploadError(400, f"Unsupported file format. Use one of: {', '.join(UPLOAD_FORMATS)}")
+        if size <= 0:
+            raise UploadError(400, "Upload size must be positive")
+        if self._expire_idle() >= MAX_ACTIVE_UPLOADS:
+            raise UploadError(429, f"Too many uploads in progress (max {MAX_ACTIVE_UPLOADS})")
+
+        upload_id = uuid.uuid4().hex
+        directory = self.upload_dir / upload_id
+        directory.mkdir()
+        meta = {
+            "filename": Path(filename).name,
+            "size": size,
+            "sha256": sha256,
+            "language": language,
+            "decoding_profile": decoding_profile,
+            "created": time.time(),
+        }
+        _write_json(directory / "meta.json", meta)
+        return initial_status(upload_id, meta)
+
+    def _expire_idle(self) -> int:
+        """Fail unowned uploads that have had no part for UPLOAD_IDLE_TIMEOUT and remove
+        results older than UPLOAD_RESULT_TTL; returns the uploads still active"""
+        active = 0
+        now = time.time()
+        for directory in self.upload_dir.iterdir():
+            meta = _read_json(directory / "meta.json") if directory.is_dir() else None
+            if meta is None:
+                continue
+            result_path = directory / "result.json"
+            if result_path.exists():
+                try:
+                    if now - result_path.stat().st_mtime > UPLOAD_RESULT_TTL:
+                        shutil.rmtree(directory, ignore_errors=True)
+                except FileNotFoundError:
+                    pass
+                continue
+            audio_path = _audio_path(directory, meta)
+            last_activity = max(p.stat().st_mtime for p in (directory / "meta.json", audio_path) if p.exists())
+            if now - last_activity > UPLOAD_IDLE_TIMEOUT:
+                # Uploads with a live owner expire through their own session
+                fd = _try_lock(directory / "owner.lock")
+                if fd is not None:
+                    try:
+                        status = initial_status(directory.name, meta)
+                        status.update(status="failed", error="Upload expired without new parts")
+                        _write_json(directory / "result.json", status)
+                        audio_path.unlink(missing_ok=True)
+                    finally:
+                        os.close(fd)
+                    continue
+            active += 1
+        return active
+
+    def _owned_session(self, upload_id: str, directory: Path) -> Optional[UploadSession]:
+        """This process's session for an upload, taking ownership if no process has it"""
+        with self._lock:
+            self._prune()
+            session = self.sessions.get(upload_id)
+            if session is not None or (directory / "result.json").exists():
+                return session
+            fd = _try_lock(directory / "owner.lock")
+            if fd is None:
+                return None
+            if (directory / "result.json").exists():
+                # Finished by the previous owner just before it let go
+                os.close(fd)
+                return None
+            meta = _read_json(directory / "meta.json")
+            session = UploadSession(upload_id, directory, meta, self.transcription_service, fd)
+            self.sessions[upload_id] = session
+        session.start()
+        return session
+
+    def _prune(self) -> None:
+        """Forget finished sessions; their results are on disk"""
+        for upload_id, session in list(self.sessions.items()):
+            if session.finished_at is not None:
+                del self.sessions[upload_id]
+
+    def write_part(self, upload_id: str, offset: int, data: bytes, sha256: Optional[str] = None) -> int:
+        """Append one part at offset; returns the new offset"""
+        directory = self._directory(upload_id)
+        if directory is None:
+            raise UploadError(404, f"Upload {upload_id} not found")
+        meta = _read_json(directory / "meta.json")
+        if len(data) > MAX_PART_SIZE:
+            raise UploadError(413, f"Parts may be at most {MAX_PART_SIZE} bytes")
+        if sha256 and hashlib.sha256(data).hexdigest() != sha256.lower():
+            raise UploadError(400, "Part checksum mismatch")
+        result = _read_json(directory / "result.json")
+        if result is not None:
+            # Checked before opening the file: finished uploads have had their audio removed
+            raise UploadError(409, f"Upload is {result['status']}", result["offset"])
+
+        audio_path = _audio_path(directory, meta)
+        with open(audio_path, "ab") as f:
+            # Serializes appends from every process
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = os.fstat(f.fileno()).st_size
+            result = _read_json(directory / "result.json")
+            if result is not None:
+                if current == 0:
+                    # Finished while this part waited for the lock; do not leave an empty file behind
+                    audio_path.unlink(missing_ok=True)
+                raise UploadError(409, f"Upload is {result['status']}", result["offset"])
+            if offset != current:
+                raise UploadError(409, f"Part starts at {offset} but the upload is at {current}", current)
+            if current + len(data) > meta["size"]:
+                raise UploadError(413, "Part extends past the declared upload size", current)
+            f.write(data)
+            f.flush()
+
+        session = self._owned_session(upload_id, directory)
+        if session is not None:
+            session.arrived.set()
+        return current + len(data)
+
+    def get_status(self, upload_id: str) -> Optional[Dict]:
+        """Offset and progress with the transcript so far, from whichever process owns the upload"""
+        directory = self._directory(upload_id)
+        if directory is None:
+            return None
+        result = _read_json(directory / "result.json")
+        if result is not None:
+            return result
+        # Takes over uploads whose owner is gone, e.g. after a restart
+        session = self._owned_session(upload_id, directory)
+        if session is not None:
+            status = session.get_status(include_segments=True)
+        else:
+            meta = _read_json(directory / "meta.json")
+            status = _read_json(directory / "status.json") or initial_status(upload_id, meta)
+            # Another process may have finished in the meantime
+            result = _read_json(directory / "result.json")
+            if result is not None:
+                return result
+        if status["status"] == "uploading":
+            # Parts may have been appended by any process: the file is the source of truth
+            audio_path = _audio_path(directory, _read_json(directory / "meta.json"))
+            status["offset"] = audio_path.stat().st_size if audio_path.exists() else 0
+        return status
+
+    def delete(self, upload_id: str) -> bool:
+        directory = self._directory(upload_id)
+        if directory is None:
+            return False
+        with self._lock:
+            session = self.sessions.pop(upload_id, None)
+        if session is not None:
+            session.cancel()
+        # An owner in another process stops once meta.json is gone
+        shutil.rmtree(directory, ignore_errors=True)
+        return True
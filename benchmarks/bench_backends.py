@@ -0,0 +1,101 @@
+# benchmarks/bench_backends.py
+"""Compare the eager and compiled TranscriptionService backends on CPU
+
+Usage:
+    python benchmarks/bench_backends.py --model tiny
+    python benchmarks/bench_backends.py --model base --precision int8 --output backends.json
+
+The compiled backend runs twice: the first run may have to compile (cold
+cache), the second loads kernels from <model-dir>/compile_cache (warm).
+Each run reports model load time (including compilation), encoder latency
+for one 30-second window and end-to-end latency on realtime-sized chunks.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from common import ROOT_DIR, Timer, add_import_paths, peak_rss_mb, percentiles, run_isolated, synthetic_speech
+
+RUNS = (("eager", "eager"), ("compile", "compile (first run)"), ("compile", "compile (warm cache)"))
+
+def bench_backend(args) -> dict:
+    add_import_paths()
+    import torch
+    from whisper.audio import N_FRAMES
+    from services.transcription_service import TranscriptionService
+
+    torch.manual_seed(0)
+    with Timer() as load:
+        service = TranscriptionService(
+            model_name=args.model,
+            model_dir=Path(args.model_dir),
+            device="cpu",
+            precision=args.precision,
+            backend=args.backend
+        )
+
+    mel = torch.randn(1, service.model.dims.n_mels, N_FRAMES)
+    encoder_latencies = []
+    with torch.inference_mode():
+        service.model.encoder(mel)  # warm-up
+        for _ in range(args.repeats):
+            with Timer() as timer:
+                service.model.encoder(mel)
+            encoder_latencies.append(timer.elapsed)
+
+    chunks = [synthetic_speech(args.chunk_duration, 16000, seed=i) for i in range(args.repeats + 1)]
+    service.transcribe_audio_data(chunks[0])  # warm-up
+    chunk_latencies = []
+    for chunk in chunks[1:]:
+        with Timer() as timer:
+            service.transcribe_audio_data(chunk)
+        chunk_latencies.append(timer.elapsed)
+
+    latency = percentiles(chunk_latencies)
+    return {
+        "model_load_seconds": load.elapsed,
+        "encoder_latency": percentiles(encoder_latencies),
+        "chunk_latency": latency,
+        "rtf": latency["mean"] / args.chunk_duration,
+        "peak_rss_mb": peak_rss_mb(),
+        "compiled": service.get_model_info()["compiled"],
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--model-dir", default=str(ROOT_DIR / "models"))
+    parser.add_argument("--precision", default="fp32", choices=("fp32", "int8"))
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--chunk-duration", type=float, default=2.0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = {"model": args.model, "precision": args.precision}
+    for backend, label in RUNS:
+        print(f"Running {label}...")
+        args.backend = backend
+        results[label] = run_isolated(bench_backend, args)
+        if "error" in results[label]:
+            print(f"Error in {label}: {results[label]['error']}")
+            return 1
+
+    print(f"{'':22s} {'load s':>8s} {'encoder ms':>11s} {'chunk p50 ms':>13s} {'chunk p90 ms':>13s} {'RSS MB':>8s}")
+    for _, label in RUNS:
+        r = results[label]
+        print(f"{label:22s} {r['model_load_seconds']:8.2f} {r['encoder_latency']['p50'] * 1000:11.1f} "
+              f"{r['chunk_latency']['p50'] * 1000:13.1f} {r['chunk_latency']['p90'] * 1000:13.1f} "
+              f"{r['peak_rss_mb']:8.1f}")
+    eager, warm = results["eager"], results["compile (warm cache)"]
+    print(f"Encoder speedup: {eager['encoder_latency']['p50'] / warm['encoder_latency']['p50']:.2f}x  "
+          f"chunk speedup: {eager['chunk_latency']['p50'] / warm['chunk_latency']['p50']:.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
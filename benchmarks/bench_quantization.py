@@ -0,0 +1,145 @@
+# benchmarks/bench_quantization.py
+"""Compare fp32 and dynamic int8 TranscriptionService on CPU
+
+Usage:
+    python benchmarks/bench_quantization.py --model base recording1.wav recording2.flac
+    python benchmarks/bench_quantization.py --model tiny --output quantization.json
+
+Each precision runs in its own process and reports model load time, peak RSS,
+on-disk model size and transcription latency. Error rate is measured against
+a transcript stored next to each file (recording.txt, as the app saves them);
+without one, the fp32 output is the reference, so the int8 figure is its
+disagreement with fp32. Error rate is per character for Japanese and other
+languages written without spaces, per word otherwise.
+Without input files a synthetic clip is used, which only measures speed.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from common import (
+    ROOT_DIR, Timer, add_import_paths, peak_rss_mb, percentiles, run_isolated,
+    synthetic_speech, word_error_rate, write_wav
+)
+
+PRECISIONS = ("fp32", "int8")
+CHARACTER_LANGUAGES = {"ja", "zh", "th", "lo", "km", "my"}
+
+def _service(args, precision):
+    add_import_paths()
+    from services.transcription_service import TranscriptionService
+    return TranscriptionService(
+        model_name=args.model,
+        model_dir=Path(args.model_dir),
+        language=args.language,
+        device="cpu",
+        precision=precision
+    )
+
+def prepare_int8(args) -> dict:
+    """Create the int8 cache so the measured run times a warm load"""
+    service = _service(args, "int8")
+    return {"model_path": str(service.model_path)}
+
+def bench_precision(args) -> dict:
+    with Timer() as load:
+        service = _service(args, args.precision)
+    load_rss = peak_rss_mb()
+
+    service.transcribe_file(Path(args.files[0]), args.decoding_profile)  # warm-up
+    texts, latencies = [], []
+    for path in args.files:
+        runs = []
+        for _ in range(args.repeats):
+            with Timer() as timer:
+                result = service.transcribe_file(Path(path), args.decoding_profile)
+            runs.append(timer.elapsed)
+        texts.append(result["text"] if result else "")
+        latencies.append(min(runs))
+
+    return {
+        "model_load_seconds": load.elapsed,
+        "model_file_mb": service.model_path.stat().st_size / 1024 / 1024,
+        "load_rss_mb": load_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "latency": percentiles(latencies),
+        "total_seconds": sum(latencies),
+        "texts": texts,
+    }
+
+def audio_seconds(path: str) -> float:
+    add_import_paths()
+    from services.audio_loader import load_audio
+    return len(load_audio(Path(path))) / 16000
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="Audio files to transcribe (WAV or FLAC)")
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--model-dir", default=str(ROOT_DIR / "models"))
+    parser.add_argument("--language", default="ja")
+    parser.add_argument("--decoding-profile", default="realtime-fast",
+                        help="Decoding profile; the default has no temperature fallback, so timings are comparable")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per file; the fastest is reported")
+    parser.add_argument("--duration", type=float, default=30.0, help="Synthetic clip length without input files")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.files:
+            args.files = [str(write_wav(Path(tmp) / "speech.wav", synthetic_speech(args.duration, 16000), 16000))]
+            print("No input files: using synthetic audio, error rates are not meaningful")
+
+        print("Preparing int8 model cache...")
+        prepared = run_isolated(prepare_int8, args)
+        if "error" in prepared:
+            print(f"Error preparing int8 model: {prepared['error']}")
+            return 1
+
+        results = {"model": args.model, "decoding_profile": args.decoding_profile}
+        for precision in PRECISIONS:
+            print(f"Running {precision}...")
+            args.precision = precision
+            results[precision] = run_isolated(bench_precision, args)
+            if "error" in results[precision]:
+                print(f"Error in {precision} benchmark: {results[precision]['error']}")
+                return 1
+        duration = sum(audio_seconds(path) for path in args.files)
+
+    by_char = args.language in CHARACTER_LANGUAGES
+    references = []
+    for path, fp32_text in zip(args.files, results["fp32"]["texts"]):
+        transcript = Path(path).with_suffix(".txt")
+        references.append(transcript.read_text(encoding="utf-8") if transcript.exists() else fp32_text)
+    results["reference"] = "stored transcripts" if all(
+        Path(path).with_suffix(".txt").exists() for path in args.files
+    ) else "fp32 output (where no transcript was found)"
+
+    for precision in PRECISIONS:
+        result = results[precision]
+        errors = [word_error_rate(ref, hyp, by_char) for ref, hyp in zip(references, result["texts"])]
+        result["error_rate"] = sum(errors) / len(errors)
+        result["rtf"] = result["total_seconds"] / duration
+
+    fp32, int8 = results["fp32"], results["int8"]
+    results["speedup"] = fp32["total_seconds"] / int8["total_seconds"]
+    results["rss_reduction_mb"] = fp32["peak_rss_mb"] - int8["peak_rss_mb"]
+
+    unit = "CER" if by_char else "WER"
+    print(f"{'':6s} {'load s':>8s} {'file MB':>8s} {'RSS MB':>8s} {'RTF':>8s} {unit:>8s}")
+    for precision in PRECISIONS:
+        r = results[precision]
+        print(f"{precision:6s} {r['model_load_seconds']:8.2f} {r['model_file_mb']:8.1f} "
+              f"{r['peak_rss_mb']:8.1f} {r['rtf']:8.3f} {r['error_rate']:8.3f}")
+    print(f"int8 speedup: {results['speedup']:.2f}x  (reference: {results['reference']})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# benchmarks/bench_replicas.py
+"""Aggregate CPU throughput of TranscriptionService replica layouts
+
+Usage:
+    python benchmarks/bench_replicas.py --model tiny
+    python benchmarks/bench_replicas.py --model base --layouts default,1x16,2x8,4x4,8x2 --requests 64
+
+Each layout ("<replicas>x<threads>", or "default" for a single replica with
+torch's default threading) runs in its own process. Realtime-sized chunks
+are submitted from `--concurrency` client threads (default: twice the
+largest replica count) and the report shows audio seconds transcribed per
+wall second and per-request latency.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from common import ROOT_DIR, Timer, add_import_paths, peak_rss_mb, percentiles, run_isolated, synthetic_speech
+
+def default_layouts() -> str:
+    """default plus every replicas x threads split that uses all available cores"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    layouts = ["default"] + [f"{r}x{cpus // r}" for r in range(1, cpus + 1) if cpus % r == 0]
+    return ",".join(layouts)
+
+def bench_layout(args) -> dict:
+    add_import_paths()
+    from services.transcription_service import TranscriptionService
+
+    with Timer() as load:
+        service = TranscriptionService(
+            model_name=args.model,
+            model_dir=Path(args.model_dir),
+            device="cpu",
+            precision=args.precision,
+            replicas=None if args.layout == "default" else args.layout
+        )
+
+    chunks = [synthetic_speech(args.chunk_duration, 16000, seed=i) for i in range(args.requests)]
+    # Warm every replica once
+    with ThreadPoolExecutor(max_workers=len(service.replicas)) as pool:
+        list(pool.map(service.transcribe_audio_data, chunks[:len(service.replicas)]))
+
+    def request(chunk):
+        with Timer() as timer:
+            service.transcribe_audio_data(chunk, decoding_profile=args.decoding_profile)
+        return timer.elapsed
+
+    service.scheduler.auto_degrade = False  # measure the same decoding work for every layout
+    with Timer() as wall, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(request, chunks))
+
+    audio_seconds = args.requests * args.chunk_duration
+    return {
+        "replicas": len(service.replicas),
+        "model_load_seconds": load.elapsed,
+        "wall_seconds": wall.elapsed,
+        "throughput": audio_seconds / wall.elapsed,
+        "latency": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny")
+    parser.add_argument("--model-dir", default=str(ROOT_DIR / "models"))
+    parser.add_argument("--precision", default="fp32", choices=("fp32", "int8"))
+    parser.add_argument("--layouts", default=default_layouts(), help="Comma-separated layouts to compare")
+    parser.add_argument("--requests", type=int, default=32, help="Chunks transcribed per layout")
+    parser.add_argument("--chunk-duration", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, help="Client threads submitting requests")
+    parser.add_argument("--decoding-profile", default="realtime-fast")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    layouts = [layout.strip() for layout in args.layouts.split(",") if layout.strip()]
+    if args.concurrency is None:
+        replica_counts = [1 if layout == "default" else int(layout.lower().split("x")[0]) for layout in layouts]
+        args.concurrency = 2 * max(replica_counts)
+
+    results = {"model": args.model, "precision": args.precision, "concurrency": args.concurrency}
+    for layout in layouts:
+        print(f"Running layout {layout}...")
+        args.layout = layout
+        results[layout] = run_isolated(bench_layout, args)
+
+    print(f"{'layout':10s} {'throughput':>11s} {'p50 s':>8s} {'p90 s':>8s} {'RSS MB':>8s}")
+    for layout in layouts:
+        r = results[layout]
+        if "error" in r:
+            print(f"{layout:10s} error: {r['error']}")
+            continue
+        print(f"{layout:10s} {r['throughput']:10.2f}x {r['latency']['p50']:8.2f} {r['latency']['p90']:8.2f} "
+              f"{r['peak_rss_mb']:8.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+# benchmarks/common.py
+import json
+import multiprocessing
+import resource
+import sys
+import time
+import wave
+from pathlib import Path
+from queue import Empty
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# Metrics where a larger value is an improvement; everything else is "lower is better"
+HIGHER_IS_BETTER = {"throughput", "samples_per_second", "streams"}
+
+# Rough vowel formants (Hz) used to shape the synthetic voice
+VOWEL_FORMANTS = [
+    (730, 1090, 2440),  # a
+    (270, 2290, 3010),  # i
+    (300, 870, 2240),   # u
+    (530, 1840, 2480),  # e
+    (570, 840, 2410),   # o
+]
+
+def add_import_paths() -> None:
+    """Make backend (services, api) and src (Streamlit modules) importable"""
+    for path in (ROOT_DIR / "backend", ROOT_DIR / "src"):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+def synthetic_speech(duration: float, sample_rate: int = 16000, seed: int = 0) -> np.ndarray:
+    """Generate deterministic speech-like int16 audio
+
+    Syllables of 120-260 ms carry a gliding fundamental with harmonics shaped by
+    vowel formants, grouped into words separated by short pauses.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    audio = np.zeros(total, dtype=np.float64)
+    position = 0
+
+    while position < total:
+        # One word: 1-4 syllables followed by a pause
+        for _ in range(rng.integers(1, 5)):
+            length = int(rng.uniform(0.12, 0.26) * sample_rate)
+            t = np.arange(length) / sample_rate
+            f0 = rng.uniform(100, 200) * (1 + 0.1 * np.sin(np.pi * t / t[-1]))
+            phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+            formants = VOWEL_FORMANTS[rng.integers(len(VOWEL_FORMANTS))]
+
+            syllable = np.zeros(length)
+            for harmonic in range(1, 30):
+                freq = f0.mean() * harmonic
+                if freq >= sample_rate / 2:
+                    break
+                gain = sum(np.exp(-((freq - f) / 120.0) ** 2) for f in formants) + 0.02
+                syllable += gain / harmonic * np.sin(harmonic * phase)
+
+            envelope = np.sin(np.pi * np.arange(length) / length) ** 0.5
+            end = min(position + length, total)
+            audio[position:end] += (syllable * envelope)[:end - position]
+            position = end
+        position += int(rng.uniform(0.08, 0.4) * sample_rate)
+
+    audio += 0.003 * rng.standard_normal(total)
+    audio *= 0.3 / max(np.abs(audio).max(), 1e-9)
+    return (audio * 32767).astype(np.int16)
+
+def write_wav(path: Path, audio: np.ndarray, sample_rate: int) -> Path:
+    """Write mono int16 audio to a WAV file"""
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(audio.tobytes())
+    return path
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Summarise a list of latencies (seconds)"""
+    if not values:
+        return {}
+    data = np.asarray(values)
+    return {
+        "mean": float(data.mean()),
+        "p50": float(np.percentile(data, 50)),
+        "p90": float(np.percentile(data, 90)),
+        "p99": float(np.percentile(data, 99)),
+        "max": float(data.max()),
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def edit_distance(reference: List[str], hypothesis: List[str]) -> int:
+    """Levenshtein distance between two token sequences"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i]
+        for j, hyp in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp)))
+        previous = current
+    return previous[-1]
+
+def word_error_rate(reference: str, hypothesis: str, by_char: bool = False) -> float:
+    """Word error rate, or character error rate for languages written without spaces (ja)"""
+    if by_char:
+        ref, hyp = list("".join(reference.split())), list("".join(hypothesis.split()))
+    else:
+        ref, hyp = reference.split(), hypothesis.split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    return edit_distance(ref, hyp) / len(ref)
+
+def _run_target(target, args, queue):
+    try:
+        queue.put(target(args))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+def run_isolated(target: Callable, args) -> dict:
+    """Run target(args) in a fresh interpreter and return its results"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_target, args=(target, args, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1.0)
+            break
+        except Empty:
+            if not process.is_alive():
+                result = {"error": f"benchmark process exited with code {process.exitcode}"}
+                break
+    process.join()
+    return result
+
+class Timer:
+    """Context manager that records elapsed wall time"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested result dicts into dotted metric names"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+def load_baseline(path: Path = BASELINE_PATH) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(results: Dict, path: Path = BASELINE_PATH) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def find_errors(results: Dict, prefix: str = "") -> List[str]:
+    """Dotted names and messages of every "error" entry, e.g. a path whose process crashed"""
+    errors = []
+    for key, value in results.items():
+        if key == "error":
+            errors.append(f"{prefix.rstrip('.') or 'results'}: {value}")
+        elif isinstance(value, dict):
+            errors += find_errors(value, f"{prefix}{key}.")
+    return errors
+
+def compare_to_baseline(results: Dict, baseline: Dict, threshold: float = 0.10) -> List[str]:
+    """Print metric deltas against the baseline and return the names that regressed
+
+    Baseline metrics of the benchmarked paths that the current run did not
+    produce count as regressions too.
+    """
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = []
+    for name in sorted(set(previous) - set(current)):
+        if name.split(".")[0] in results:
+            print(f"{name:60s} {previous[name]:12.4f} -> {'missing':>12s}  REGRESSION")
+            regressions.append(name)
+    for name in sorted(current):
+        if name not in previous or previous[name] == 0:
+            continue
+        change = (current[name] - previous[name]) / abs(previous[name])
+        higher_is_better = name.split(".")[-1] in HIGHER_IS_BETTER
+        regressed = change < -threshold if higher_is_better else change > threshold
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{name:60s} {previous[name]:12.4f} -> {current[name]:12.4f} ({change:+.1%}){marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
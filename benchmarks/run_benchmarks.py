@@ -0,0 +1,232 @@
+# benchmarks/run_benchmarks.py
+"""End-to-end CPU benchmarks for the transcription pipeline
+
+Usage:
+    python benchmarks/run_benchmarks.py --model tiny
+    python benchmarks/run_benchmarks.py --model base --paths file,websocket --save-baseline
+
+Each path runs in a fresh process so peak RSS is attributable to it.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import (
+    ROOT_DIR, BASELINE_PATH, Timer, add_import_paths, compare_to_baseline, find_errors, load_baseline,
+    peak_rss_mb, percentiles, run_isolated, save_baseline, synthetic_speech, write_wav
+)
+
+PATHS = ("file", "data", "processor", "websocket")
+
+def bench_file(args) -> dict:
+    """TranscriptionService.transcribe_file on a synthetic 44.1 kHz WAV"""
+    add_import_paths()
+    from services.transcription_service import TranscriptionService
+
+    with Timer() as load:
+        service = TranscriptionService(model_name=args.model, model_dir=Path(args.model_dir), device="cpu")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_wav(Path(tmp) / "speech.wav", synthetic_speech(args.file_duration, 44100), 44100)
+        service.transcribe_file(path)  # warm-up
+
+        latencies = []
+        for _ in range(args.repeats):
+            with Timer() as timer:
+                service.transcribe_file(path)
+            latencies.append(timer.elapsed)
+
+    latency = percentiles(latencies)
+    return {
+        "model_load_seconds": load.elapsed,
+        "audio_seconds": args.file_duration,
+        "latency": latency,
+        "rtf": latency["mean"] / args.file_duration,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_data(args) -> dict:
+    """TranscriptionService.transcribe_audio_data on realtime-sized int16 chunks"""
+    add_import_paths()
+    from services.transcription_service import TranscriptionService
+
+    service = TranscriptionService(model_name=args.model, model_dir=Path(args.model_dir), device="cpu")
+    chunks = [synthetic_speech(args.chunk_duration, 16000, seed=i) for i in range(args.repeats + 1)]
+    service.transcribe_audio_data(chunks[0])  # warm-up
+
+    latencies = []
+    for chunk in chunks[1:]:
+        with Timer() as timer:
+            service.transcribe_audio_data(chunk)
+        latencies.append(timer.elapsed)
+
+    latency = percentiles(latencies)
+    return {
+        "audio_seconds": args.chunk_duration,
+        "latency": latency,
+        "rtf": latency["mean"] / args.chunk_duration,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_processor(args) -> dict:
+    """BufferedAudioProcessor.audio_callback ingestion cost, without a model"""
+    add_import_paths()
+    from audio_processor import BufferedAudioProcessor
+
+    sample_rate = 44100
+    processor = BufferedAudioProcessor(model=None, sample_rate=sample_rate, max_queue_size=1_000_000)
+    processor.min_process_interval = 0.0
+
+    audio = synthetic_speech(args.ingest_duration, sample_rate)
+    block = int(sample_rate * 0.1)  # same 100 ms blocks as the live input stream
+    blocks = [audio[i:i + block].reshape(-1, 1) for i in range(0, len(audio), block)]
+
+    latencies = []
+    for indata in blocks:
+        with Timer() as timer:
+            processor.audio_callback(indata, len(indata), None, None)
+        latencies.append(timer.elapsed)
+
+    total = sum(latencies)
+    return {
+        "audio_seconds": args.ingest_duration,
+        "callback_latency": percentiles(latencies),
+        "ns_per_sample": total / len(audio) * 1e9,
+        "samples_per_second": len(audio) / total,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def bench_websocket(args) -> dict:
+    """/ws/audio end to end through the FastAPI test client"""
+    add_import_paths()
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from services import remote_service
+    from services.transcription_service import TranscriptionService
+
+    # api.websocket creates its service at import time ("base", default device);
+    # hand it the benchmarked model on CPU instead, like the other paths
+    service = TranscriptionService(model_name=args.model, model_dir=Path(args.model_dir), device="cpu")
+    remote_service.create_transcription_service = lambda model_name="base", **kwargs: service
+    from api.websocket import router
+
+    app = FastAPI()
+    app.include_router(router)
+
+    sample_rate = 16000
+    frame = int(sample_rate * 0.1)
+    audio = synthetic_speech(args.stream_duration, sample_rate)
+    send_times = {}
+    results = []
+
+    with TestClient(app) as client, client.websocket_connect("/ws/audio") as ws:
+        def receive():
+            try:
+                while True:
+                    message = ws.receive_json()
+                    results.append((time.perf_counter(), message))
+            except Exception:
+                pass
+
+        receiver = threading.Thread(target=receive, daemon=True)
+        receiver.start()
+
+        start = time.perf_counter()
+        for offset in range(0, len(audio), frame):
+            if args.pace > 0:
+                # Send at `pace` times real time
+                due = start + offset / sample_rate / args.pace
+                time.sleep(max(due - time.perf_counter(), 0))
+            ws.send_bytes(audio[offset:offset + frame].tobytes())
+            send_times[min(offset + frame, len(audio))] = time.perf_counter()
+
+        # Wait for the pipeline to drain: stop after a quiet period
+        last_count, last_change = -1, time.perf_counter()
+        while time.perf_counter() - last_change < args.idle_timeout:
+            if len(results) != last_count:
+                last_count, last_change = len(results), time.perf_counter()
+            time.sleep(0.05)
+        wall = (results[-1][0] if results else time.perf_counter()) - start
+
+    latencies = []
+    for received, message in results:
+        sent = send_times.get(round(message.get("audio_offset", 0) * sample_rate))
+        if sent is not None:
+            latencies.append(received - sent)
+
+    return {
+        "audio_seconds": args.stream_duration,
+        "messages": len(results),
+        "latency": percentiles(latencies),
+        "rtf": wall / args.stream_duration,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+BENCHMARKS = {
+    "file": bench_file,
+    "data": bench_data,
+    "processor": bench_processor,
+    "websocket": bench_websocket,
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="tiny", help="Whisper model name (tiny or base on CPU)")
+    parser.add_argument("--model-dir", default=str(ROOT_DIR / "models"))
+    parser.add_argument("--paths", default=",".join(PATHS), help=f"Comma-separated subset of {PATHS}")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--file-duration", type=float, default=30.0)
+    parser.add_argument("--chunk-duration", type=float, default=2.0)
+    parser.add_argument("--ingest-duration", type=float, default=600.0)
+    parser.add_argument("--stream-duration", type=float, default=20.0)
+    parser.add_argument("--pace", type=float, default=1.0, help="Websocket send speed (x real time, 0 = unthrottled)")
+    parser.add_argument("--idle-timeout", type=float, default=5.0)
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = {"model": args.model}
+    for name in args.paths.split(","):
+        print(f"Running {name} benchmark...")
+        results[name] = run_isolated(BENCHMARKS[name], args)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    errors = find_errors(results)
+    for error in errors:
+        print(f"Error in {error}")
+    baseline_path = Path(args.baseline)
+    if errors:
+        # A failed path has no metrics, so it would silently pass the comparison
+        print("Benchmarks failed; " + ("baseline not saved" if args.save_baseline else "not comparing to the baseline"))
+        return 1
+    if args.save_baseline:
+        save_baseline(results, baseline_path)
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print("No baseline found; run with --save-baseline to create one")
+        return 0
+    if baseline.get("model") != args.model:
+        print(f"Baseline was recorded with model {baseline.get('model')}; skipping comparison")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+# examples/websocket_load_test.py
+"""Replay WAV files over concurrent /ws/audio connections and report latency
+
+Usage:
+    python examples/websocket_load_test.py --streams 8 --pace 1.0 recording1.wav recording2.wav
+    python examples/websocket_load_test.py --streams 32 --pace 2.0 --status-url http://localhost:8000/status \
+        --report load_report.json speech.wav
+    # all streams over one /ws/multiplex connection
+    python examples/websocket_load_test.py --streams 200 --multiplex speech.wav
+
+Latency is measured from sending the last byte of a server chunk to receiving
+the text for it, using the audio_offset the server attaches to each result.
+"""
+import argparse
+import asyncio
+import json
+import struct
+import time
+import urllib.request
+import wave
+import websockets
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+def load_wav(path):
+    """Read a WAV file as 16 kHz mono int16, the format /ws/audio expects"""
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+
+    audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        # Linear interpolation is enough to generate load
+        positions = np.arange(0, len(audio), rate / SAMPLE_RATE)
+        audio = np.interp(positions, np.arange(len(audio)), audio)
+    return audio.astype(np.int16)
+
+def fetch_status(url):
+    if not url:
+        return None
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.load(response)
+    except Exception as e:
+        print(f"Error fetching status: {e}")
+        return None
+
+def summarize(values):
+    if not values:
+        return {}
+    data = np.asarray(values)
+    return {
+        "count": len(values),
+        "mean": float(data.mean()),
+        "p50": float(np.percentile(data, 50)),
+        "p90": float(np.percentile(data, 90)),
+        "p99": float(np.percentile(data, 99)),
+        "max": float(data.max()),
+    }
+
+async def replay(index, audio, args, send, results):
+    """Send one file through send() and collect latencies of the results put on the results queue"""
+    frame = int(SAMPLE_RATE * args.frame_ms / 1000)
+    send_times = {}
+    latencies = []
+    messages = 0
+    last_message = time.perf_counter()
+
+    async def receive():
+        nonlocal messages, last_message
+        while True:
+            result = await results.get()
+            received = time.perf_counter()
+            messages += 1
+            last_message = received
+            sent = send_times.get(round(result.get("audio_offset", -1) * SAMPLE_RATE))
+            if sent is not None:
+                latencies.append(received - sent)
+
+    receiver = asyncio.create_task(receive())
+    start = time.perf_counter()
+    send_lag = 0.0
+    for offset in range(0, len(audio), frame):
+        if args.pace > 0:
+            due = start + offset / SAMPLE_RATE / args.pace
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                send_lag = max(send_lag, -delay)
+        await send(audio[offset:offset + frame].tobytes())
+        send_times[min(offset + frame, len(audio))] = time.perf_counter()
+    send_duration = time.perf_counter() - start
+
+    # Drain: wait until results stop arriving
+    last_message = max(last_message, time.perf_counter())
+    while time.perf_counter() - last_message < args.drain_timeout:
+        await asyncio.sleep(0.1)
+    receiver.cancel()
+
+    chunk_samples = int(SAMPLE_RATE * args.chunk_duration)
+    return {
+        "stream": index,
+        "audio_seconds": len(audio) / SAMPLE_RATE,
+        "send_seconds": send_duration,
+        "max_send_lag": send_lag,
+        "expected_chunks": len(audio) // chunk_samples,
+        "messages": messages,
+        "latencies": latencies,
+    }
+
+async def run_stream(index, uri, audio, args):
+    """Stream one file over its own connection"""
+    async with websockets.connect(uri, max_size=None) as websocket:
+        results = asyncio.Queue()
+
+        async def receive():
+            async for message in websocket:
+                results.put_nowait(json.loads(message))
+
+        receiver = asyncio.create_task(receive())
+        try:
+            return await replay(index, audio, args, websocket.send, results)
+        finally:
+            receiver.cancel()
+
+async def run_multiplexed(uri, files, args):
+    """Stream every file over one /ws/multiplex connection, one stream id each"""
+    async with websockets.connect(uri, max_size=None) as websocket:
+        results = {index: asyncio.Queue() for index in range(args.streams)}
+        opened = {index: asyncio.Event() for index in range(args.streams)}
+
+        async def receive():
+            async for message in websocket:
+                result = json.loads(message)
+                index = result.get("stream_id")
+                if result.get("type") == "error":
+                    print(f"Stream {index}: {result['error']}")
+                elif result.get("type") == "opened":
+                    opened[index].set()
+                elif index in results and "audio_offset" in result:
+                    results[index].put_nowait(result)
+
+        async def run(index):
+            await websocket.send(json.dumps({"type": "open", "stream_id": index}))
+            await opened[index].wait()
+            header = struct.pack("!I", index)
+
+            async def send(data):
+                await websocket.send(header + data)
+
+            try:
+                return await replay(index, files[index % len(files)], args, send, results[index])
+            finally:
+                await websocket.send(json.dumps({"type": "close", "stream_id": index}))
+
+        receiver = asyncio.create_task(receive())
+        try:
+            return await asyncio.gather(*[run(i) for i in range(args.streams)], return_exceptions=True)
+        finally:
+            receiver.cancel()
+
+async def run_load(args):
+    files = [load_wav(path) for path in args.files]
+    before = fetch_status(args.status_url)
+
+    started = time.perf_counter()
+    if args.multiplex:
+        streams = await run_multiplexed(args.uri.replace("/ws/audio", "/ws/multiplex"), files, args)
+    else:
+        streams = await asyncio.gather(*[
+            run_stream(i, args.uri, files[i % len(files)], args)
+            for i in range(args.streams)
+        ], return_exceptions=True)
+    wall = time.perf_counter() - started
+    after = fetch_status(args.status_url)
+
+    failures = [str(stream) for stream in streams if isinstance(stream, Exception)]
+    streams = [stream for stream in streams if not isinstance(stream, Exception)]
+    all_latencies = [latency for stream in streams for latency in stream["latencies"]]
+    audio_seconds = sum(stream["audio_seconds"] for stream in streams)
+    expected = sum(stream["expected_chunks"] for stream in streams)
+    messages = sum(stream["messages"] for stream in streams)
+
+    report = {
+        "config": {
+            "uri": args.uri,
+            "streams": args.streams,
+            "multiplex": args.multiplex,
+            "pace": args.pace,
+            "frame_ms": args.frame_ms,
+            "files": args.files,
+        },
+        "wall_seconds": wall,
+        "audio_seconds": audio_seconds,
+        "throughput": audio_seconds / wall if wall > 0 else 0.0,
+        "messages": messages,
+        "messages_per_second": messages / wall if wall > 0 else 0.0,
+        # Chunks without a result were either dropped or contained no speech
+        "chunks_without_result": max(expected - messages, 0),
+        "failed_streams": failures,
+        "latency": summarize(all_latencies),
+        "streams": [
+            {**{k: v for k, v in stream.items() if k != "latencies"}, "latency": summarize(stream["latencies"])}
+            for stream in streams
+        ],
+    }
+    if before and after:
+        report["server_dropped_chunks"] = after["dropped_chunks"] - before.get("dropped_chunks", 0)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="WAV files to replay (cycled across streams)")
+    parser.add_argument("--uri", default="ws://localhost:8000/ws/audio")
+    parser.add_argument("--streams", type=int, default=4, help="Number of concurrent streams")
+    parser.add_argument("--multiplex", action="store_true", help="Send all streams over one /ws/multiplex connection")
+    parser.add_argument("--pace", type=float, default=1.0, help="Playback speed (x real time, 0 = unthrottled)")
+    parser.add_argument("--frame-ms", type=int, default=100, help="Audio per websocket message")
+    parser.add_argument("--chunk-duration", type=float, default=2.0, help="Server chunk length in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="Seconds without results before closing")
+    parser.add_argument("--status-url", help="Server /status URL for dropped chunk counts")
+    parser.add_argument("--report", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    latency = report["latency"]
+    print(f"Streams: {args.streams}  audio: {report['audio_seconds']:.1f}s  wall: {report['wall_seconds']:.1f}s  "
+          f"throughput: {report['throughput']:.2f}x real time")
+    if latency:
+        print(f"Latency p50 {latency['p50']:.3f}s  p90 {latency['p90']:.3f}s  p99 {latency['p99']:.3f}s")
+    print(f"Messages: {report['messages']}  chunks without result: {report['chunks_without_result']}  "
+          f"server dropped: {report.get('server_dropped_chunks', 'n/a')}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 // frontend/src/components/FileUploader.tsx
 import React, { useCallback, useState, useRef } from 'react';
 import { Upload, X, FileAudio, Loader2 } from 'lucide-react';
-import { TranscriptionAPI, TranscriptionResult } from '../services/api';
+import { TranscriptionAPI, TranscriptionResult, UploadStatus } from '../services/api';
 import { Alert, AlertDescription } from '@/components/ui/alert';
 
 interface FileUploaderProps {
@@ -15,12 +15,13 @@ const FileUploader: React.FC<FileUploaderProps> = ({
   onUploadComplete,
   onError,
   accept = '.wav,.mp3,.m4a',
-  maxSize = 50 * 1024 * 1024, // 50MB default
+  maxSize = 1024 * 1024 * 1024, // 1GB default; uploads are sent in resumable parts
 }) => {
   const [isDragging, setIsDragging] = useState(false);
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [isUploading, setIsUploading] = useState(false);
+  const [progress, setProgress] = useState<UploadStatus | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
 
   // Handle drag events
@@ -49,8 +50,9 @@ const FileUploader: React.FC<FileUploaderProps> = ({
   const handleUpload = useCallback(async (file: File) => {
     setIsUploading(true);
     setError(null);
+    setProgress(null);
     try {
-      const result = await TranscriptionAPI.transcribeFile(file);
+      const result = await TranscriptionAPI.uploadAndTranscribe(file, setProgress);
       onUploadComplete(result);
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : '音声ファイルのアップロードに失敗しました。';
@@ -58,6 +60,7 @@ const FileUploader: React.FC<FileUploaderProps> = ({
       if (onError && err instanceof Error) onError(err);
     } finally {
       setIsUploading(false);
+      setProgress(null);
     }
   }, [onUploadComplete, onError]);
 
@@ -138,7 +141,16 @@ const FileUploader: React.FC<FileUploaderProps> = ({
           // Uploading state
           <div className="flex flex-col items-center justify-center">
             <Loader2 className="w-12 h-12 text-blue-500 animate-spin" />
-            <p className="mt-2 text-sm text-gray-600">アップロード中...</p>
+            <p className="mt-2 text-sm text-gray-600">
+              {progress && progress.offset < progress.size
+                ? `アップロード中... ${Math.floor((progress.offset / progress.size) * 100)}%`
+                : '文字起こし中...'}
+            </p>
+            {progress && progress.windows_queued > 0 && (
+              <p className="mt-1 text-xs text-gray-500">
+                文字起こし済み: {progress.windows_done} / {progress.windows_queued} 区間
+              </p>
+            )}
           </div>
         ) : selectedFile ? (
           // Selected file state
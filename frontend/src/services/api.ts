@@ -29,6 +29,21 @@ export interface TranscriptionResult {
   }>;
 }
 
+export interface UploadStatus {
+  upload_id: string;
+  filename: string;
+  size: number;
+  offset: number;
+  status: 'uploading' | 'transcribing' | 'completed' | 'failed';
+  error: string | null;
+  windows_queued: number;
+  windows_done: number;
+  transcribed_seconds: number;
+  text?: string;
+  language?: string;
+  segments?: TranscriptionResult['segments'];
+}
+
 export interface ModelInfo {
   model_name: string;
   language: string;
@@ -63,6 +78,19 @@ export const AudioAPI = {
   }
 };
 
+// Resumable uploads
+const UPLOAD_PART_SIZE = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const sha256Hex = async (data: ArrayBuffer): Promise<string | null> => {
+  // crypto.subtle is only available in secure contexts (https or localhost)
+  if (!window.crypto?.subtle) return null;
+  const digest = await window.crypto.subtle.digest('SHA-256', data);
+  return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+};
+
 // Transcription API
 export const TranscriptionAPI = {
   // Upload and transcribe a new audio file
@@ -81,6 +109,62 @@ export const TranscriptionAPI = {
     return response.data;
   },
 
+  // Upload in resumable parts; the server transcribes while the upload is still running.
+  // Pass uploadId to resume an earlier upload of the same file.
+  uploadAndTranscribe: async (
+    file: File,
+    onProgress?: (status: UploadStatus) => void,
+    language?: string,
+    uploadId?: string
+  ): Promise<TranscriptionResult> => {
+    let status: UploadStatus = uploadId
+      ? (await api.get(`/uploads/${uploadId}`)).data
+      : (await api.post('/uploads', null, { params: { filename: file.name, size: file.size, language } })).data;
+    onProgress?.(status);
+
+    let offset = status.offset;
+    let retries = 0;
+    while (offset < file.size) {
+      const part = await file.slice(offset, offset + UPLOAD_PART_SIZE).arrayBuffer();
+      const checksum = await sha256Hex(part);
+      try {
+        const response = await api.patch(`/uploads/${status.upload_id}`, part, {
+          headers: {
+            'Content-Type': 'application/offset+octet-stream',
+            'Upload-Offset': String(offset),
+            ...(checksum ? { 'Upload-Checksum': `sha256 ${checksum}` } : {}),
+          },
+        });
+        offset = response.data.offset;
+        retries = 0;
+        status = { ...status, offset, status: offset < file.size ? 'uploading' : 'transcribing' };
+        onProgress?.(status);
+      } catch (err) {
+        if (++retries > UPLOAD_MAX_RETRIES) throw err;
+        // Dropped connection or offset conflict: continue from where the server got to
+        await sleep(1000 * retries);
+        try {
+          offset = (await api.get(`/uploads/${status.upload_id}`)).data.offset;
+        } catch {
+          // Server still unreachable; retry the same part
+        }
+      }
+    }
+
+    // Wait for the windows still being transcribed
+    for (;;) {
+      status = (await api.get(`/uploads/${status.upload_id}`)).data;
+      onProgress?.(status);
+      if (status.status === 'completed') {
+        return { text: status.text ?? '', language: status.language ?? '', segments: status.segments ?? [] };
+      }
+      if (status.status === 'failed') {
+        throw new Error(status.error ?? 'Transcription failed');
+      }
+      await sleep(1000);
+    }
+  },
+
   // Transcribe an existing recording
   transcribeRecording: async (recordingId: string): Promise<TranscriptionResult> => {
     const response = await api.post(`/transcribe/${recordingId}`);
@@ -1,7 +1,17 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from pathlib import Path
+from services.prefork import prefork_workers, prepare_master
+
+# WHISPER_PREFORK=N: load the models here once, before forking N workers
+prepare_master()
+
 from api.audio import router as audio_router
+from api.metrics import router as metrics_router
+from api.transcription import router as transcription_router
+from api.websocket import router as websocket_router
+from services.tracing import configure_trace_log, start_trace
 
 app = FastAPI(title="Audio Recording API")
 
@@ -14,9 +24,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Structured per-request traces
+configure_trace_log(Path("logs/traces.jsonl"))
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Attach a trace to each request; a valid X-Trace-Id (16-32 hex digits) is honoured and echoed back.
+
+    X-Profile: cprofile|torch captures a profile of the request's inference
+    when the server runs with WHISPER_ENABLE_PROFILING=1.
+    """
+    with start_trace(
+        f"{request.method} {request.url.path}",
+        trace_id=request.headers.get("x-trace-id"),
+        profile=request.headers.get("x-profile")
+    ) as trace:
+        response = await call_next(request)
+        trace.attributes["status_code"] = response.status_code
+        response.headers["X-Trace-Id"] = trace.trace_id
+        return response
+
 # Include routers
 app.include_router(audio_router, prefix="/audio", tags=["audio"])
+app.include_router(metrics_router, tags=["metrics"])
+app.include_router(transcription_router, tags=["transcription"])
+app.include_router(websocket_router, tags=["websocket"])
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if prefork_workers():
+        from services import prefork
+        prefork.serve(app, host="0.0.0.0", port=8000)
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -2,22 +2,66 @@
 import streamlit as st
 import os
 from datetime import datetime
-from config import AUDIO_DIR, MODEL_DIR, MODEL_NAME, SAMPLE_RATE, CHANNELS
+from config import (AUDIO_DIR, MODEL_DIR, MODEL_NAME, SAMPLE_RATE, CHANNELS, AUDIO_FORMAT,
+                    AUDIO_EXTENSIONS, AUDIO_SERVER_URL, PLAYBACK_FORMAT, METRICS_PORT, TRANSCRIPT_DB)
 from audio_recorder import AudioRecorder, save_audio, get_audio_duration
-from transcription import load_whisper_model, transcribe_audio, save_transcription_to_file
+from transcription import load_whisper_model, save_transcription_to_file
+from transcription_worker import TranscriptionWorker
 import time
-import threading
+import queue
+import uuid
+from prometheus_client import start_http_server
 from audio_processor import BufferedAudioProcessor
+from services.replicas import share_model
+from services.transcript_index import get_transcript_index
 
 # Directory initialization
 MODEL_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True, parents=True)
 
+@st.cache_resource(show_spinner=False)
+def get_whisper_model():
+    """Load the Whisper model once per process"""
+    return load_whisper_model()
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server():
+    """Serve Prometheus metrics once per process when METRICS_PORT is set"""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    return METRICS_PORT
+
+@st.cache_resource(show_spinner=False)
+def get_transcription_worker():
+    """Background worker shared by all sessions"""
+    return TranscriptionWorker(get_whisper_model())
+
 def initialize_whisper():
     """Initialize Whisper model"""
     if 'whisper_model' not in st.session_state:
         with st.spinner(f'Loading Whisper "{MODEL_NAME}" model...'):
-            st.session_state.whisper_model = load_whisper_model()
+            st.session_state.whisper_model = get_whisper_model()
+
+PLAYBACK_MEDIA_TYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "wav": "audio/wav", "flac": "audio/flac"}
+
+@st.cache_data(max_entries=16)
+def load_audio_bytes(file_path, modified_time):
+    """Read a recording once per modification instead of on every rerun"""
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def render_audio_player(file_path):
+    """Render an audio player, streaming from the download server when configured"""
+    if AUDIO_SERVER_URL:
+        url = f"{AUDIO_SERVER_URL}/{file_path.name}"
+        playback_format = file_path.suffix.lstrip('.')
+        if PLAYBACK_FORMAT:
+            url += f"?format={PLAYBACK_FORMAT}"
+            playback_format = PLAYBACK_FORMAT
+        st.audio(url, format=PLAYBACK_MEDIA_TYPES[playback_format])
+    else:
+        st.audio(load_audio_bytes(str(file_path), file_path.stat().st_mtime),
+                 format=PLAYBACK_MEDIA_TYPES[file_path.suffix.lstrip('.')])
 
 def initialize_session_state():
     """Initialize session state with improved real-time processing"""
@@ -25,7 +69,7 @@ def initialize_session_state():
         st.session_state.audio_recorder = AudioRecorder()
     if 'buffered_processor' not in st.session_state:
         st.session_state.buffered_processor = BufferedAudioProcessor(
-            model=st.session_state.whisper_model,
+            model=share_model(st.session_state.whisper_model),
             sample_rate=SAMPLE_RATE,
             channels=CHANNELS,
             max_queue_size=10  # バッファサイズの制限を追加
@@ -34,10 +78,11 @@ def initialize_session_state():
         st.session_state.realtime_text = []
     if 'is_transcribing' not in st.session_state:
         st.session_state.is_transcribing = False
-    if 'transcription_placeholder' not in st.session_state:
-        st.session_state.transcription_placeholder = None
-    if 'update_thread' not in st.session_state:
-        st.session_state.update_thread = None
+    if 'text_events' not in st.session_state:
+        st.session_state.text_events = None
+    if 'session_id' not in st.session_state:
+        # Tells this session's background transcriptions apart from other sessions'
+        st.session_state.session_id = uuid.uuid4().hex
 
 def clean_up_resources():
     """Clean up resources when stopping recording"""
@@ -45,33 +90,34 @@ def clean_up_resources():
         st.session_state.is_transcribing = False
         if st.session_state.buffered_processor:
             st.session_state.buffered_processor.stop()
-        if st.session_state.update_thread and st.session_state.update_thread.is_alive():
-            st.session_state.update_thread.join(timeout=2.0)
-        st.session_state.update_thread = None
-
-def update_transcription():
-    """Update transcription text in the UI"""
-    try:
-        while st.session_state.is_transcribing:
-            new_text = st.session_state.buffered_processor.get_text()
-            if new_text:
-                st.session_state.realtime_text.append(new_text)
-                # 現在のテキストを更新
-                current_text = " ".join(st.session_state.realtime_text)
-                if st.session_state.transcription_placeholder is not None:
-                    st.session_state.transcription_placeholder.text_area(
-                        "Real-time Transcription",
-                        current_text,
-                        height=150,
-                        key=f"realtime_output_{time.time()}"  # ユニークなキーを生成
-                    )
-            time.sleep(0.1)
-    except Exception as e:
-        print(f"Error in update_transcription: {e}")
-        st.session_state.is_transcribing = False
+            if st.session_state.text_events is not None:
+                st.session_state.buffered_processor.unsubscribe(st.session_state.text_events)
+        st.session_state.text_events = None
+
+def stream_realtime_text(container, status, worker):
+    """Append transcription events to the live view as they are published
+
+    Runs until the next rerun (e.g. the stop button) interrupts the script;
+    each event renders only its own text instead of the whole transcript.
+    """
+    events = st.session_state.text_events
+    had_pending = worker.has_pending(st.session_state.session_id)
+    while st.session_state.is_transcribing:
+        try:
+            text = events.get(timeout=1.0)
+        except queue.Empty:
+            # Refresh the page when background file jobs change state
+            if worker.has_pending(st.session_state.session_id) != had_pending:
+                st.rerun()
+            # Writing an element lets Streamlit interrupt this loop on rerun
+            status.caption(f"Listening... {len(st.session_state.realtime_text)} segments")
+            continue
+        st.session_state.realtime_text.append(text)
+        container.text(text)
 
 def main():
     st.title("Voice Recorder & Transcription")
+    start_metrics_server()
 
     initialize_whisper()
     initialize_session_state()
@@ -91,12 +137,8 @@ def main():
                 clean_up_resources()  # 既存のリソースをクリーンアップ
                 st.session_state.realtime_text = []
                 st.session_state.is_transcribing = True
+                st.session_state.text_events = st.session_state.buffered_processor.subscribe()
                 st.session_state.buffered_processor.start()
-                st.session_state.update_thread = threading.Thread(
-                    target=update_transcription,
-                    daemon=True
-                )
-                st.session_state.update_thread.start()
                 st.rerun()
 
     with col3:
@@ -106,7 +148,7 @@ def main():
                     recorded_audio = st.session_state.audio_recorder.stop_recording()
                     if recorded_audio is not None:
                         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = AUDIO_DIR / f"audio_{timestamp}.wav"
+                        filename = AUDIO_DIR / f"audio_{timestamp}.{AUDIO_FORMAT}"
                         save_audio(recorded_audio, filename)
                         st.success(f"Recording saved: {filename}")
                 if st.session_state.is_transcribing:
@@ -125,29 +167,20 @@ def main():
     elif st.session_state.is_transcribing:
         st.warning("Real-time transcription in progress...")
 
-        # Create a placeholder for real-time updates
-        st.session_state.transcription_placeholder = st.empty()
-
-        # Display current transcription
-        current_text = " ".join(st.session_state.realtime_text)
-        st.session_state.transcription_placeholder.text_area(
-            "Real-time Transcription",
-            current_text,
-            height=150,
-            key="realtime_output"
-        )
+        # New text is appended to this container at the end of the script run
+        st.markdown("**Real-time Transcription**")
+        live_container = st.container()
+        live_status = st.empty()
+        if st.session_state.realtime_text:
+            live_container.text("\n".join(st.session_state.realtime_text))
 
     # Display recorded files
     st.subheader("Recorded Files")
-    audio_files = [f for f in os.listdir(AUDIO_DIR) if f.endswith('.wav')]
-
-    if 'transcription_states' not in st.session_state:
-        st.session_state.transcription_states = {}
+    worker = get_transcription_worker()
+    audio_files = [f for f in os.listdir(AUDIO_DIR) if f.endswith(AUDIO_EXTENSIONS)]
 
     if audio_files:
         for audio_file in sorted(audio_files, reverse=True):
-            if audio_file.startswith('temp_chunk_'):  # Skip temporary chunk files
-                continue
             file_path = AUDIO_DIR / audio_file
             txt_file_path = file_path.with_suffix(".txt")
             duration = get_audio_duration(file_path)
@@ -157,8 +190,7 @@ def main():
 
                 with col_audio:
                     st.markdown(f"##### {audio_file} ({duration}s)")
-                    with open(file_path, 'rb') as audio_file_open:
-                        st.audio(audio_file_open.read(), format='audio/wav')
+                    render_audio_player(file_path)
 
                 with col_controls:
                     st.markdown(" ")
@@ -167,10 +199,13 @@ def main():
                         if st.button("🗑️", key=f"delete_{audio_file}",
                                     help="Delete this recording"):
                             os.remove(file_path)
-                            if txt_file_path.exists():
-                                os.remove(txt_file_path)
-                            if audio_file in st.session_state.transcription_states:
-                                del st.session_state.transcription_states[audio_file]
+                            # Remove the transcript and any cached log-mel sidecar files
+                            for sidecar in (txt_file_path, file_path.with_suffix(".mel.npy"),
+                                            file_path.with_suffix(".mel.json")):
+                                if sidecar.exists():
+                                    os.remove(sidecar)
+                            get_transcript_index(TRANSCRIPT_DB).remove(file_path.stem)
+                            worker.forget(file_path)
                             st.rerun()
 
                     with col_trans:
@@ -179,20 +214,16 @@ def main():
 
                 with col_text:
                     if transcribe_button:
-                        st.session_state.transcription_states[audio_file] = "processing"
+                        worker.submit(file_path, st.session_state.session_id)
                         st.rerun()
 
-                    if audio_file in st.session_state.transcription_states and st.session_state.transcription_states[audio_file] == "processing":
-                        st.info("🔄 Transcribing...")
-                        transcription = transcribe_audio(file_path, st.session_state.whisper_model)
-                        if transcription:
-                            save_transcription_to_file(file_path, transcription)
-                            st.session_state.transcription_states[audio_file] = "completed"
-                            st.rerun()
-                        else:
-                            st.session_state.transcription_states[audio_file] = "error"
-                            st.error("❌ Transcription failed")
-                            st.rerun()
+                    job = worker.get_job(file_path)
+                    if job and job["status"] == "queued":
+                        st.info(f"⏳ Queued for transcription (position {job['position']})")
+                    elif job and job["status"] == "running":
+                        st.progress(job["progress"], text="🔄 Transcribing...")
+                    elif job and job["status"] == "error":
+                        st.error("❌ Transcription failed")
                     elif txt_file_path.exists():
                         with open(txt_file_path, 'r', encoding='utf-8') as f:
                             transcription = f.read()
@@ -206,5 +237,12 @@ def main():
     else:
         st.info("No recordings available yet")
 
+    if st.session_state.is_transcribing:
+        stream_realtime_text(live_container, live_status, worker)
+    elif worker.has_pending(st.session_state.session_id):
+        # Poll for finished background jobs without blocking other sessions
+        time.sleep(1.0)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
-# src/audio_processor.pyimport numpy as np
+# src/audio_processor.py
+import numpy as np
 import queue
 from pathlib import Path
 import sounddevice as sd
@@ -6,6 +7,9 @@ import threading
 import time
 from datetime import datetime
 import wave
+import uuid
+from transcription import transcribe_chunk
+from services.metrics import QUEUE_DEPTH, record_audio, remove_session
 
 class BufferedAudioProcessor:
     def __init__(self, model, sample_rate=44100, chunk_duration=2.0, channels=1, max_queue_size=10):
@@ -17,7 +21,9 @@ class BufferedAudioProcessor:
 
         # バッファサイズの制限を追加
         self.audio_buffer = queue.Queue(maxsize=max_queue_size)
-        self.text_buffer = queue.Queue()
+        # Each subscriber gets its own queue of newly transcribed text
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
         self.is_running = False
         self.current_audio_chunk = []
 
@@ -26,6 +32,7 @@ class BufferedAudioProcessor:
         self.min_process_interval = 0.5  # Minimum time between processing in seconds
 
         # 音声データの統計情報
+        self.session_id = uuid.uuid4().hex[:12]
         self.total_processed_samples = 0
         self.dropped_samples = 0
 
@@ -51,9 +58,12 @@ class BufferedAudioProcessor:
                     try:
                         self.audio_buffer.put_nowait(chunk_data)
                         self.total_processed_samples += len(chunk_data)
+                        record_audio(self.session_id, len(chunk_data) / self.sample_rate)
                     except queue.Full:
                         self.dropped_samples += len(chunk_data)
+                        record_audio(self.session_id, len(chunk_data) / self.sample_rate, dropped=True)
                         print(f"Warning: Buffer full, dropping audio chunk. Dropped samples: {self.dropped_samples}")
+                    QUEUE_DEPTH.labels(self.session_id).set(self.audio_buffer.qsize())
 
                     self.last_process_time = current_time
                 else:
@@ -75,20 +85,13 @@ class BufferedAudioProcessor:
                     audio_data = self.audio_buffer.get(timeout=0.5)
                 except queue.Empty:
                     continue
+                QUEUE_DEPTH.labels(self.session_id).set(self.audio_buffer.qsize())
 
-                # Convert to appropriate format for whisper
-                audio_float32 = audio_data.astype(np.float32) / 32768.0
+                # Convert to 16 kHz float32 and process with whisper
+                text = transcribe_chunk(audio_data, self.model, self.sample_rate)
 
-                # Process with whisper
-                result = self.model.transcribe(
-                    audio_float32,
-                    language='ja',
-                    fp16=False,
-                    initial_prompt="",
-                )
-
-                if result["text"].strip():
-                    self.text_buffer.put(result["text"])
+                if text and text.strip():
+                    self.publish(text)
 
             except Exception as e:
                 print(f"Error processing audio: {e}")
@@ -131,6 +134,8 @@ class BufferedAudioProcessor:
         if self.processing_thread and self.processing_thread.is_alive():
             self.processing_thread.join(timeout=2.0)  # タイムアウト付きの終了待機
 
+        remove_session(self.session_id)
+
         # 統計情報の表示
         total_samples = self.total_processed_samples + self.dropped_samples
         if total_samples > 0:
@@ -140,9 +145,22 @@ class BufferedAudioProcessor:
             print(f"Dropped samples: {self.dropped_samples}")
             print(f"Drop rate: {drop_rate:.2f}%")
 
-    def get_text(self):
-        """Get accumulated text from the buffer"""
-        text_pieces = []
-        while not self.text_buffer.empty():
-            text_pieces.append(self.text_buffer.get())
-        return " ".join(text_pieces) if text_pieces else ""
+    def subscribe(self):
+        """Register a queue that receives each new piece of transcribed text"""
+        events = queue.Queue()
+        with self.subscribers_lock:
+            self.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        """Stop delivering text to a queue returned by subscribe()"""
+        with self.subscribers_lock:
+            if events in self.subscribers:
+                self.subscribers.remove(events)
+
+    def publish(self, text):
+        """Push a text event to every subscriber"""
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            events.put(text)
@@ -1,12 +1,12 @@
 # src/audio_recorder.py
 import sounddevice as sd
+import soundfile as sf
 import numpy as np
 import wave
 import queue
-from datetime import datetime
 from pathlib import Path
-from config import SAMPLE_RATE, CHANNELS, AUDIO_DIR
-from transcription import transcribe_audio
+from config import SAMPLE_RATE, CHANNELS
+from transcription import transcribe_chunk
 
 class AudioRecorder:
     def __init__(self):
@@ -47,17 +47,21 @@ class AudioRecorder:
         return np.concatenate(self.audio_data) if self.audio_data else None
 
 def save_audio(audio_data, filename):
-    """Save recorded data as a WAV file"""
-    if isinstance(filename, Path):
-        filename = str(filename)
-    with wave.open(filename, 'wb') as wf:
+    """Save recorded data as a WAV or FLAC file, depending on the file suffix"""
+    filename = Path(filename)
+    if filename.suffix == ".flac":
+        sf.write(str(filename), audio_data, SAMPLE_RATE, format="FLAC", subtype="PCM_16")
+        return
+    with wave.open(str(filename), 'wb') as wf:
         wf.setnchannels(CHANNELS)
         wf.setsampwidth(2)  # 16-bit
         wf.setframerate(SAMPLE_RATE)
         wf.writeframes(audio_data.tobytes())
 
 def get_audio_duration(file_path):
-    """Get the duration of a WAV file"""
+    """Get the duration of a WAV or FLAC file"""
+    if Path(file_path).suffix == ".flac":
+        return round(sf.info(str(file_path)).duration, 1)
     with wave.open(str(file_path), 'rb') as wf:
         frames = wf.getnframes()
         rate = wf.getframerate()
@@ -105,16 +109,10 @@ class RealTimeTranscriber:
 
     def transcribe_chunk(self, audio_data):
         """Transcription of audio chunks"""
-        temp_filename = AUDIO_DIR / f"temp_chunk_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-        save_audio(audio_data, temp_filename)
-        try:
-            result = transcribe_audio(temp_filename, self.model)
-            if result:
-                self.full_text.append(result.strip())
-                return result
-        finally:
-            if temp_filename.exists():
-                temp_filename.unlink()
+        result = transcribe_chunk(audio_data, self.model)
+        if result and result.strip():
+            self.full_text.append(result.strip())
+            return result
         return None
 
     def get_full_text(self):
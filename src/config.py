@@ -1,14 +1,43 @@
 # src/config.py
 from pathlib import Path
+import sys
 
 # PROJECT DIRECTORY SETTINGS
 ROOT_DIR = Path(__file__).parent.parent
 MODEL_DIR = ROOT_DIR / "model"
 AUDIO_DIR = ROOT_DIR / "recorded_audio"
+# Audio loading, metrics, decoding profiles and the transcript index are shared with the API in backend/services
+BACKEND_DIR = ROOT_DIR / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.append(str(BACKEND_DIR))
 
 # MODEL SETTINGS
 MODEL_NAME = "turbo"
 
+# DECODING SETTINGS
+# Profiles from backend/services/decoding_profiles.py: "realtime-fast", "balanced" or "archive-accurate"
+REALTIME_DECODING_PROFILE = "realtime-fast"
+FILE_DECODING_PROFILE = "archive-accurate"
+# Step file transcriptions down to a cheaper profile when they wait too long in the queue
+AUTO_DEGRADE = True
+
 # RECORD SETTINGS
 SAMPLE_RATE = 44100
 CHANNELS = 1
+# Storage format for new recordings: "wav" or "flac" (lossless, roughly half the size)
+AUDIO_FORMAT = "wav"
+AUDIO_EXTENSIONS = (".wav", ".flac")
+# Full-text search index of saved transcripts (shared with the API's /search)
+TRANSCRIPT_DB = AUDIO_DIR / "transcripts.db"
+
+# PLAYBACK SETTINGS
+# Base URL of the FastAPI download endpoint (e.g. "http://localhost:8000/audio/download").
+# When set, the browser streams recordings from it with HTTP Range requests
+# instead of Streamlit reading every file into memory.
+AUDIO_SERVER_URL = None
+# Optional compressed playback format served by the download endpoint ("mp3" or "ogg")
+PLAYBACK_FORMAT = None
+
+# MONITORING SETTINGS
+# Port for the Prometheus metrics endpoint of the Streamlit app (None to disable)
+METRICS_PORT = None
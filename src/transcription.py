@@ -1,8 +1,14 @@
 # src/transcription.py
 import whisper
 import torch
+import time
+import numpy as np
 from pathlib import Path
-from config import MODEL_DIR, MODEL_NAME
+from config import MODEL_DIR, MODEL_NAME, SAMPLE_RATE, FILE_DECODING_PROFILE, REALTIME_DECODING_PROFILE, TRANSCRIPT_DB
+from services.audio_loader import load_audio, resample
+from services.decoding_profiles import transcribe_options
+from services.metrics import MODEL_LOAD_SECONDS, instrument_model, observe_stage
+from services.transcript_index import get_transcript_index
 
 def download_whisper_model():
     """Download and save the Whisper model to the specified directory"""
@@ -16,6 +22,7 @@ def download_whisper_model():
 
 def load_whisper_model():
     """Load the saved model"""
+    start = time.perf_counter()
     model_path = MODEL_DIR / "model.pt"
     if not model_path.exists():
         model_path = download_whisper_model()
@@ -23,19 +30,47 @@ def load_whisper_model():
     model = whisper.load_model(MODEL_NAME)
     state_dict = torch.load(str(model_path))
     model.load_state_dict(state_dict)
+    MODEL_LOAD_SECONDS.labels(MODEL_NAME).set(time.perf_counter() - start)
+    instrument_model(model)
     return model
 
-def transcribe_audio(file_path, whisper_model):
-    """Transcribe an audio file"""
+def transcribe_audio(file_path, whisper_model, decoding_profile=FILE_DECODING_PROFILE, return_result=False):
+    """Transcribe an audio file; return_result gives Whisper's full result (with segments) instead of the text"""
     try:
-        result = whisper_model.transcribe(str(file_path), language='ja', fp16=False)
+        # Decode PCM WAVs in-process; ffmpeg is only started for other formats
+        with observe_stage("decode"):
+            audio = load_audio(file_path)
+        with observe_stage("inference"):
+            result = whisper_model.transcribe(audio, language='ja', fp16=False, **transcribe_options(decoding_profile))
+        return result if return_result else result["text"]
+    except Exception as e:
+        print(f"Transcription error: {e}")
+        return None
+
+def transcribe_chunk(audio_data, whisper_model, sample_rate=SAMPLE_RATE, decoding_profile=REALTIME_DECODING_PROFILE):
+    """Transcribe an in-memory int16 audio chunk without writing it to disk"""
+    try:
+        with observe_stage("resample"):
+            audio = resample(
+                np.asarray(audio_data).reshape(-1),
+                sample_rate,
+                convert=lambda block: block.astype(np.float32) / 32768.0
+            )
+        with observe_stage("inference"):
+            result = whisper_model.transcribe(
+                audio, language='ja', fp16=False, initial_prompt="", **transcribe_options(decoding_profile)
+            )
         return result["text"]
     except Exception as e:
         print(f"Transcription error: {e}")
         return None
 
-def save_transcription_to_file(file_path, transcription):
-    """Save transcription results to a text file"""
+def save_transcription_to_file(file_path, transcription, segments=None):
+    """Save transcription results to a text file and add them to the search index"""
     txt_file_path = file_path.with_suffix(".txt")
     with open(txt_file_path, "w", encoding="utf-8") as f:
         f.write(transcription)
+    try:
+        get_transcript_index(TRANSCRIPT_DB).index_transcript(file_path.stem, file_path, transcription, segments, "ja")
+    except Exception as e:
+        print(f"Error indexing transcription: {e}")
@@ -0,0 +1,106 @@
+# src/transcription_worker.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from audio_recorder import get_audio_duration
+from config import AUTO_DEGRADE, FILE_DECODING_PROFILE
+from services.decoding_profiles import select_profile
+from services.replicas import share_model
+from transcription import transcribe_audio, save_transcription_to_file
+
+class TranscriptionWorker:
+    """Background queue for file transcriptions, shared by all Streamlit sessions"""
+
+    def __init__(self, model, max_workers=1, decoding_profile=FILE_DECODING_PROFILE):
+        # Private weight-sharing copy so decoding never races with realtime sessions
+        self.model = share_model(model)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcription")
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Running estimate of processing seconds per audio second, used for progress
+        self.realtime_factor = 0.5
+        self.decoding_profile = decoding_profile
+
+    def submit(self, file_path, session_id=None):
+        """Queue a file for transcription; returns False if it is already queued
+
+        session_id identifies the Streamlit session waiting for the result (see has_pending).
+        """
+        key = str(file_path)
+        with self.lock:
+            job = self.jobs.get(key)
+            if job and job["status"] in ("queued", "running"):
+                job["sessions"].add(session_id)
+                return False
+            self.jobs[key] = {
+                "status": "queued",
+                "submitted": time.time(),
+                "started": None,
+                "duration": get_audio_duration(file_path),
+                "sessions": {session_id},
+            }
+        self.executor.submit(self._run, key, Path(file_path))
+        return True
+
+    def _run(self, key, file_path):
+        with self.lock:
+            job = self.jobs[key]
+            job["status"] = "running"
+            job["started"] = time.time()
+            # Jobs that waited past the profile's queue SLO decode with a cheaper profile
+            queue_wait = job["started"] - job["submitted"]
+            profile = select_profile(self.decoding_profile, queue_wait) if AUTO_DEGRADE else self.decoding_profile
+            job["decoding_profile"] = profile
+
+        result = transcribe_audio(file_path, self.model, profile, return_result=True)
+        transcription = result["text"] if result else None
+        if transcription:
+            try:
+                save_transcription_to_file(file_path, transcription, result.get("segments"))
+            except Exception as e:
+                print(f"Error saving transcription: {e}")
+                transcription = None
+
+        with self.lock:
+            job = self.jobs[key]
+            elapsed = time.time() - job["started"]
+            if transcription:
+                job["status"] = "completed"
+                if job["duration"] > 0:
+                    self.realtime_factor = 0.7 * self.realtime_factor + 0.3 * (elapsed / job["duration"])
+            else:
+                job["status"] = "error"
+
+    def get_job(self, file_path):
+        """Return a snapshot of the job for file_path, with queue position and progress"""
+        key = str(file_path)
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return None
+            job = dict(job, sessions=set(job["sessions"]))
+            if job["status"] == "queued":
+                job["position"] = 1 + sum(
+                    1 for other in self.jobs.values()
+                    if other["status"] == "queued" and other["submitted"] < job["submitted"]
+                )
+            elif job["status"] == "running":
+                expected = max(job["duration"] * self.realtime_factor, 1.0)
+                job["progress"] = min((time.time() - job["started"]) / expected, 0.99)
+            return job
+
+    def forget(self, file_path):
+        """Drop a finished job, e.g. after its recording is deleted"""
+        with self.lock:
+            job = self.jobs.get(str(file_path))
+            if job and job["status"] not in ("queued", "running"):
+                del self.jobs[str(file_path)]
+
+    def has_pending(self, session_id=None):
+        """Whether jobs submitted by session_id (or by anyone, if None) are queued or running"""
+        with self.lock:
+            return any(
+                job["status"] in ("queued", "running") and (session_id is None or session_id in job["sessions"])
+                for job in self.jobs.values()
+            )